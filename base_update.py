@@ -1,52 +1,59 @@
-import sqlite3
+import pandas as pd
+from stockage import StockageSQLite
 
-def insert_deals(date, id_portfolio, risk_profile, action, asset, quantity, secteur):
-    conn = sqlite3.connect("fund_database.db")
-    cursor = conn.cursor()
-    
-    cursor.execute(
-        """
-        INSERT INTO Deals (date, id_portfolio, risk_profile, action, asset, quantity, secteur)
-        VALUES (?, ?, ?, ?, ?, ?, ?)
-        """,
-        (date.strftime("%Y-%m-%d"), id_portfolio, risk_profile, action, asset, quantity, secteur)
-    )
-    
-    conn.commit()
-    conn.close()
+def insert_deals(date, id_portfolio, risk_profile, action, asset, quantity, secteur, stockage=None, journal=None):
+    stockage = stockage or StockageSQLite("fund_database.db")
+    deals = [(date.strftime("%Y-%m-%d"), id_portfolio, risk_profile, action, asset, quantity, secteur)]
+    stockage.ecrire_deals(deals)
+    if journal is not None:
+        journal.ajouter(deals)
+
+def inserer_ordres(ordres, moteur=None, stockage=None, livre=None, journal=None):
+    """
+    Écrit un lot d'ordres dans la table Deals après contrôle par le moteur de conformité (voir conformite.py).
+    Les ordres sont des dictionnaires (date, id_portfolio, risk_profile, action, asset, quantity, secteur).
+    Avec un livre de positions (voir livre_positions.py), les ordres acceptés y sont appliqués en un lot au
+    lieu d'appeler update_pfh ordre par ordre ; les positions sont écrites par livre.snapshot(date).
+    Avec un journal (voir journal_deals.py), les deals acceptés y sont aussi ajoutés en un lot.
+    Retourne les ordres acceptés et les ordres rejetés avec leur motif.
+    """
+    stockage = stockage or StockageSQLite("fund_database.db")
+    acceptes, rejetes = moteur.verifier(ordres) if moteur is not None else (list(ordres), [])
+    for ordre, motif in rejetes:
+        print(f"Ordre rejeté : {ordre['action']} {ordre['asset']} ({motif})")
+    deals = [
+        (pd.Timestamp(o['date']).strftime("%Y-%m-%d"), o['id_portfolio'], o['risk_profile'], o['action'],
+         o['asset'], o['quantity'], o.get('secteur', "Non disponible"))
+        for o in acceptes
+    ]
+    stockage.ecrire_deals(deals)
+    if journal is not None:
+        journal.ajouter(deals)
+    if livre is not None:
+        livre.appliquer(acceptes)
+    return acceptes, rejetes
 
-def update_pfh(date, id_portfolio, ticker, action, quantity):
-    conn = sqlite3.connect("fund_database.db")
-    cursor = conn.cursor()
-    cursor.execute(
+def update_pfh(date, id_portfolio, ticker, action, quantity, stockage=None):
+    stockage = stockage or StockageSQLite("fund_database.db")
+    existing_holding = stockage.requete(
         "SELECT weight FROM Portfolio_Holdings WHERE id_portfolio = ? AND ticker = ?",
         (id_portfolio, ticker)
     )
-    existing_holding = cursor.fetchone()
     
-    if existing_holding:
-        new_weight = existing_holding[0] + (quantity / 10000 if action == 'buy' else -quantity / 10000)
+    if not existing_holding.empty:
+        new_weight = existing_holding["weight"].iloc[0] + (quantity / 10000 if action == 'buy' else -quantity / 10000)
         new_weight = max(0, min(1, new_weight))  # S'assurer que le poids reste entre 0 et 1
         
-        cursor.execute(
+        stockage.executer(
             """
             UPDATE Portfolio_Holdings
-            SET weight = ?
+            SET weight = ?, date = ?
             WHERE id_portfolio = ? AND ticker = ?
             """,
-            (new_weight, id_portfolio, ticker)
+            (new_weight, date.strftime("%Y-%m-%d"), id_portfolio, ticker)
         )
     else:
         new_weight = quantity / 10000 if action == 'buy' else 0
-        cursor.execute(
-            """
-            INSERT INTO Portfolio_Holdings (date, id_portfolio, ticker, weight)
-            VALUES (?, ?, ?, ?)
-            """,
-            (date.strftime("%Y-%m-%d"), id_portfolio, ticker, new_weight)
-        )
+        stockage.ecrire_holdings([(date.strftime("%Y-%m-%d"), id_portfolio, ticker, new_weight)])
     
-    conn.commit()
-    conn.close()
     print(f"Portfolio updated: {action} {quantity} of {ticker} on {date}.")
-
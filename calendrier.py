@@ -0,0 +1,98 @@
+# %% Packages
+import numpy as np
+import pandas as pd
+from stockage import StockageSQLite
+
+"""
+Calendrier des jours de trading partagé par toutes les stratégies.
+
+Les jours de trading sont l'union des dates présentes dans les données (et non plus les dates
+du premier ticker ou d'AAPL). La recherche d'une date se fait par table de hachage (O(1)),
+les lundis de rebalancement sont précalculés et reportés au jour de trading suivant lorsqu'ils
+tombent un jour férié, et les changements de mois servent à remettre à zéro le turnover.
+"""
+
+
+class CalendrierTrading:
+    """
+    Paramètres
+    ----------
+    dates : array-like
+        Dates de cotation (avec ou sans doublons, dans n'importe quel ordre).
+    """
+
+    def __init__(self, dates):
+        self.dates = pd.DatetimeIndex(pd.to_datetime(np.unique(pd.to_datetime(dates).values)))
+        self._valeurs = self.dates.values
+        self._indices = {d: i for i, d in enumerate(self.dates)}
+        self._rebalancements = {}
+
+    @classmethod
+    def depuis_donnees(cls, df):
+        """Calendrier construit à partir de l'index de dates d'un DataFrame au format long."""
+        return cls(df.index)
+
+    @classmethod
+    def depuis_panel(cls, panel):
+        return cls(panel.dates)
+
+    @classmethod
+    def depuis_base(cls, db_path="fund_database.db", stockage=None):
+        """Calendrier construit à partir des dates distinctes de la table Returns."""
+        return cls((stockage or StockageSQLite(db_path)).dates_trading())
+
+    def __len__(self):
+        return len(self.dates)
+
+    def __contains__(self, date):
+        return pd.Timestamp(date) in self._indices
+
+    # %% Résolution des dates
+    def indice(self, date):
+        """Position d'un jour de trading dans le calendrier (KeyError si la date n'est pas un jour de trading)."""
+        return self._indices[pd.Timestamp(date)]
+
+    def prochain(self, date):
+        """Premier jour de trading supérieur ou égal à date (None après la fin du calendrier)."""
+        i = np.searchsorted(self._valeurs, np.datetime64(pd.Timestamp(date)), side='left')
+        return self.dates[i] if i < len(self.dates) else None
+
+    def position(self, dates):
+        """Nombre de jours de trading strictement antérieurs à chaque date (vectorisé)."""
+        return np.searchsorted(self._valeurs, pd.to_datetime(dates).values, side='left')
+
+    def rebalancements(self, debut, fin=None, jour=0):
+        """
+        Dates de rebalancement hebdomadaires entre debut et fin : chaque semaine le jour demandé
+        (0 = lundi), reporté au jour de trading suivant s'il est férié. Le résultat est mis en cache.
+        """
+        fin = self.dates[-1] if fin is None else pd.Timestamp(fin)
+        cle = (pd.Timestamp(debut), fin, jour)
+        if cle not in self._rebalancements:
+            ancres = pd.date_range(debut, fin, freq=pd.offsets.Week(weekday=jour))
+            i = np.searchsorted(self._valeurs, ancres.values, side='left')
+            i = np.unique(i[i < len(self.dates)])
+            dates = self.dates[i]
+            self._rebalancements[cle] = dates[dates <= fin]
+        return self._rebalancements[cle]
+
+    @staticmethod
+    def nouveaux_mois(dates):
+        """
+        Marqueurs de changement de mois : True lorsque la date est dans un autre mois que la date
+        précédente (le premier élément vaut False). Sert à remettre à zéro le turnover mensuel.
+        """
+        dates = pd.DatetimeIndex(dates)
+        periode = dates.year * 12 + dates.month
+        marqueurs = np.zeros(len(dates), dtype=bool)
+        marqueurs[1:] = periode[1:] != periode[:-1]
+        return marqueurs
+
+    def fenetres(self, fins, longueur):
+        """
+        Indices de début et de fin (exclue) des fenêtres de longueur jours de trading se terminant
+        strictement avant chaque date de fins, comme data[data.index < date].tail(longueur).
+        """
+        fin = self.position(fins)
+        debut = np.maximum(fin - longueur, 0)
+        return debut, fin
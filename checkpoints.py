@@ -0,0 +1,69 @@
+import json
+import sqlite3
+
+"""
+Points de reprise des stratégies.
+
+Après chaque date de rebalancement, la stratégie enregistre son état (sérialisé en JSON) dans la
+table Strategy_Checkpoints, dans la même transaction que ses deals de la date. En cas d'arrêt,
+la stratégie relit le dernier état enregistré et ne recalcule que les semaines restantes ; le
+lancement hebdomadaire repart de la même façon de l'état de la semaine précédente.
+"""
+
+
+def creer_table_checkpoints(conn):
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS Strategy_Checkpoints (
+        strategie TEXT NOT NULL,
+        date TEXT NOT NULL,
+        etat TEXT NOT NULL,
+        date_maj TEXT DEFAULT (DATETIME('now')),
+        PRIMARY KEY (strategie, date)
+    )
+    """)
+
+
+def sauver_checkpoint(conn, strategie, date, etat):
+    """
+    Enregistre l'état d'une stratégie à une date, sans commit : l'appelant valide la transaction
+    avec les deals de la même date pour que les deux restent cohérents.
+    """
+    conn.execute(
+        "INSERT OR REPLACE INTO Strategy_Checkpoints (strategie, date, etat) VALUES (?, ?, ?)",
+        (strategie, str(date)[:10], json.dumps(etat, default=_json_defaut))
+    )
+
+
+def dernier_checkpoint(db_path, strategie, timeout=30):
+    """
+    Retourne (date, etat) du dernier point de reprise validé, ou (None, None) s'il n'y en a pas.
+    timeout : délai d'attente (secondes) si la base est verrouillée par un autre écrivain.
+    """
+    conn = sqlite3.connect(db_path, timeout=timeout)
+    creer_table_checkpoints(conn)
+    ligne = conn.execute(
+        "SELECT date, etat FROM Strategy_Checkpoints WHERE strategie = ? ORDER BY date DESC LIMIT 1",
+        (strategie,)
+    ).fetchone()
+    conn.close()
+    if ligne is None:
+        return None, None
+    return ligne[0], json.loads(ligne[1])
+
+
+def supprimer_checkpoints(db_path, strategie, timeout=30):
+    """Efface les points de reprise d'une stratégie (pour relancer un backtest depuis le début)."""
+    conn = sqlite3.connect(db_path, timeout=timeout)
+    creer_table_checkpoints(conn)
+    conn.execute("DELETE FROM Strategy_Checkpoints WHERE strategie = ?", (strategie,))
+    conn.commit()
+    conn.close()
+
+
+def _json_defaut(x):
+    # Types numpy / pandas rencontrés dans les états des stratégies
+    if hasattr(x, 'isoformat'):
+        return x.isoformat()
+    if hasattr(x, 'item'):
+        return x.item()
+    raise TypeError(f"Type non sérialisable : {type(x)}")
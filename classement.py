@@ -0,0 +1,64 @@
+import numpy as np
+
+"""
+Classement des scores Low Turnover d'une date.
+
+À chaque date de rebalancement, la stratégie n'utilise du classement que les deux meilleurs titres
+(avec leur direction) et la moyenne des trois meilleurs scores, qui devient le seuil du mois
+suivant. Classement garde les scores et directions de l'univers dans deux tableaux numpy alloués
+une seule fois et réutilisés d'une date à l'autre. Les k meilleurs sont obtenus par sélection
+partielle (np.argpartition, O(n)) puis seuls ces k titres sont triés, au lieu d'un tri complet
+d'un DataFrame par date.
+"""
+
+
+class Classement:
+    """
+    Paramètres
+    ----------
+    tickers : array-like
+        Univers, dans l'ordre des indices utilisés par noter.
+    k : int
+        Nombre de meilleurs scores conservés pour le seuil du mois (3 dans la stratégie).
+    """
+
+    def __init__(self, tickers, k=3):
+        self.tickers = np.asarray(tickers)
+        self.k = k
+        self.scores = np.full(len(self.tickers), np.nan)
+        self.directions = np.zeros(len(self.tickers), dtype=np.int8)
+        # k meilleurs scores de la dernière date classée ayant au moins un score valide
+        self.meilleurs_scores = np.empty(0)
+        self.seuil = np.nan
+
+    def effacer(self):
+        """Remet les scores à NaN avant de noter une nouvelle date."""
+        self.scores.fill(np.nan)
+
+    def noter(self, i, score, direction):
+        self.scores[i] = score
+        self.directions[i] = direction
+
+    def meilleurs(self, k=None):
+        """Indices des k meilleurs scores valides, du meilleur au moins bon."""
+        k = self.k if k is None else k
+        valides = np.flatnonzero(~np.isnan(self.scores))
+        if len(valides) > k:
+            valides = valides[np.argpartition(-self.scores[valides], k - 1)[:k]]
+        return valides[np.argsort(-self.scores[valides], kind='stable')]
+
+    def classer(self):
+        """
+        Fin de la notation d'une date : retourne les indices des k meilleurs et les garde pour le seuil
+        du mois suivant (une date sans score valide ne remplace pas les précédents).
+        """
+        indices = self.meilleurs()
+        if len(indices):
+            self.meilleurs_scores = self.scores[indices]
+        return indices
+
+    def nouveau_mois(self):
+        """Le seuil du nouveau mois est la moyenne des k meilleurs scores de la dernière date classée."""
+        if len(self.meilleurs_scores):
+            self.seuil = float(self.meilleurs_scores.mean())
+        return self.seuil
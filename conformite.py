@@ -0,0 +1,154 @@
+import numpy as np
+import pandas as pd
+
+"""
+Contrôle de conformité avant écriture des ordres (pre-trade).
+
+Chaque portefeuille peut avoir un mandat :
+- un nombre maximal de transactions par mois (profil Low Turnover : 2) ;
+- une volatilité annuelle ex-ante maximale (profil Low Risk : 10 %).
+
+Les compteurs de transactions sont tenus en mémoire par portefeuille (accès O(1)). Pour la
+volatilité, on garde le facteur L de la covariance annualisée (Sigma = L L') et, pour chaque
+portefeuille, son exposition a = L' w : un ordre sur un actif ne modifie l'exposition que d'une
+colonne de L', le contrôle coûte donc O(N) par ordre au lieu de recalculer w' Sigma w.
+Les ordres qui violent le mandat sont rejetés, ou réduits lorsque c'est possible.
+"""
+
+
+class MoteurConformite:
+    """
+    Paramètres
+    ----------
+    unite : float
+        Nombre d'unités de quantity correspondant à un poids de 1 (100 lorsque les quantités sont en %).
+    """
+
+    def __init__(self, unite=100.0):
+        self.unite = unite
+        self.mandats = {}
+        self.compteurs = {}
+        self.facteur = None
+        self.indices = {}
+        self.expositions = {}
+        self.risque_specifique = {}
+        self.specifique = None
+        self.poids = {}
+
+    # %% Paramétrage
+    def definir_mandat(self, id_portfolio, max_trades_mois=None, vol_max=None):
+        self.mandats[id_portfolio] = {'max_trades_mois': max_trades_mois, 'vol_max': vol_max}
+
+    def definir_risque(self, tickers, facteur, specifique=None):
+        """
+        Enregistre le facteur L de la covariance annualisée des tickers (Sigma = L L'), ou pour un modèle
+        à facteurs (voir ModeleRisque.facteur_structure) le facteur N x K du risque commun et les
+        variances spécifiques (Sigma = L L' + diag(specifique)). Les expositions des portefeuilles déjà
+        connus sont recalculées une fois.
+        """
+        self.facteur = np.asarray(facteur, dtype=float)
+        self.specifique = None if specifique is None else np.asarray(specifique, dtype=float)
+        self.indices = {t: i for i, t in enumerate(tickers)}
+        for id_portfolio in list(self.poids):
+            self.definir_positions(id_portfolio, self.poids[id_portfolio])
+
+    def definir_positions(self, id_portfolio, poids):
+        """Positions actuelles d'un portefeuille : dictionnaire ticker -> poids (fraction)."""
+        w = np.zeros(len(self.indices))
+        for t, p in poids.items():
+            if t in self.indices:
+                w[self.indices[t]] = p
+        self.poids[id_portfolio] = dict(poids)
+        if self.facteur is not None:
+            self.expositions[id_portfolio] = self.facteur.T @ w
+            if self.specifique is not None:
+                self.risque_specifique[id_portfolio] = float(np.sum(self.specifique * w * w))
+
+    def charger_compteurs(self, stockage, date):
+        """Initialise les compteurs du mois de date à partir des deals déjà enregistrés."""
+        mois = str(date)[:7]
+        df = stockage.requete(
+            "SELECT id_portfolio, COUNT(*) AS nb FROM Deals WHERE SUBSTR(CAST(date AS VARCHAR), 1, 7) = ? GROUP BY id_portfolio",
+            (mois,)
+        )
+        for id_portfolio, nb in zip(df['id_portfolio'], df['nb']):
+            self.compteurs[int(id_portfolio)] = (mois, int(nb))
+
+    # %% Contrôles
+    def volatilite(self, id_portfolio):
+        a = self.expositions.get(id_portfolio)
+        if a is None:
+            return 0.0
+        return float(np.sqrt(a @ a + self.risque_specifique.get(id_portfolio, 0.0)))
+
+    def verifier(self, ordres):
+        """
+        Contrôle un lot d'ordres (dictionnaires avec date, id_portfolio, action, asset, quantity).
+
+        Retourne
+        --------
+        acceptes : list
+            Ordres à écrire (éventuellement avec une quantité réduite).
+        rejetes : list
+            Couples (ordre, motif).
+        """
+        acceptes, rejetes = [], []
+        for ordre in ordres:
+            id_portfolio = ordre['id_portfolio']
+            mandat = self.mandats.get(id_portfolio)
+            if mandat is None:
+                acceptes.append(ordre)
+                continue
+
+            # Nombre de transactions du mois
+            mois = str(pd.Timestamp(ordre['date']).date())[:7]
+            mois_compteur, nb = self.compteurs.get(id_portfolio, (mois, 0))
+            if mois_compteur != mois:
+                nb = 0
+            if mandat['max_trades_mois'] is not None and nb >= mandat['max_trades_mois']:
+                rejetes.append((ordre, f"plus de {mandat['max_trades_mois']} transactions en {mois}"))
+                continue
+
+            # Volatilité ex-ante après l'ordre
+            alpha = 1.0
+            i = self.indices.get(ordre['asset'])
+            signe = 1.0 if ordre['action'] == 'buy' else -1.0
+            delta = signe * ordre['quantity'] / self.unite
+            if mandat['vol_max'] is not None and self.facteur is not None and i is not None:
+                a = self.expositions.setdefault(id_portfolio, np.zeros(self.facteur.shape[1]))
+                b = delta * self.facteur[i]
+                # Variance = ||a + alpha b||² + risque spécifique, polynôme du second degré en alpha
+                s = self.risque_specifique.get(id_portfolio, 0.0)
+                d = self.specifique[i] if self.specifique is not None else 0.0
+                w_i = self.poids.get(id_portfolio, {}).get(ordre['asset'], 0.0)
+                alpha = _fraction_admissible(b @ b + d * delta * delta, 2 * (a @ b + d * w_i * delta),
+                                             a @ a + s, mandat['vol_max'])
+                if alpha <= 0.0:
+                    rejetes.append((ordre, f"volatilité ex-ante supérieure à {mandat['vol_max']:.0%}"))
+                    continue
+                a += alpha * b
+                if self.specifique is not None:
+                    self.risque_specifique[id_portfolio] = s + d * (2 * w_i * alpha * delta + (alpha * delta) ** 2)
+                if alpha < 1.0:
+                    ordre = dict(ordre, quantity=ordre['quantity'] * alpha)
+
+            self.compteurs[id_portfolio] = (mois, nb + 1)
+            poids = self.poids.setdefault(id_portfolio, {})
+            poids[ordre['asset']] = poids.get(ordre['asset'], 0.0) + alpha * delta
+            acceptes.append(ordre)
+        return acceptes, rejetes
+
+
+def _fraction_admissible(c2, c1, c0, vol_max):
+    """
+    Plus grande fraction alpha dans [0, 1] de l'ordre telle que la variance après l'ordre,
+    c2 alpha² + c1 alpha + c0, reste inférieure à vol_max².
+    Si le portefeuille dépasse déjà la limite, seul un ordre qui réduit le risque est accepté.
+    """
+    v2 = vol_max ** 2
+    if c2 + c1 + c0 <= v2:
+        return 1.0
+    if c0 > v2:
+        return 1.0 if c2 + c1 < 0 else 0.0
+    # Racine positive de c2 alpha² + c1 alpha + (c0 - v2) = 0
+    return float(max(0.0, (-c1 + np.sqrt(c1 * c1 - 4 * c2 * (c0 - v2))) / (2 * c2)))
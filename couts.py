@@ -0,0 +1,249 @@
+import time
+import numpy as np
+import pandas as pd
+
+"""
+Coûts de transaction : commission, spread et impact de marché.
+
+Le coût d'une transaction de delta (en fraction du portefeuille) sur un titre est
+
+    (commission + spread / 2) * |delta|  +  impact * volatilite * sqrt(capital / ADV) * |delta| ** 1.5
+
+c'est-à-dire un coût linéaire plus un impact en racine carrée du volume échangé rapporté au volume
+quotidien moyen en dollars (ADV, moyenne glissante de Close x Volume). ADV et volatilité sont
+calculés une fois pour tout l'historique à partir du DataFrame de get_financial_data, décalés d'un
+jour (seules les données de la veille sont utilisées). Pour une date, coefficients donne les deux
+coefficients de chaque titre, ce qui permet d'évaluer le coût d'un rééquilibrage complet en
+quelques opérations vectorielles, dans la fonction objectif des optimiseurs comme sur un lot d'ordres.
+
+Les stratégies n'expriment pas toutes quantity dans la même unité : en pourcentage du portefeuille
+(lowrisk_strategy, lowturnover_strategy, Random Forest) ou en nombre de lignes (quantity = 1 pour une
+ligne, Low Turnover de strategies_final et Equity Only). UNITES_PROFILS donne l'unité de chaque libellé
+de profil écrit dans Deals.
+"""
+
+# Nombre d'unités de quantity pour la totalité du portefeuille, par libellé de risk_profile. None : quantity
+# compte des lignes de même taille, l'unité est le nombre de titres traités par le portefeuille à la date
+UNITES_PROFILS = {
+    "Lowrisk": 100, "Low Risk": 100, "Lowturnover": 100, "High Yield Equity Only": 100,
+    "Low Turnover": None, "High Yield Only": None,
+}
+
+
+class ModeleCouts:
+    """
+    Paramètres
+    ----------
+    adv : pandas.DataFrame
+        Volume quotidien moyen en dollars, date x ticker (valeurs connues à la date).
+    volatilite : pandas.DataFrame
+        Volatilité quotidienne des rendements, date x ticker.
+    commission : float
+        Commission en fraction du montant échangé.
+    spread : float
+        Écart achat-vente relatif, la moitié est payée à chaque transaction.
+    impact : float
+        Coefficient de la loi d'impact en racine carrée.
+    capital : float
+        Encours du portefeuille en dollars, pour convertir les poids en montants.
+    horizon : int
+        Nombre de périodes sur lequel le coût d'un rééquilibrage est amorti dans les fonctions objectif
+        (5 pour un rééquilibrage hebdomadaire sur des rendements journaliers).
+    """
+
+    def __init__(self, adv, volatilite, commission=0.0005, spread=0.001, impact=1.0, capital=1_000_000, horizon=5):
+        self.adv = adv.sort_index()
+        self.volatilite = volatilite.reindex(index=self.adv.index, columns=self.adv.columns)
+        self.commission = commission
+        self.spread = spread
+        self.impact = impact
+        self.capital = capital
+        self.horizon = horizon
+        self._dates = self.adv.index.values.astype('datetime64[ns]')
+        self._adv = self.adv.to_numpy(dtype=float)
+        self._vol = self.volatilite.to_numpy(dtype=float)
+        # Valeurs de repli pour les titres sans historique
+        self._adv_median = np.nanmedian(self._adv) if np.isfinite(self._adv).any() else np.inf
+        self._vol_median = np.nanmedian(self._vol) if np.isfinite(self._vol).any() else 0.0
+
+    @classmethod
+    def depuis_donnees(cls, data, fenetre=20, colonne_ticker='ticker', **kwargs):
+        """
+        Construit le modèle à partir du DataFrame de get_financial_data (colonnes Close, Volume, Returns
+        et colonne_ticker, indexé par date). ADV et volatilité sont des moyennes glissantes sur fenetre jours.
+        """
+        close = data.pivot_table(index=data.index, columns=colonne_ticker, values='Close')
+        volume = data.pivot_table(index=data.index, columns=colonne_ticker, values='Volume').reindex_like(close)
+        returns = data.pivot_table(index=data.index, columns=colonne_ticker, values='Returns').reindex_like(close)
+        adv = (close * volume).rolling(fenetre, min_periods=1).mean().shift(1)
+        volatilite = returns.rolling(fenetre, min_periods=2).std().shift(1)
+        adv.index = pd.to_datetime(adv.index)
+        volatilite.index = adv.index
+        return cls(adv, volatilite, **kwargs)
+
+    def _lignes(self, dates):
+        # Dernière ligne connue à chaque date (-1 avant le début de l'historique)
+        dates = pd.to_datetime(np.atleast_1d(dates)).values.astype('datetime64[ns]')
+        return np.searchsorted(self._dates, dates, side='right') - 1
+
+    def _coefficient_impact(self, adv, vol):
+        adv = np.where(np.isfinite(adv) & (adv > 0), adv, self._adv_median)
+        vol = np.where(np.isfinite(vol), vol, self._vol_median)
+        return self.impact * vol * np.sqrt(self.capital / adv)
+
+    def coefficients(self, date, tickers):
+        """
+        Coefficients (lineaire, impact) de chaque ticker à date, à utiliser avec cout.
+        Les tickers sans historique prennent les valeurs médianes du modèle.
+        """
+        ligne = self._lignes(date)[0]
+        colonnes = self.adv.columns.get_indexer(list(tickers))
+        connus = (colonnes >= 0) & (ligne >= 0)
+        adv = np.full(len(colonnes), np.nan)
+        vol = np.full(len(colonnes), np.nan)
+        if ligne >= 0:
+            adv[connus] = self._adv[ligne, colonnes[connus]]
+            vol[connus] = self._vol[ligne, colonnes[connus]]
+        lineaire = np.full(len(colonnes), self.commission + self.spread / 2)
+        return lineaire, self._coefficient_impact(adv, vol)
+
+    @staticmethod
+    def cout(delta, lineaire, impact):
+        """Coût de chaque transaction de delta (fraction du portefeuille), en fraction du portefeuille."""
+        montant = np.abs(delta)
+        return montant * (lineaire + impact * np.sqrt(montant))
+
+    def cout_rebalancement(self, date, tickers, poids_actuels, poids_cibles):
+        """Coût total du passage de poids_actuels à poids_cibles à date, en fraction du portefeuille."""
+        lineaire, impact = self.coefficients(date, tickers)
+        delta = np.asarray(poids_cibles, dtype=float) - np.asarray(poids_actuels, dtype=float)
+        return float(self.cout(delta, lineaire, impact).sum())
+
+    def couts_ordres(self, ordres, unite=100):
+        """
+        Coût de chaque ordre d'un lot (DataFrame ou liste de dictionnaires date, asset, quantity...), calculé
+        en une fois pour tout le lot. unite est le nombre d'unités de quantity pour la totalité du portefeuille
+        (100 pour des quantités en pourcentage comme dans lowrisk_strategy), ou un dictionnaire risk_profile ->
+        unité comme UNITES_PROFILS (voir unites_ordres). Retourne le lot avec les colonnes cout (fraction du
+        portefeuille) et cout_montant (en dollars).
+        """
+        ordres = ordres.copy() if isinstance(ordres, pd.DataFrame) else pd.DataFrame(list(ordres))
+        if ordres.empty:
+            return ordres.assign(cout=pd.Series(dtype=float), cout_montant=pd.Series(dtype=float))
+        lignes = self._lignes(ordres['date'])
+        colonnes = self.adv.columns.get_indexer(ordres['asset'])
+        connus = (lignes >= 0) & (colonnes >= 0)
+        adv = np.full(len(ordres), np.nan)
+        vol = np.full(len(ordres), np.nan)
+        adv[connus] = self._adv[lignes[connus], colonnes[connus]]
+        vol[connus] = self._vol[lignes[connus], colonnes[connus]]
+        delta = ordres['quantity'].to_numpy(dtype=float) / unites_ordres(ordres, unite)
+        ordres['cout'] = self.cout(delta, self.commission + self.spread / 2, self._coefficient_impact(adv, vol))
+        ordres['cout_montant'] = ordres['cout'] * self.capital
+        return ordres
+
+    def couts_par_portefeuille(self, deals, unite=UNITES_PROFILS):
+        """
+        Coût total des deals par portefeuille et par date : colonnes id_portfolio, date, cout. Par défaut,
+        l'unité de quantity dépend du profil de chaque deal (UNITES_PROFILS).
+        """
+        couts = self.couts_ordres(deals, unite)
+        couts['date'] = _jours(couts['date'])
+        return couts.groupby(['id_portfolio', 'date'], as_index=False)['cout'].sum()
+
+
+def unites_ordres(ordres, unite):
+    """
+    Unité de quantity de chaque ordre. unite est un nombre (le même pour tous les ordres) ou un dictionnaire
+    risk_profile -> unité : None y désigne des quantités en nombre de lignes, dont l'unité est le nombre de
+    titres différents traités par le couple (id_portfolio, risk_profile) à la date de l'ordre. Le coût d'un
+    ordre ne dépend donc pas des autres dates présentes dans le lot. Un profil absent du dictionnaire est en
+    pourcentage (100).
+    """
+    if not isinstance(unite, dict):
+        return np.full(len(ordres), float(unite))
+    if 'risk_profile' not in ordres.columns:
+        raise ValueError("Une unité par profil nécessite la colonne risk_profile des ordres")
+    unites = ordres['risk_profile'].map(unite).astype(object)
+    unites[~ordres['risk_profile'].isin(list(unite))] = 100
+    en_lignes = unites.isna().to_numpy()
+    if en_lignes.any():
+        lignes = ordres[en_lignes]
+        jours = pd.to_datetime(lignes['date'].astype(str).str[:10])
+        unites[en_lignes] = lignes.groupby([lignes['id_portfolio'], lignes['risk_profile'], jours])['asset'].transform('nunique')
+    return unites.to_numpy(dtype=float)
+
+
+def benchmark_couts(data, stockage=None, repetitions=5, **kwargs):
+    """
+    Compare les calculs bruts et nets de coûts d'un backtest, avec le modèle construit sur data (DataFrame
+    de get_financial_data ; la construction, faite une fois avant le backtest, n'est pas comptée) :
+    - une optimisation d'une date de lowrisk_strategy (évolution différentielle sur la même fonction objectif,
+      rendement et volatilité par la covariance), avec ou sans le coût du rééquilibrage dans l'objectif ;
+    - les rendements de portefeuille de la base (deals et positions du stockage, SQLite par défaut).
+    Retourne un DataFrame des meilleurs temps sur repetitions exécutions (secondes) et des surcoûts relatifs.
+    """
+    from stockage import StockageSQLite
+    stockage = stockage or StockageSQLite("fund_database.db")
+    modele = ModeleCouts.depuis_donnees(data, **kwargs)
+    deals = stockage.requete("SELECT date, id_portfolio, risk_profile, asset, quantity FROM Deals")
+    rendements = data.pivot_table(index=data.index, columns='ticker', values='Returns').reindex(columns=modele.adv.columns)
+    tickers = list(rendements.columns)
+    date = modele.adv.index[-1]
+    moyennes = rendements.mean().fillna(0).to_numpy()
+    covariance = rendements.fillna(0).cov().to_numpy()
+    poids_actuels = np.full(len(tickers), 1 / max(len(tickers), 1))
+    lineaire, impact = modele.coefficients(date, tickers)
+
+    def objectif(x):
+        w = x / np.sum(x)
+        return -(w @ moyennes - 1000 * abs(np.sqrt(252 * w @ covariance @ w) - 0.10))
+
+    def objectif_net(x):
+        return objectif(x) + modele.cout(x / np.sum(x) - poids_actuels, lineaire, impact).sum() / modele.horizon
+
+    def optimiser(fonction):
+        from scipy.optimize import differential_evolution
+        differential_evolution(fonction, [(0, 1)] * len(tickers), strategy='best1bin', maxiter=10, popsize=10,
+                               tol=1e-6, mutation=(0.5, 1), recombination=0.7, seed=0, polish=False)
+
+    def meilleur_temps(calcul):
+        meilleur = float('inf')
+        for _ in range(repetitions):
+            debut = time.perf_counter()
+            calcul()
+            meilleur = min(meilleur, time.perf_counter() - debut)
+        return meilleur
+
+    temps = {
+        'Optimisation brute': meilleur_temps(lambda: optimiser(objectif)),
+        'Optimisation nette': meilleur_temps(lambda: optimiser(objectif_net)),
+        'Rendements bruts': meilleur_temps(lambda: stockage.rendements_ponderes(historique=True)),
+        'Rendements nets': meilleur_temps(
+            lambda: rendements_nets(stockage.rendements_ponderes(historique=True), modele.couts_par_portefeuille(deals))
+        ),
+    }
+    noms = list(temps)
+    df_temps = pd.Series(temps, name='secondes').to_frame()
+    df_temps.loc['Surcoût optimisation nette / brute', 'secondes'] = temps[noms[1]] / temps[noms[0]] - 1
+    df_temps.loc['Surcoût rendements nets / bruts', 'secondes'] = temps[noms[3]] / temps[noms[2]] - 1
+    print(df_temps)
+    return df_temps
+
+
+def rendements_nets(portfolio_performance, couts):
+    """
+    Rendements pondérés nets de coûts : le coût des deals d'un portefeuille est retranché du rendement
+    de la date du deal (une ligne de rendement nul est ajoutée si la date n'a pas de rendement).
+    portfolio_performance : colonnes id_portfolio, date, weighted_return ; couts : voir couts_par_portefeuille.
+    """
+    brut = portfolio_performance[['id_portfolio', 'date', 'weighted_return']].assign(date=_jours(portfolio_performance['date']))
+    retraits = pd.DataFrame({'id_portfolio': couts['id_portfolio'], 'date': couts['date'], 'weighted_return': -couts['cout']})
+    return pd.concat([brut, retraits], ignore_index=True).groupby(['id_portfolio', 'date'], as_index=False)['weighted_return'].sum()
+
+
+def _jours(dates):
+    # Dates au format 'AAAA-MM-JJ' (les dates texte de la base sont déjà à ce format, seul le jour est gardé)
+    if pd.api.types.is_datetime64_any_dtype(dates):
+        return dates.dt.strftime('%Y-%m-%d')
+    return dates.astype(str).str[:10]
@@ -1,7 +1,5 @@
 # %% Packages 
-import yfinance as yf
-import pandas as pd
-import numpy as np
+from market_data import FournisseurYahoo
 
 # %% Fonction pour les tickers de yfinance 
 ticker = [
@@ -30,7 +28,18 @@ ticker = [
     'SPY', 'QQQ', 'DIA', 'IWM', 'EFA', 'EEM', 'TLT', 'GLD', 'XLV', 'XLE'
 ]
 
-def get_financial_data():
+def charger_univers(chemin):
+    """
+    Lit un univers de tickers depuis un fichier texte ou CSV (un ticker par ligne, ou une colonne 'ticker').
+    Permet de remplacer la liste ticker ci-dessus par un univers de plusieurs milliers de noms.
+    """
+    with open(chemin, encoding="utf-8") as f:
+        lignes = [ligne.strip().split(",")[0] for ligne in f if ligne.strip()]
+    if lignes and lignes[0].lower() == "ticker":
+        lignes = lignes[1:]
+    return lignes
+
+def get_financial_data(fournisseur=None, tickers=None, start_date='2022-01-01', end_date='2024-12-31'):
 
     """
     Télécharge, nettoie et prépare des données financières pour une sélection d'actifs.
@@ -44,7 +53,17 @@ def get_financial_data():
     - Traitement des valeurs aberrantes (méthode Z-score), avec remplacement par la médiane des rendements.
     - Gestion appropriée des valeurs manquantes.
 
-    Période couverte : 1er janvier 2022 au 31 décembre 2024.
+    Période couverte par défaut : 1er janvier 2022 au 31 décembre 2024.
+
+    Paramètres
+    ----------
+    fournisseur : FournisseurDonnees, optionnel
+        Source des données de marché (voir market_data.py). Par défaut Yahoo Finance, un
+        FournisseurSynthetique permet de travailler hors ligne sur un univers de 10 à 10 000 tickers.
+    tickers : list, optionnel
+        Liste des tickers à traiter, par défaut l'univers du fournisseur.
+    start_date, end_date : str
+        Bornes de la période d'extraction.
 
     Colonnes du DataFrame retourné :
     - 'Close' : Prix de clôture quotidien.
@@ -59,56 +78,14 @@ def get_financial_data():
     pandas.DataFrame
         DataFrame consolidé contenant l'ensemble des données traitées et prêtes pour analyse.
 
+    Lève
     ----
     ValueError
         Si aucune donnée n’a pu être correctement téléchargée et traitée.
 
     """
-     # Définition de la période d'extraction des données financières historiques
-    start_date = '2022-01-01'
-    end_date = '2024-12-31'
-
-    # Téléchargement des données historiques (cours et volumes) via Yahoo Finance pour tous les tickers spécifiés
-    data = yf.download(ticker, start=start_date, end=end_date, group_by='ticker')
-    # Remplit les données manquantes par propagation vers l'avant (forward-fill), afin de gérer les éventuelles absences de cotations certains jours 
-    data = data.ffill() 
-
-    dataframes = [] # Initialisation d'une liste vide pour regrouper les DataFrames individuels par ticker
-
-    # Boucle sur chaque ticker individuel pour traiter et enrichir ses données séparément
-    for t in ticker:
-        try:
-            # Copie les données spécifiques à un ticker pour éviter toute modification des données d'origine
-            df = data[t].copy()
-            # Ajoute une colonne indiquant clairement le ticker correspondant
-            df['ticker'] = t  
-            # Définit la catégorie : 'ETF' pour les tickers explicitement définis comme ETF, sinon 'Action'
-            df['Category'] = (
-                'Bon du trésor américain' if t == '^FVX' else
-                'Valeurs refuge' if t in ['CL=F', 'GC=F'] else
-                'ETF' if t in ['SPY', 'QQQ', 'DIA', 'IWM', 'EFA', 'EEM', 'TLT', 'GLD', 'XLV', 'XLE'] else
-                'Action'
-            )
-
-            df['Returns'] = df['Close'].fillna(method='pad').pct_change()
-            # Récupération du secteur d'activité du ticker via yfinance
-            try:
-                info = yf.Ticker(t).info
-                secteur = info.get("sector", "Non disponible")   # Obtention du secteur, sinon valeur par défaut "Non disponible"
-            except Exception:
-                secteur = "Non disponible" # Gestion du cas où l'info secteur n'est pas disponible (actifs internationaux, indices, etc.)
-            df['Secteur'] = secteur # Ajoute le secteur dans les données
-
-            # Traitement des valeurs aberrantes 
-            z_score = np.abs((df['Returns'] - df['Returns'].mean()) / df['Returns'].std())
-            df.loc[z_score > 3, 'Returns'] = np.nan
-            df['Returns'] = df['Returns'].fillna(df['Returns'].median())
-            df = df[['Close', 'Volume', 'ticker', 'Category', 'Returns', 'Secteur']]
-            dataframes.append(df)
-        except Exception as e:
-            print(f"Erreur lors du traitement de {t}: {e}")
-
-    if not dataframes:  # Vérification si dataframes est vide
-        raise ValueError("Aucune donnée n'a pu être traitée")
-
-    return pd.concat(dataframes)
+    # Par défaut, les données sont téléchargées depuis Yahoo Finance pour la liste de tickers ci-dessus
+    if fournisseur is None:
+        fournisseur = FournisseurYahoo(ticker)
+    # Le téléchargement, l'enrichissement (catégorie, secteur) et le nettoyage des rendements sont réalisés par le fournisseur
+    return fournisseur.get_financial_data(tickers=tickers, start_date=start_date, end_date=end_date)
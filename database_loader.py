@@ -1,15 +1,35 @@
-import sqlite3
+import numpy as np
 import pandas as pd
 from faker import Faker
-from data_loader_v2 import get_financial_data
+from data_loader import get_financial_data, ticker
+from market_data import FournisseurYahoo
+from rollups import creer_rollups
+from historique_positions import creer_historique
+from encours import creer_flux
+from stockage import StockageSQLite
 import random
 
-# Chargement des données financières
-data = get_financial_data()
+# Données financières, chargées au premier besoin (voir charger_donnees)
+data = None
 fake = Faker()
 
+def charger_donnees(fournisseur=None):
+    """
+    Charge les données financières utilisées pour remplir les tables Products et Returns.
+    Par défaut les données viennent de Yahoo Finance, un FournisseurSynthetique (market_data.py)
+    permet de construire la base sans accès réseau.
+    """
+    global data
+    data = get_financial_data(fournisseur)
+    return data
+
+def _donnees():
+    if data is None:
+        charger_donnees()
+    return data
+
 # %% Table Clients 
-def clients(): 
+def clients(stockage=None):
     """
     Génère une table Clients avec des données fictives pour simuler une base client.
     """
@@ -28,221 +48,435 @@ def clients():
         "risk_profile": risk_profiles  
     })
 
-    conn = sqlite3.connect("fund_database.db")
-    cursor = conn.cursor()
+    stockage = stockage or StockageSQLite("fund_database.db")
+    with stockage.transaction() as cursor:
+        cursor.execute("DROP TABLE IF EXISTS Clients") # Réinitialise la table Clients si elle existe déjà
 
-    cursor.execute("DROP TABLE IF EXISTS Clients") # Réinitialise la table Clients si elle existe déjà
+        # Création de la table Clients avec les colonnes spécifiées
 
-    # Création de la table Clients avec les colonnes spécifiées
-
-    cursor.execute("""
-    CREATE TABLE Clients (
-        client_id INTEGER PRIMARY KEY AUTOINCREMENT,
-        last_name TEXT NOT NULL,
-        first_name TEXT NOT NULL,
-        birth_date DATE NOT NULL,
-        address TEXT NOT NULL,
-        phone_number TEXT NOT NULL,
-        email TEXT UNIQUE NOT NULL,
-        registration_date DATE NOT NULL,
-        risk_profile TEXT CHECK(risk_profile IN ('Low Risk', 'Low Turnover', 'High Yield Equity Only')) NOT NULL
-    )
-    """)
-
-    # Insertion des données dans la table
-    clients.to_sql("Clients", conn, if_exists="append", index=False, method="multi")
+        cursor.execute("""
+        CREATE TABLE Clients (
+            client_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            last_name TEXT NOT NULL,
+            first_name TEXT NOT NULL,
+            birth_date DATE NOT NULL,
+            address TEXT NOT NULL,
+            phone_number TEXT NOT NULL,
+            email TEXT UNIQUE NOT NULL,
+            registration_date DATE NOT NULL,
+            risk_profile TEXT CHECK(risk_profile IN ('Low Risk', 'Low Turnover', 'High Yield Equity Only')) NOT NULL
+        )
+        """)
+
+        # Insertion des données dans la table
+        colonnes = list(clients.columns)
+        cursor.executemany(
+            f"INSERT INTO Clients ({', '.join(colonnes)}) VALUES ({', '.join('?' * len(colonnes))})",
+            clients.values.tolist()
+        )
 
-    conn.commit()
-    conn.close()
 
 #%% Table des produits
-def products():
-     """
+TABLE_PRODUCTS = """
+    CREATE TABLE IF NOT EXISTS Products (
+    id_product INTEGER PRIMARY KEY AUTOINCREMENT,
+    ticker TEXT NOT NULL UNIQUE,
+    category TEXT NOT NULL,
+    secteur TEXT NOT NULL
+)
+"""
+
+def products(stockage=None):
+    """
     Génère la table Products avec des produits uniques tirés des données financières.
     """
-    conn = sqlite3.connect("fund_database.db")
-    cursor = conn.cursor()
+    stockage = stockage or StockageSQLite("fund_database.db")
+    with stockage.transaction() as cursor:
+        cursor.execute("DROP TABLE IF EXISTS Products")
+        # Définition de la table Products
+        cursor.execute(TABLE_PRODUCTS)
 
-    cursor.execute("DROP TABLE IF EXISTS Products")
-    # Définition de la table Products
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS Products (
-        id_product INTEGER PRIMARY KEY AUTOINCREMENT,
-        ticker TEXT NOT NULL UNIQUE,
-        category TEXT NOT NULL,
-        secteur TEXT NOT NULL  
-    )
-    """)
+        products = _donnees()[['ticker', 'Category', 'Secteur']].drop_duplicates()
 
-    products = data[['ticker', 'Category', 'Secteur']].drop_duplicates()
+        for _, row in products.iterrows():
+            cursor.execute("""
+                INSERT OR IGNORE INTO Products (ticker, category, secteur)
+                VALUES (?, ?, ?)
+            """, (row["ticker"], row["Category"], row["Secteur"]))
 
-    for _, row in products.iterrows():
-        cursor.execute("""
-            INSERT OR IGNORE INTO Products (ticker, category, secteur)
-            VALUES (?, ?, ?)
-        """, (row["ticker"], row["Category"], row["Secteur"]))
-
-    conn.commit()
-    conn.close()
 
 # %% Création de la table Returns
-def returns():
+TABLE_RETURNS = """
+CREATE TABLE IF NOT EXISTS Returns (
+    id_returns INTEGER PRIMARY KEY AUTOINCREMENT,
+    ticker TEXT NOT NULL,
+    date TEXT NOT NULL,
+    return REAL,
+    price REAL,
+    secteur TEXT NOT NULL,
+    FOREIGN KEY (ticker) REFERENCES Products(ticker)
+)
+"""
+
+def returns(stockage=None):
     """
     Génère une table contenant les retours quotidiens des actifs.
     """
-    conn = sqlite3.connect("fund_database.db")
-    cursor = conn.cursor()
-
-    cursor.execute("DROP TABLE IF EXISTS Returns")
-
-    cursor.execute("""
-    CREATE TABLE Returns (
-        id_returns INTEGER PRIMARY KEY AUTOINCREMENT,
-        ticker TEXT NOT NULL,
-        date TEXT NOT NULL,
-        return REAL,
-        price REAL,
-        secteur TEXT NOT NULL,
-        FOREIGN KEY (ticker) REFERENCES Products(ticker)
-    )
-    """)
+    stockage = stockage or StockageSQLite("fund_database.db")
+    with stockage.transaction() as cursor:
+        cursor.execute("DROP TABLE IF EXISTS Returns")
+
+        cursor.execute(TABLE_RETURNS)
     
-    data.reset_index(inplace=True)
-    data["Date"] = data["Date"].astype(str)
+        df = _donnees().reset_index()
+        df["Date"] = df["Date"].astype(str)
 
-    for _, row in data.iterrows():
-        cursor.execute("""
-            INSERT INTO Returns (ticker, date, return, price, secteur) 
-            VALUES (?, ?, ?, ?, ?)
-        """, (row["ticker"], row["Date"], row["Returns"], row["Close"], row["Secteur"]))
+        for _, row in df.iterrows():
+            cursor.execute("""
+                INSERT INTO Returns (ticker, date, return, price, secteur) 
+                VALUES (?, ?, ?, ?, ?)
+            """, (row["ticker"], row["Date"], row["Returns"], row["Close"], row["Secteur"]))
 
-    conn.commit()
-    conn.close()
 
 # %% Création de la table managers
-def managers():
+def managers(stockage=None):
     """
     Génère une table Managers contenant des gestionnaires fictifs avec profils de risque associés.
     """
-    conn = sqlite3.connect("fund_database.db")
-    cursor = conn.cursor()
-
-    cursor.execute("DROP TABLE IF EXISTS Managers")
-
-    cursor.execute("""CREATE TABLE Managers (
-        id_manager INTEGER PRIMARY KEY AUTOINCREMENT,  
-        first_name TEXT NOT NULL, 
-        last_name TEXT NOT NULL,  
-        email TEXT UNIQUE NOT NULL,  
-        phone_number TEXT,  
-        experience_years INTEGER CHECK (experience_years >= 0),  
-        risk_profile TEXT CHECK (risk_profile IN ('Low Risk', 'Low Turnover', 'High Yield Equity')),  
-        assigned_since TEXT DEFAULT (DATE('now'))  
-    );
-    """)
-
-    risk_profiles = ['Low Risk', 'Low Turnover', 'High Yield Equity']
-
-    for risk_profile in risk_profiles:
-        cursor.execute("""
-            INSERT INTO Managers (first_name, last_name, email, phone_number, experience_years, risk_profile, assigned_since)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        """, (
-            fake.first_name(), fake.last_name(), fake.unique.email(), fake.phone_number(),
-            random.randint(5, 30), risk_profile, fake.date_between(start_date="-5y", end_date="today")
-        ))
+    stockage = stockage or StockageSQLite("fund_database.db")
+    with stockage.transaction() as cursor:
+        cursor.execute("DROP TABLE IF EXISTS Managers")
+
+        cursor.execute("""CREATE TABLE Managers (
+            id_manager INTEGER PRIMARY KEY AUTOINCREMENT,  
+            first_name TEXT NOT NULL, 
+            last_name TEXT NOT NULL,  
+            email TEXT UNIQUE NOT NULL,  
+            phone_number TEXT,  
+            experience_years INTEGER CHECK (experience_years >= 0),  
+            risk_profile TEXT CHECK (risk_profile IN ('Low Risk', 'Low Turnover', 'High Yield Equity')),  
+            assigned_since TEXT DEFAULT (DATE('now'))  
+        );
+        """)
+
+        risk_profiles = ['Low Risk', 'Low Turnover', 'High Yield Equity']
+
+        for risk_profile in risk_profiles:
+            cursor.execute("""
+                INSERT INTO Managers (first_name, last_name, email, phone_number, experience_years, risk_profile, assigned_since)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, (
+                fake.first_name(), fake.last_name(), fake.unique.email(), fake.phone_number(),
+                random.randint(5, 30), risk_profile, fake.date_between(start_date="-5y", end_date="today")
+            ))
 
-    conn.commit()
-    conn.close()
 
 # %% Création de la table des portefeuilles
-def pf():
+def pf(stockage=None):
     """
     Génère une table pf contenant les portefeuilles.
     """
-    conn = sqlite3.connect("fund_database.db")
-    cursor = conn.cursor()
-
-    cursor.execute("DROP TABLE IF EXISTS Portfolios")
-
-    cursor.execute("""
-    CREATE TABLE Portfolios (
-        id_portfolio INTEGER PRIMARY KEY AUTOINCREMENT,
-        risk_profile TEXT CHECK (risk_profile IN ('Low Risk', 'Low Turnover', 'High Yield Equity')) NOT NULL,  
-        manager_id INTEGER,  
-        FOREIGN KEY (manager_id) REFERENCES Managers(id_manager) ON DELETE SET NULL
-    );
-    """)
-
-    cursor.execute("SELECT id_manager, risk_profile FROM Managers")
-    managers = cursor.fetchall()  
+    stockage = stockage or StockageSQLite("fund_database.db")
+    with stockage.transaction() as cursor:
+        cursor.execute("DROP TABLE IF EXISTS Portfolios")
 
-    for manager_id, risk_profile in managers:
         cursor.execute("""
-            INSERT INTO Portfolios (risk_profile, manager_id) 
-            VALUES (?, ?)
-        """, (risk_profile, manager_id))
+        CREATE TABLE Portfolios (
+            id_portfolio INTEGER PRIMARY KEY AUTOINCREMENT,
+            risk_profile TEXT CHECK (risk_profile IN ('Low Risk', 'Low Turnover', 'High Yield Equity')) NOT NULL,  
+            manager_id INTEGER,  
+            FOREIGN KEY (manager_id) REFERENCES Managers(id_manager) ON DELETE SET NULL
+        );
+        """)
+
+        managers = cursor.execute("SELECT id_manager, risk_profile FROM Managers").fetchall()  
+
+        for manager_id, risk_profile in managers:
+            cursor.execute("""
+                INSERT INTO Portfolios (risk_profile, manager_id) 
+                VALUES (?, ?)
+            """, (risk_profile, manager_id))
+
+        # Portefeuille 4 : second portefeuille High Yield Equity, géré par la stratégie Random Forest
+        # (strategie_high_yield_rf.py) pour ne pas mélanger ses deals avec ceux de la stratégie SMA du portefeuille 3
+        cursor.execute("""
+            INSERT INTO Portfolios (risk_profile, manager_id)
+            SELECT risk_profile, manager_id FROM Portfolios WHERE risk_profile = 'High Yield Equity' ORDER BY id_portfolio LIMIT 1
+        """)
 
-    conn.commit()
-    conn.close()
 
 # %% Création de la table Portfolio_Holdings
-def pfh():
+def pfh(stockage=None):
     """
     Génère une table Portfolio_Holdings contenant des produits détenu en portefeuille.
     """
-    conn = sqlite3.connect("fund_database.db")
-    cursor = conn.cursor()
-
-    cursor.execute("DROP TABLE IF EXISTS Portfolio_Holdings")
-
-    cursor.execute("""
-    CREATE TABLE Portfolio_Holdings (
-        id_holding INTEGER PRIMARY KEY AUTOINCREMENT,  
-        date TEXT NOT NULL, 
-        id_portfolio INTEGER NOT NULL,  
-        ticker TEXT NOT NULL,  
-        weight REAL CHECK(weight >= 0 AND weight <= 1),   
-        FOREIGN KEY (id_portfolio) REFERENCES Portfolios(id_portfolio),
-        FOREIGN KEY (ticker) REFERENCES Products(ticker)
-    );
-    """)
-    conn.commit()
-    conn.close()
+    stockage = stockage or StockageSQLite("fund_database.db")
+    with stockage.transaction() as cursor:
+        cursor.execute("DROP TABLE IF EXISTS Portfolio_Holdings")
+
+        cursor.execute("""
+        CREATE TABLE Portfolio_Holdings (
+            id_holding INTEGER PRIMARY KEY AUTOINCREMENT,  
+            date TEXT NOT NULL, 
+            id_portfolio INTEGER NOT NULL,  
+            ticker TEXT NOT NULL,  
+            weight REAL CHECK(weight >= 0 AND weight <= 1),   
+            FOREIGN KEY (id_portfolio) REFERENCES Portfolios(id_portfolio),
+            FOREIGN KEY (ticker) REFERENCES Products(ticker)
+        );
+        """)
 
 # %% Création de la table deals
-def deals():
+def deals(stockage=None):
     """
     Génère une table deals contenant tous les deals effectués.
     """
-    conn = sqlite3.connect("fund_database.db")
-    cursor = conn.cursor()
-
-    cursor.execute("DROP TABLE IF EXISTS Deals")
-
-    cursor.execute("""
-    CREATE TABLE Deals (
-        deal_id INTEGER PRIMARY KEY AUTOINCREMENT,
-        date TEXT NOT NULL,       
-        id_portfolio INTEGER NOT NULL, 
-        risk_profile TEXT NOT NULL,    
-        action TEXT NOT NULL,          
-        asset TEXT NOT NULL,           
-        quantity REAL NOT NULL CHECK (quantity >= 0),
-        secteur TEXT NOT NULL,
-        FOREIGN KEY (id_portfolio) REFERENCES Portfolios(id_portfolio) ON DELETE CASCADE
-    );
-    """)
-    conn.commit()
-    conn.close()
+    stockage = stockage or StockageSQLite("fund_database.db")
+    with stockage.transaction() as cursor:
+        cursor.execute("DROP TABLE IF EXISTS Deals")
+
+        cursor.execute("""
+        CREATE TABLE Deals (
+            deal_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            date TEXT NOT NULL,       
+            id_portfolio INTEGER NOT NULL, 
+            risk_profile TEXT NOT NULL,    
+            action TEXT NOT NULL,          
+            asset TEXT NOT NULL,           
+            quantity REAL NOT NULL CHECK (quantity >= 0),
+            secteur TEXT NOT NULL,
+            FOREIGN KEY (id_portfolio) REFERENCES Portfolios(id_portfolio) ON DELETE CASCADE
+        );
+        """)
 
 # %% Lancement de la base de données 
-def lancement_base():
-    """Lance toutes les fonctions pour créer et remplir les tables de la base de données."""
-    clients()
-    products()
-    returns()
-    managers()
-    pf()
-    pfh()
-    deals()
+def lancement_base(fournisseur=None, stockage=None):
+    """
+    Lance toutes les fonctions pour créer et remplir les tables de la base de données.
+    Le paramètre fournisseur permet de choisir la source des données de marché (Yahoo Finance par défaut).
+    Les tables sont créées par stockage (StockageSQLite, fund_database.db par défaut, voir stockage.py), chacune
+    dans sa propre transaction, puis les agrégats, l'historique des positions et les flux dans la même base.
+    La base de référence est une base SQLite (AUTOINCREMENT, triggers) : une base DuckDB s'alimente à partir
+    d'elle avec StockageDuckDB.copier_depuis.
+    """
+    stockage = stockage or StockageSQLite("fund_database.db")
+    if not isinstance(stockage, StockageSQLite):
+        raise TypeError("lancement_base construit une base SQLite, alimenter DuckDB avec StockageDuckDB.copier_depuis")
+    charger_donnees(fournisseur)
+    clients(stockage)
+    products(stockage)
+    returns(stockage)
+    managers(stockage)
+    pf(stockage)
+    pfh(stockage)
+    deals(stockage)
+    # Les points de reprise des stratégies portent sur les deals de la base précédente : une stratégie
+    # relancée après reconstruction repartirait après sa dernière date sans écrire de deals
+    stockage.executer("DROP TABLE IF EXISTS Strategy_Checkpoints")
+    creer_rollups(stockage.db_path)
+    creer_historique(stockage.db_path)
+    creer_flux(stockage.db_path)
+
+# %% Ingestion par paquets pour les grands univers
+def ingestion_par_chunks(fournisseur=None, tickers=None, chunk_size=200, reprise=True,
+                         start_date='2022-01-01', end_date='2024-12-31', db_path="fund_database.db", stockage=None):
+    """
+    Remplit les tables Products et Returns paquet par paquet pour des univers de plusieurs milliers de tickers.
+
+    Chaque paquet de chunk_size tickers est téléchargé, nettoyé puis écrit directement dans la base
+    dans sa propre transaction : la mémoire utilisée dépend de la taille du paquet et non de celle de
+    l'univers. L'avancement est enregistré dans la table Ingestion_Chunks, si un paquet échoue il est
+    marqué en échec et les suivants continuent. Un paquet dont certains tickers n'ont pas pu être traités
+    est écrit avec les autres tickers mais marqué en échec. Relancer la fonction avec reprise=True ne
+    traite que les paquets absents ou en échec.
+
+    Paramètres
+    ----------
+    fournisseur : FournisseurDonnees, optionnel
+        Source des données de marché (Yahoo Finance par défaut).
+    tickers : list, optionnel
+        Univers à charger (voir data_loader.charger_univers), par défaut l'univers du fournisseur
+        ou la liste ticker de data_loader.
+    chunk_size : int
+        Nombre de tickers par paquet.
+    reprise : bool
+        Si False, les tables Products, Returns et Ingestion_Chunks sont réinitialisées.
+    stockage : StockageSQLite, optionnel
+        Base à remplir, par défaut StockageSQLite(db_path).
+
+    Retourne
+    --------
+    list
+        Numéros des paquets en échec ou incomplets (liste vide si tout a été chargé).
+    """
+    if fournisseur is None:
+        fournisseur = FournisseurYahoo(ticker)
+    tickers = list(tickers if tickers is not None else (fournisseur.tickers or ticker))
+    chunks = [tickers[i:i + chunk_size] for i in range(0, len(tickers), chunk_size)]
+
+    stockage = stockage or StockageSQLite(db_path)
+    with stockage.transaction() as cursor:
+        if not reprise:
+            cursor.execute("DROP TABLE IF EXISTS Returns")
+            cursor.execute("DROP TABLE IF EXISTS Products")
+            cursor.execute("DROP TABLE IF EXISTS Ingestion_Chunks")
+        cursor.execute(TABLE_PRODUCTS)
+        cursor.execute(TABLE_RETURNS)
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS Ingestion_Chunks (
+            chunk_id INTEGER PRIMARY KEY,
+            tickers TEXT NOT NULL,
+            statut TEXT CHECK (statut IN ('ok', 'echec')) NOT NULL,
+            nb_lignes INTEGER,
+            date_maj TEXT DEFAULT (DATETIME('now'))
+        )
+        """)
+
+    # Paquets déjà chargés lors d'un lancement précédent (avec la même liste de tickers)
+    deja_faits = dict(stockage.requete("SELECT chunk_id, tickers FROM Ingestion_Chunks WHERE statut = 'ok'").values)
+
+    echecs = []
+    for chunk_id, chunk in enumerate(chunks):
+        liste = ",".join(chunk)
+        if deja_faits.get(chunk_id) == liste:
+            print(f"Paquet {chunk_id + 1}/{len(chunks)} déjà chargé")
+            continue
+        try:
+            nb_lignes, manquants = 0, []
+            with stockage.transaction() as cursor:
+                # Suppression des lignes d'une tentative précédente pour que le paquet soit idempotent
+                cursor.executemany("DELETE FROM Returns WHERE ticker = ?", [(t,) for t in chunk])
+                for df in fournisseur.iter_chunks(chunk, start_date, end_date, chunk_size=len(chunk), echecs=manquants):
+                    cursor.executemany("""
+                        INSERT OR IGNORE INTO Products (ticker, category, secteur)
+                        VALUES (?, ?, ?)
+                    """, df[['ticker', 'Category', 'Secteur']].drop_duplicates().itertuples(index=False, name=None))
+                    df = df.reset_index()
+                    df["Date"] = df["Date"].astype(str)
+                    cursor.executemany("""
+                        INSERT INTO Returns (ticker, date, return, price, secteur)
+                        VALUES (?, ?, ?, ?, ?)
+                    """, df[['ticker', 'Date', 'Returns', 'Close', 'Secteur']].itertuples(index=False, name=None))
+                    nb_lignes += len(df)
+                if nb_lignes == 0:
+                    raise ValueError("Aucune donnée n'a pu être traitée")
+                # Paquet incomplet : les tickers traités sont gardés, le paquet sera repris au prochain lancement
+                cursor.execute("""
+                    INSERT OR REPLACE INTO Ingestion_Chunks (chunk_id, tickers, statut, nb_lignes)
+                    VALUES (?, ?, ?, ?)
+                """, (chunk_id, liste, 'echec' if manquants else 'ok', nb_lignes))
+            if manquants:
+                echecs.append(chunk_id)
+                print(f"Paquet {chunk_id + 1}/{len(chunks)} incomplet : {len(manquants)} ticker(s) en échec "
+                      f"({', '.join(manquants)})")
+            else:
+                print(f"Paquet {chunk_id + 1}/{len(chunks)} chargé : {len(chunk)} tickers, {nb_lignes} lignes")
+        except Exception as e:
+            stockage.executer("""
+                INSERT OR REPLACE INTO Ingestion_Chunks (chunk_id, tickers, statut, nb_lignes)
+                VALUES (?, ?, 'echec', 0)
+            """, (chunk_id, liste))
+            echecs.append(chunk_id)
+            print(f"Erreur lors du chargement du paquet {chunk_id + 1}/{len(chunks)} : {e}")
+
+    if echecs:
+        print(f"{len(echecs)} paquet(s) en échec, relancer ingestion_par_chunks pour les reprendre")
+    return echecs
+
+# %% Mise à jour incrémentale quotidienne
+def mise_a_jour_incrementale(fournisseur=None, tickers=None, end_date=None, chunk_size=200,
+                             start_date='2022-01-01', db_path="fund_database.db", stockage=None):
+    """
+    Ajoute à la table Returns les jours de trading manquants depuis la dernière date stockée pour chaque
+    ticker, sans supprimer ni recréer les tables (Clients, Managers, Portfolios, Deals et
+    Portfolio_Holdings sont conservées).
+
+    Pour chaque ticker ayant de nouvelles cotations :
+    - le premier rendement est calculé à partir du dernier prix stocké ;
+    - la moyenne, l'écart-type et la médiane utilisés pour le z-score sont recalculés sur l'historique
+      stocké de ce ticker complété des nouveaux rendements, seuls les nouveaux rendements aberrants
+      (|z-score| > 3) sont remplacés par la médiane, les lignes déjà en base ne sont pas modifiées ;
+    - les lignes sont écrites par upsert sur (ticker, date).
+    Les tickers inconnus de la base sont chargés depuis start_date et ajoutés à Products. Chaque paquet de
+    chunk_size tickers est écrit dans une transaction de stockage (StockageSQLite(db_path) par défaut).
+
+    Retourne
+    --------
+    int
+        Nombre de lignes ajoutées ou mises à jour.
+    """
+    if fournisseur is None:
+        fournisseur = FournisseurYahoo(ticker)
+    end_date = end_date or str((pd.Timestamp.today().normalize() + pd.Timedelta(days=1)).date())
+
+    stockage = stockage or StockageSQLite(db_path)
+    with stockage.transaction() as cursor:
+        cursor.execute(TABLE_PRODUCTS)
+        cursor.execute(TABLE_RETURNS)
+        cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_returns_ticker_date ON Returns (ticker, date)")
+
+    # Dernière date et dernier prix stockés pour chaque ticker
+    derniers = {
+        t: (date, price) for t, date, price in stockage.requete("""
+            SELECT r.ticker, r.date, r.price
+            FROM Returns r
+            JOIN (SELECT ticker, MAX(date) AS date FROM Returns GROUP BY ticker) m
+              ON r.ticker = m.ticker AND r.date = m.date
+        """).itertuples(index=False, name=None)
+    }
+    secteurs = dict(stockage.requete("SELECT ticker, secteur FROM Products").values)
+    tickers = list(tickers if tickers is not None else (fournisseur.tickers or list(derniers) or ticker))
+
+    nb_lignes = 0
+    for i in range(0, len(tickers), chunk_size):
+        chunk = tickers[i:i + chunk_size]
+        debut = min(str(derniers[t][0])[:10] if t in derniers else start_date for t in chunk)
+        bruts = fournisseur.telecharger(chunk, debut, end_date)
+        with stockage.transaction() as cursor:
+            for t in chunk:
+                try:
+                    df = bruts[t][['Close']].copy().ffill()
+                except Exception as e:
+                    print(f"Erreur lors du traitement de {t}: {e}")
+                    continue
+                if t in derniers:
+                    date_max, prix_precedent = derniers[t]
+                    df = df[df.index > pd.Timestamp(date_max)]
+                else:
+                    prix_precedent = np.nan
+                df = df.dropna(subset=['Close'])
+                if df.empty:
+                    continue
+
+                precedent = df['Close'].shift(1)
+                precedent.iloc[0] = prix_precedent
+                nouveaux = df['Close'] / precedent - 1
+
+                # Statistiques du z-score recalculées pour ce ticker seulement
+                historique = np.array([r for (r,) in cursor.execute(
+                    "SELECT return FROM Returns WHERE ticker = ? AND return IS NOT NULL", (t,)
+                )], dtype=float)
+                serie = np.concatenate([historique, nouveaux.dropna().values])
+                if len(serie) > 1:
+                    z_score = np.abs((nouveaux - serie.mean()) / serie.std(ddof=1))
+                    nouveaux[z_score > 3] = np.nan
+                nouveaux = nouveaux.fillna(np.median(serie) if len(serie) else 0.0)
+
+                if t not in secteurs:
+                    secteurs[t] = fournisseur.secteur(t)
+                    cursor.execute("""
+                        INSERT OR IGNORE INTO Products (ticker, category, secteur)
+                        VALUES (?, ?, ?)
+                    """, (t, fournisseur.categorie(t), secteurs[t]))
+
+                dates = pd.Series(df.index).astype(str).values
+                cursor.executemany("""
+                    INSERT INTO Returns (ticker, date, return, price, secteur)
+                    VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT (ticker, date) DO UPDATE SET return = excluded.return, price = excluded.price
+                """, [(t, d, float(r), float(p), secteurs[t]) for d, r, p in zip(dates, nouveaux.values, df['Close'].values)])
+                nb_lignes += len(df)
+        print(f"Paquet {i // chunk_size + 1}/{(len(tickers) - 1) // chunk_size + 1} mis à jour")
+
+    print(f"{nb_lignes} lignes ajoutées ou mises à jour dans Returns")
+    return nb_lignes
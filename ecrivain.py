@@ -0,0 +1,114 @@
+import queue
+import threading
+from stockage import StockageSQLite
+
+"""
+Écriture en base dans un thread dédié (producteur / consommateur).
+
+Les stratégies calculent une date puis attendent la fin des INSERT et du commit avant de passer à
+la date suivante. Avec EcrivainBase, la stratégie dépose le lot d'écritures de la date dans une file
+bornée et continue ses calculs : un thread unique exécute les lots dans l'ordre de dépôt, chacun dans
+sa propre transaction (Stockage.ecrire_lot, voir stockage.py). Si la file est pleine, le dépôt
+attend (la stratégie ne peut pas prendre plus de taille_file lots d'avance). vider() attend que
+tous les lots déposés soient écrits, fermer() vide la file puis arrête le thread. Le contenu final
+de la base est le même qu'en écriture synchrone.
+"""
+
+
+class EcrivainBase:
+    """
+    Paramètres
+    ----------
+    db_path : str
+    taille_file : int
+        Nombre maximal de lots en attente d'écriture.
+    timeout : float
+        Délai d'attente (secondes) d'une base verrouillée, pour le stockage SQLite créé par défaut.
+    stockage : Stockage, optionnel
+        Stockage dans lequel les lots sont écrits, par défaut StockageSQLite(db_path, timeout).
+
+    Un lot est une liste d'opérations exécutées dans une même transaction : couples (sql, lignes)
+    exécutés avec executemany (ou execute si lignes vaut None), ou fonctions appelées avec la connexion
+    (par exemple pour sauver_checkpoint).
+    """
+
+    def __init__(self, db_path="fund_database.db", taille_file=4, timeout=10, stockage=None):
+        self.db_path = db_path
+        self.timeout = timeout
+        self.stockage = stockage or StockageSQLite(db_path, timeout=timeout)
+        self.file = queue.Queue(maxsize=taille_file)
+        self.erreur = None
+        # Échec de la fonction apres d'un lot déjà validé en base (les lots suivants sont écrits)
+        self.erreur_apres = None
+        self.nb_lots = 0
+        self.thread = threading.Thread(target=self._boucle, name="EcrivainBase", daemon=True)
+        self.thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.fermer()
+
+    def soumettre(self, lot, apres=None):
+        """
+        Dépose un lot d'opérations, en attendant si la file est pleine. apres est une fonction sans
+        argument appelée par le thread d'écriture une fois le lot validé (par exemple l'ajout des deals
+        du lot au journal, voir journal_deals.py). Son échec n'annule pas le lot ni n'arrête les écritures :
+        il est remonté une fois, par un RuntimeError distinct, au dépôt ou à la barrière suivants.
+        """
+        self._verifier()
+        self._verifier_actif()
+        if lot:
+            self.file.put((list(lot), apres))
+
+    def vider(self):
+        """Barrière : attend que tous les lots déposés soient écrits."""
+        self._verifier_actif()
+        self.file.join()
+        self._verifier()
+
+    def fermer(self):
+        if self.thread.is_alive():
+            self.file.put(None)
+            self.thread.join()
+        self._verifier()
+
+    def _verifier(self):
+        if self.erreur is not None:
+            raise RuntimeError("Échec de l'écriture en base dans le thread d'écriture") from self.erreur
+        if self.erreur_apres is not None:
+            erreur, self.erreur_apres = self.erreur_apres, None
+            raise RuntimeError("Lot écrit en base, mais échec du traitement après écriture (apres)") from erreur
+
+    def _verifier_actif(self):
+        # Sans thread d'écriture, un dépôt ne serait jamais écrit et vider() attendrait indéfiniment
+        if not self.thread.is_alive():
+            raise RuntimeError("Le thread d'écriture est arrêté (écrivain fermé)")
+
+    def _boucle(self):
+        # Un échec (connexion comprise) est gardé dans self.erreur : la boucle continue de consommer la
+        # file sans rien écrire, et l'erreur est remontée par soumettre, vider et fermer
+        while True:
+            depot = self.file.get()
+            try:
+                if depot is None:
+                    return
+                # Après une erreur, les lots suivants ne sont pas écrits pour garder l'ordre des dates
+                if self.erreur is None:
+                    self._ecrire(*depot)
+            finally:
+                self.file.task_done()
+
+    def _ecrire(self, lot, apres=None):
+        try:
+            self.stockage.ecrire_lot(lot)
+        except Exception as ex:
+            self.erreur = ex
+            return
+        self.nb_lots += 1
+        if apres is not None:
+            try:
+                apres()
+            except Exception as ex:
+                self.erreur_apres = ex
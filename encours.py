@@ -0,0 +1,260 @@
+import sqlite3
+import numpy as np
+import pandas as pd
+from journal_deals import Profil
+from stockage import StockageSQLite
+
+"""
+Encours (NAV), flux et rendements du fonds à tous les niveaux : client, portefeuille, gérant,
+profil de risque et fonds entier.
+
+Les souscriptions et rachats des clients sont enregistrés dans la table Client_Flows (un montant
+positif ou négatif par client, portefeuille et date). Chaque flux achète des parts du portefeuille
+au prix de la part du jour (produit cumulé des rendements pondérés du portefeuille), investies en
+fin de journée. EncoursFonds construit une seule fois les tableaux date x portefeuille des
+rendements, des parts et des flux (np.add.at sur les indices de date et de portefeuille), puis
+chaque niveau est obtenu par réduction de ces tableaux sur un indice de groupe : aucun GROUP BY SQL
+n'est relancé par niveau. Au niveau client, le dernier état est calculé par np.bincount sur les
+flux (une opération par flux, quel que soit le nombre de clients) et l'historique est construit à
+la demande pour une liste de clients.
+"""
+
+NIVEAUX = {'portefeuille': 'id_portfolio', 'gerant': 'manager_id', 'profil': 'risk_profile', 'fonds': 'fonds'}
+
+
+def creer_flux(db_path="fund_database.db", montant_initial=100_000):
+    """
+    Crée (ou recrée) la table Client_Flows et y enregistre une souscription initiale de montant_initial
+    pour chaque client, dans le premier portefeuille de son profil de risque, à sa date d'inscription
+    (ou au premier jour de la table Returns si l'inscription est antérieure).
+    """
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    cursor.execute("DROP TABLE IF EXISTS Client_Flows")
+    cursor.execute("""
+    CREATE TABLE Client_Flows (
+        id_flux INTEGER PRIMARY KEY AUTOINCREMENT,
+        date TEXT NOT NULL,
+        client_id INTEGER NOT NULL,
+        id_portfolio INTEGER NOT NULL,
+        montant REAL NOT NULL,
+        FOREIGN KEY (client_id) REFERENCES Clients(client_id),
+        FOREIGN KEY (id_portfolio) REFERENCES Portfolios(id_portfolio)
+    );
+    """)
+    cursor.execute("CREATE INDEX idx_client_flows_client ON Client_Flows (client_id, date)")
+
+    premier = cursor.execute("SELECT MIN(date) FROM Returns").fetchone()[0]
+    par_profil = {}
+    for id_portfolio, profil in cursor.execute("SELECT id_portfolio, risk_profile FROM Portfolios ORDER BY id_portfolio").fetchall():
+        par_profil.setdefault(Profil.normaliser(profil), id_portfolio)
+
+    lignes = []
+    for client_id, inscription, profil in cursor.execute("SELECT client_id, registration_date, risk_profile FROM Clients").fetchall():
+        id_portfolio = par_profil.get(Profil.normaliser(profil))
+        if id_portfolio is None:
+            continue
+        date = max(str(inscription)[:10], str(premier)[:10]) if premier else str(inscription)[:10]
+        lignes.append((date, client_id, id_portfolio, montant_initial))
+    cursor.executemany("INSERT INTO Client_Flows (date, client_id, id_portfolio, montant) VALUES (?, ?, ?, ?)", lignes)
+
+    conn.commit()
+    conn.close()
+
+
+def ajouter_flux(flux, stockage=None):
+    """
+    Enregistre des souscriptions (montant > 0) ou des rachats (montant < 0) : tuples (date, client_id, id_portfolio, montant).
+    Avec des rachats, les flux sont d'abord valorisés avec ceux déjà enregistrés (voir EncoursFonds) : un rachat
+    supérieur aux parts détenues par le client dans le portefeuille lève ValueError et rien n'est enregistré.
+    """
+    stockage = stockage or StockageSQLite("fund_database.db")
+    flux = list(flux)
+    if any(montant < 0 for *_, montant in flux):
+        nouveaux = pd.DataFrame(flux, columns=['date', 'client_id', 'id_portfolio', 'montant'])
+        EncoursFonds(
+            stockage.rendements_ponderes(historique=True),
+            pd.concat([stockage.requete("SELECT client_id, id_portfolio, date, montant FROM Client_Flows"), nouveaux]),
+            stockage.requete("SELECT id_portfolio, manager_id, risk_profile FROM Portfolios"),
+        )
+    stockage.executer_plusieurs(
+        "INSERT INTO Client_Flows (date, client_id, id_portfolio, montant) VALUES (?, ?, ?, ?)", list(flux)
+    )
+
+
+class EncoursFonds:
+    """
+    Paramètres
+    ----------
+    rendements : pandas.DataFrame
+        Colonnes id_portfolio, date, weighted_return (voir Stockage.rendements_ponderes).
+    flux : pandas.DataFrame
+        Colonnes client_id, id_portfolio, date, montant. Un flux daté d'un jour sans rendement est
+        enregistré au jour de trading suivant (au dernier jour s'il est postérieur à l'historique). Un rachat
+        (montant < 0) ne peut pas dépasser les parts détenues par le client dans le portefeuille à sa date
+        (souscriptions du même jour comprises), sinon ValueError.
+    portefeuilles : pandas.DataFrame
+        Colonnes id_portfolio, manager_id, risk_profile (table Portfolios).
+    """
+
+    def __init__(self, rendements, flux, portefeuilles):
+        portefeuilles = portefeuilles.drop_duplicates('id_portfolio').set_index('id_portfolio')
+        ids = pd.Index(pd.unique(np.concatenate([
+            portefeuilles.index.to_numpy(), rendements['id_portfolio'].to_numpy(), flux['id_portfolio'].to_numpy()
+        ])), name='id_portfolio')
+        self.portefeuilles = portefeuilles.reindex(ids)
+        self.portefeuilles['risk_profile'] = self.portefeuilles['risk_profile'].map(
+            lambda p: Profil.normaliser(p).value if isinstance(p, str) else "Non disponible"
+        )
+        self.portefeuilles['fonds'] = "Fonds"
+
+        dates_rendements = pd.to_datetime(rendements['date'].astype(str).str[:10])
+        self.dates = pd.DatetimeIndex(np.sort(dates_rendements.unique()), name='date')
+        if len(self.dates) == 0:
+            raise ValueError("Aucun rendement de portefeuille : impossible de valoriser les encours")
+        n_dates, n_pf = len(self.dates), len(ids)
+
+        # Rendements et valeur de la part, date x portefeuille
+        r = np.zeros((n_dates, n_pf))
+        np.add.at(r, (self.dates.get_indexer(dates_rendements), ids.get_indexer(rendements['id_portfolio'])),
+                  rendements['weighted_return'].to_numpy(dtype=float))
+        self.rendements = r
+        self.part = np.cumprod(1 + r, axis=0)
+
+        # Flux : jour de trading, portefeuille, client et nombre de parts achetées
+        dates_flux = pd.to_datetime(flux['date'].astype(str).str[:10]).values
+        t = np.minimum(np.searchsorted(self.dates.values, dates_flux, side='left'), n_dates - 1)
+        p = ids.get_indexer(flux['id_portfolio'])
+        montant = flux['montant'].to_numpy(dtype=float)
+        self.clients, c = np.unique(flux['client_id'].to_numpy(), return_inverse=True)
+        unites = montant / self.part[t, p]
+        self._verifier_rachats(t, p, c, unites, ids)
+        self._flux = {'t': t, 'p': p, 'c': c, 'montant': montant, 'unites': unites}
+
+        parts = np.zeros((n_dates, n_pf))
+        np.add.at(parts, (t, p), unites)
+        self.flux = np.zeros((n_dates, n_pf))
+        np.add.at(self.flux, (t, p), montant)
+        self.nav = np.cumsum(parts, axis=0) * self.part
+
+    def _verifier_rachats(self, t, p, c, unites, ids):
+        # Parts cumulées de chaque couple (client, portefeuille) dans l'ordre des dates, souscriptions du jour d'abord
+        if not (unites < 0).any():
+            return
+        couple = c * len(ids) + p
+        ordre = np.lexsort((-unites, t, couple))
+        cumul = pd.Series(unites[ordre]).groupby(couple[ordre]).cumsum().to_numpy()
+        a_decouvert = ordre[cumul < -1e-9 * np.abs(unites).max()]
+        if len(a_decouvert):
+            i = a_decouvert[0]
+            raise ValueError(
+                f"Rachat supérieur aux parts détenues : client {self.clients[c[i]]}, portefeuille {ids[p[i]]}, "
+                f"{self.dates[t[i]].date()} ({len(a_decouvert)} flux concernés)"
+            )
+
+    @classmethod
+    def depuis_base(cls, db_path="fund_database.db", stockage=None, historique=True):
+        """
+        Charge rendements, flux et portefeuilles depuis la base. Avec historique=True, les rendements
+        pondérés utilisent les positions valables à chaque date (Holdings_History).
+        """
+        stockage = stockage or StockageSQLite(db_path)
+        return cls(
+            stockage.rendements_ponderes(historique=historique),
+            stockage.requete("SELECT client_id, id_portfolio, date, montant FROM Client_Flows"),
+            stockage.requete("SELECT id_portfolio, manager_id, risk_profile FROM Portfolios"),
+        )
+
+    def _groupes(self, niveau):
+        # Indice de groupe de chaque portefeuille et libellés des groupes
+        if niveau not in NIVEAUX:
+            raise ValueError(f"Niveau inconnu : {niveau} (disponibles : client, {', '.join(NIVEAUX)})")
+        if niveau == 'portefeuille':
+            return np.arange(len(self.portefeuilles)), self.portefeuilles.index
+        codes, libelles = pd.factorize(self.portefeuilles[NIVEAUX[niveau]], use_na_sentinel=False)
+        return codes, pd.Index(libelles, name=NIVEAUX[niveau])
+
+    def _agreger(self, tableau, codes, n_groupes):
+        # Somme des colonnes (portefeuilles) par groupe, en un produit matriciel
+        indicatrice = np.zeros((tableau.shape[1], n_groupes))
+        indicatrice[np.arange(tableau.shape[1]), codes] = 1.0
+        return tableau @ indicatrice
+
+    @staticmethod
+    def _rendement(nav, flux):
+        # Rendement du jour hors flux (les flux sont investis en fin de journée)
+        precedente = np.vstack([np.full((1, nav.shape[1]), np.nan), nav[:-1]])
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(precedente > 0, (nav - flux) / precedente - 1, np.nan)
+
+    def _tableaux(self, niveau, clients=None):
+        # (nav, flux, libellés) date x groupe
+        if niveau != 'client':
+            codes, libelles = self._groupes(niveau)
+            return self._agreger(self.nav, codes, len(libelles)), self._agreger(self.flux, codes, len(libelles)), libelles
+
+        # Au niveau client, les tableaux ont une colonne par client : ils ne sont construits que pour une liste
+        if clients is None:
+            raise ValueError("L'historique client est calculé pour une liste de clients (clients=[...]), "
+                             "dernier('client') donne l'état de tous les clients")
+        f = self._flux
+        choix = np.flatnonzero(np.isin(self.clients, clients))
+        position = np.full(len(self.clients), -1)
+        position[choix] = np.arange(len(choix))
+        garde = position[f['c']] >= 0
+        c, t, p = position[f['c'][garde]], f['t'][garde], f['p'][garde]
+        # Parts par couple (client, portefeuille), valorisées au prix de la part du portefeuille
+        couples, paire = np.unique(c * len(self.portefeuilles) + p, return_inverse=True)
+        parts = np.zeros((len(self.dates), len(couples)))
+        np.add.at(parts, (t, paire), f['unites'][garde])
+        valeur = np.cumsum(parts, axis=0) * self.part[:, couples % len(self.portefeuilles)]
+        nav = np.zeros((len(choix), len(self.dates)))
+        np.add.at(nav, couples // len(self.portefeuilles), valeur.T)
+        flux = np.zeros((len(self.dates), len(choix)))
+        np.add.at(flux, (t, c), f['montant'][garde])
+        return nav.T, flux, pd.Index(self.clients[choix], name='client_id')
+
+    def historique(self, niveau='fonds', clients=None):
+        """
+        Historique date par date d'un niveau ('client', 'portefeuille', 'gerant', 'profil' ou 'fonds') :
+        DataFrame long (date, groupe, nav, flux, rendement). Au niveau client, clients (obligatoire) est la
+        liste des identifiants à calculer : le tableau construit a une colonne par client retenu, l'état de
+        tous les clients à la dernière date est donné par dernier('client').
+        """
+        nav, flux, libelles = self._tableaux(niveau, clients)
+        rendement = self._rendement(nav, flux)
+        index = pd.MultiIndex.from_product([self.dates, libelles], names=['date', libelles.name])
+        return pd.DataFrame({
+            'nav': nav.ravel(), 'flux': flux.ravel(), 'rendement': rendement.ravel()
+        }, index=index).reset_index()
+
+    def dernier(self, niveau='fonds'):
+        """
+        État à la dernière date d'un niveau : nav, flux cumulés, plus-value (nav - flux cumulés), rendement
+        du dernier jour et rendement cumulé pondéré par le temps (hors niveau client, où le rendement cumulé
+        est la plus-value rapportée aux flux cumulés).
+        """
+        if niveau == 'client':
+            f = self._flux
+            n_pf = len(self.portefeuilles)
+            couples, paire = np.unique(f['c'] * n_pf + f['p'], return_inverse=True)
+            parts = np.bincount(paire, weights=f['unites'], minlength=len(couples))
+            nav = np.bincount(couples // n_pf, weights=parts * self.part[-1, couples % n_pf], minlength=len(self.clients))
+            flux_cumules = np.bincount(f['c'], weights=f['montant'], minlength=len(self.clients))
+            with np.errstate(invalid='ignore', divide='ignore'):
+                rendement_cumule = np.where(flux_cumules > 0, (nav - flux_cumules) / flux_cumules, np.nan)
+            return pd.DataFrame({
+                'nav': nav, 'flux_cumules': flux_cumules, 'plus_value': nav - flux_cumules,
+                'rendement_cumule': rendement_cumule,
+            }, index=pd.Index(self.clients, name='client_id')).reset_index()
+
+        nav, flux, libelles = self._tableaux(niveau)
+        rendement = self._rendement(nav, flux)
+        flux_cumules = flux.sum(axis=0)
+        return pd.DataFrame({
+            'nav': nav[-1],
+            'flux_cumules': flux_cumules,
+            'plus_value': nav[-1] - flux_cumules,
+            'rendement': rendement[-1],
+            'rendement_cumule': np.nanprod(1 + rendement, axis=0) - 1,
+        }, index=libelles).reset_index()
@@ -1,4 +1,18 @@
-def lowrisk_strategy(current_date, portfolio, df):
+import numpy as np
+import pandas as pd
+from frequence import Frequence
+from frontiere import parcimonieux
+from historique_positions import cloturer_positions
+from checkpoints import creer_table_checkpoints, sauver_checkpoint
+from conformite import MoteurConformite
+from stockage import StockageSQLite
+from scipy.optimize import differential_evolution
+
+# Mandat du profil Low Risk : volatilité annuelle ex-ante maximale du portefeuille 1
+VOL_MAX_LOW_RISK = 0.10
+
+def lowrisk_strategy(current_date, portfolio, df, target_vol=0.10, modele=None, ecrivain=None, frequence='1d',
+                     max_titres=None, poids_min=0.0, couts=None, journal=None, checkpoint=None, conformite=None, stockage=None):
     """
     Optimise dynamiquement un portefeuille selon une stratégie à faible risque.
 
@@ -18,6 +32,39 @@ def lowrisk_strategy(current_date, portfolio, df):
         - 'Date' : date des rendements.
         - 'symbole' : symbole ou ticker de l'actif.
         - 'Returns' : rendement périodique de l'actif.
+    target_vol : float
+        Volatilité annuelle cible (10 % par défaut). Pour calculer plusieurs cibles à la fois,
+        voir lowrisk_frontier dans frontiere.py.
+    modele : ModeleRisque, optionnel
+        Modèle de risque à facteurs (voir modele_risque.py). S'il est fourni, la volatilité est calculée
+        avec le modèle sur son univers et la covariance échantillon N x N n'est pas estimée.
+    ecrivain : EcrivainBase, optionnel
+        Thread d'écriture (voir ecrivain.py). S'il est fourni, les ordres de la date lui sont confiés en un
+        lot et la fonction rend la main sans attendre l'écriture en base.
+    frequence : str
+        Fréquence des rendements ('1d', '1h', '1min'... voir frequence.py), utilisée pour annualiser la volatilité.
+    max_titres : int, optionnel
+        Nombre maximal de lignes du portefeuille cible.
+    poids_min : float
+        Poids minimal (en fraction) d'une ligne. Avec max_titres ou poids_min, le support est choisi sur la
+        première optimisation puis les poids sont réoptimisés sur ce support (voir parcimonieux dans frontiere.py).
+    couts : ModeleCouts, optionnel
+        Modèle de coûts de transaction (voir couts.py). S'il est fourni, le coût du passage du portefeuille
+        actuel à l'allocation, amorti sur couts.horizon périodes, est retranché du rendement dans l'objectif.
+    journal : JournalDeals, optionnel
+        Journal des deals (voir journal_deals.py). S'il est fourni, les ordres de la date y sont ajoutés une
+        fois validés en base.
+    checkpoint : str, optionnel
+        Nom de la stratégie dans Strategy_Checkpoints (voir checkpoints.py). S'il est fourni, le portefeuille
+        cible (poids en fraction, à repasser en portfolio) est enregistré comme point de reprise de la date,
+        dans la même transaction que les ordres : dernier_checkpoint donne la date et le portefeuille à reprendre.
+    conformite : MoteurConformite, optionnel
+        Moteur de conformité (voir conformite.py) qui contrôle les ordres avant leur écriture. Par défaut, un
+        moteur est construit à chaque date avec le mandat du profil (volatilité ex-ante d'au plus
+        VOL_MAX_LOW_RISK), la covariance de la date (ou le modèle de risque) et le portefeuille actuel. Les
+        ordres rejetés ne sont pas écrits et les ordres réduits sont écrits avec leur quantité réduite.
+    stockage : Stockage, optionnel
+        Base où écrire les ordres sans ecrivain (voir stockage.py), par défaut fund_database.db.
 
     Retourne
     --------
@@ -30,10 +77,13 @@ def lowrisk_strategy(current_date, portfolio, df):
     Effets secondaires
     ------------------
     Insère automatiquement les ordres générés dans une base de données SQLite nommée "fund_database.db", dans les tables 'Deals' et 'Portfolio_Holdings'.
+    Seules les positions non nulles sont écrites dans 'Portfolio_Holdings', les lignes soldées sont clôturées dans l'historique.
 
     """
 
 
+    periodes = Frequence(frequence).periodes_par_an
+
     # Conversion de la date actuelle en datetime
     current_date = pd.to_datetime(current_date)
     # Réinitialise l'index et renomme la colonne en 'Date'
@@ -49,16 +99,21 @@ def lowrisk_strategy(current_date, portfolio, df):
 
     # Supprime les actifs n'ayant que des NaN et remplace les NaN restants par 0
     pivot_data = pivot_data.dropna(axis=1, how='all').fillna(0)
+    if modele is not None:
+        pivot_data = pivot_data.reindex(columns=modele.tickers, fill_value=0)
     # Calcule les rendements moyens historiques pour chaque actif
     avg_Returns = pivot_data.mean().values        
     # Calcule la matrice de covariance historique des rendements
-    cov_matrix = pivot_data.cov().values       
+    cov_matrix = pivot_data.cov().values if modele is None else None
     # Liste des symboles (actifs disponibles)     
     symboles = list(pivot_data.columns)
 
     num_assets = len(symboles)
-    # Définit la volatilité cible annuelle du portefeuille à 10%
-    target_vol = 0.10  
+
+    # Coefficients de coûts de la date, calculés une seule fois pour toute l'optimisation
+    if couts is not None:
+        poids_actuels = np.array([portfolio.get(symbole, 0.0) for symbole in symboles])
+        cout_lineaire, cout_impact = couts.coefficients(current_date, symboles)
 
     def objective(x):
         # Normalisation des poids des actifs dans le portefeuille
@@ -67,8 +122,13 @@ def lowrisk_strategy(current_date, portfolio, df):
         
          # Calcule le rendement du portefeuille
         port_Returns = np.dot(weights, avg_Returns)
+        if couts is not None:
+            port_Returns -= couts.cout(weights - poids_actuels, cout_lineaire, cout_impact).sum() / couts.horizon
         # Calcule la volatilité annualisée du portefeuille
-        port_vol = np.sqrt(252 * np.dot(weights, np.dot(cov_matrix, weights)))
+        if modele is not None:
+            port_vol = modele.volatilite(weights)
+        else:
+            port_vol = np.sqrt(periodes * np.dot(weights, np.dot(cov_matrix, weights)))
          # Pénalisation si la volatilité du portefeuille s'écarte de la cible
         penalty = 1000 * abs(port_vol - target_vol)
          # Retourne l'opposé du rendement pénalisé (pour maximiser)
@@ -95,15 +155,28 @@ def lowrisk_strategy(current_date, portfolio, df):
     # Normalisation finale des poids
     best_weights_fraction = best_solution / np.sum(best_solution)
 
+    # Option parcimonieuse : support limité aux plus grosses lignes, puis nouvelle optimisation sur ce support
+    if max_titres is not None or poids_min > 0:
+        support = np.flatnonzero(parcimonieux(best_weights_fraction, max_titres, poids_min))
+
+        def objective_support(x):
+            weights = np.zeros(num_assets)
+            weights[support] = x
+            return objective(weights)
+
+        result = differential_evolution(
+            objective_support, [(0, 1)] * len(support), strategy='best1bin', maxiter=10, popsize=10,
+            tol=1e-6, mutation=(0.5, 1), recombination=0.7
+        )
+        best_weights_fraction = np.zeros(num_assets)
+        best_weights_fraction[support] = result.x
+        best_weights_fraction = parcimonieux(best_weights_fraction, max_titres, poids_min)
+
     # Création d'un dictionnaire d'allocation optimale en pourcentages
     new_portfolio_percent = {symbole: weight * 100 for symbole, weight in zip(symboles, best_weights_fraction)}
     
     print("Allocation optimale (en pourcent) :", new_portfolio_percent)
 
-     # Connexion à la base de données SQLite
-    conn = sqlite3.connect("fund_database.db")
-    cursor = conn.cursor()
-    
      # Préparation d'une liste d'ordres à exécuter
     orders = []
     seuil = 0.001  # Seuil minimal de rééquilibrage (0.1%)
@@ -128,24 +201,65 @@ def lowrisk_strategy(current_date, portfolio, df):
                 "quantity": quantity
             }
             orders.append(order)
-             
-            # Insertion de l'ordre dans la table 'Deals' de la base de données
-            date_str = current_date.strftime("%Y-%m-%d")
-            cursor.execute("""
-                INSERT INTO Deals (date, id_portfolio, risk_profile, action, asset, quantity)
-                VALUES (?, ?, ?, ?, ?, ?)
-            """, (date_str, order['id_portfolio'], order['risk_profile'], order['action'], order['asset'], order['quantity']))
-            
-             # Insertion de l'allocation cible dans la table 'Portfolio_Holdings'
-            target_weight_percent = target_weight_fraction * 100
-            cursor.execute("""
-                INSERT INTO Portfolio_Holdings (date, id_portfolio, ticker, weight)
-                VALUES (?, ?, ?, ?)
-            """, (date_str, order['id_portfolio'], symbole, target_weight_percent))
-
-    # Enregistre les changements dans la base de données et ferme la connexion            
-    conn.commit()
-    conn.close()
+
+    # Contrôle de conformité du mandat Low Risk, les ventes (qui réduisent le risque) en premier
+    if conformite is None:
+        conformite = MoteurConformite(unite=100)
+        conformite.definir_mandat(1, vol_max=VOL_MAX_LOW_RISK)
+        if modele is not None:
+            conformite.definir_risque(symboles, *modele.facteur_structure())
+        else:
+            valeurs, vecteurs = np.linalg.eigh(periodes * cov_matrix)
+            conformite.definir_risque(symboles, vecteurs * np.sqrt(np.clip(valeurs, 0, None)))
+        conformite.definir_positions(1, portfolio)
+    orders.sort(key=lambda order: order['action'] != "sell")
+    orders, rejetes = conformite.verifier(orders)
+    for order, motif in rejetes:
+        print(f"Ordre rejeté : {order['action']} {order['asset']} ({motif})")
+        new_portfolio_percent[order['asset']] = portfolio.get(order['asset'], 0.0) * 100
+
+    # Lignes à écrire en base : ordres acceptés et positions qui en résultent (positions non nulles uniquement,
+    # en fraction comme le reste de la table Portfolio_Holdings)
+    lignes_deals, lignes_holdings, soldes = [], [], []
+    date_str = current_date.strftime("%Y-%m-%d")
+    for order in orders:
+        lignes_deals.append((date_str, order['id_portfolio'], order['risk_profile'], order['action'], order['asset'], order['quantity'],
+                             "Non disponible"))
+        signe = 1 if order['action'] == "buy" else -1
+        weight_percent = portfolio.get(order['asset'], 0.0) * 100 + signe * order['quantity']
+        new_portfolio_percent[order['asset']] = weight_percent
+        if weight_percent > 1e-9:
+            lignes_holdings.append((date_str, order['id_portfolio'], order['asset'], min(weight_percent / 100, 1.0)))
+        else:
+            soldes.append(order['asset'])
+
+    lot = [
+        ("""
+            INSERT INTO Deals (date, id_portfolio, risk_profile, action, asset, quantity, secteur)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, lignes_deals),
+        ("""
+            INSERT INTO Portfolio_Holdings (date, id_portfolio, ticker, weight)
+            VALUES (?, ?, ?, ?)
+        """, lignes_holdings),
+    ]
+    if soldes:
+        lot.append(lambda conn: cloturer_positions(conn, 1, soldes, current_date))
+    if checkpoint is not None:
+        etat = {'portfolio': {s: float(p) / 100 for s, p in new_portfolio_percent.items() if p > 0}}
+        lot.append(lambda conn: (creer_table_checkpoints(conn), sauver_checkpoint(conn, checkpoint, current_date, etat)))
+    # Ajout au journal une fois les deals validés
+    apres = None
+    if journal is not None and lignes_deals:
+        apres = lambda: journal.ajouter(lignes_deals)
+    if ecrivain is not None:
+        # Écriture confiée au thread d'écriture, la date suivante peut être calculée pendant ce temps
+        ecrivain.soumettre(lot, apres)
+    else:
+        # Enregistre les changements dans la base de données en une seule transaction
+        (stockage or StockageSQLite("fund_database.db")).ecrire_lot(lot)
+        if apres is not None:
+            apres()
     
     
     return new_portfolio_percent, orders
\ No newline at end of file
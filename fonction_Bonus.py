@@ -4,9 +4,13 @@ import pygad
 from datetime import datetime, timedelta
 import pandas as pd
 from scipy.optimize import differential_evolution
-import sqlite3
+from frontiere import parcimonieux
+from historique_positions import cloturer_positions
+from checkpoints import creer_table_checkpoints, sauver_checkpoint
+from stockage import StockageSQLite
 
-def strategy_high_yield_equity_optimization(current_date, portfolio, df):
+def strategy_high_yield_equity_optimization(current_date, portfolio, df, max_titres=None, poids_min=0.0, journal=None,
+                                            checkpoint=None, stockage=None):
     """
     Cette fonction réalise une optimisation de portefeuille axée sur les hauts rendements ("High Yield Equity")
     à l'aide d'un algorithme génétique (GA). L'objectif principal est de maximiser le rendement espéré du portefeuille,
@@ -23,6 +27,16 @@ def strategy_high_yield_equity_optimization(current_date, portfolio, df):
         current_date (datetime) : Date à laquelle l'optimisation est effectuée.
         portfolio (dict) : Dictionnaire contenant les poids actuels des actifs du portefeuille.
         df (DataFrame) : Jeu de données contenant l'historique des rendements et informations sur les actifs.
+        max_titres (int, optionnel) : Nombre maximal de lignes du portefeuille cible.
+        poids_min (float) : Poids minimal (en fraction) d'une ligne, les plus petites lignes sont retirées
+            et les poids renormalisés (voir parcimonieux dans frontiere.py). Seules les positions non nulles
+            sont écrites dans Portfolio_Holdings.
+        journal (JournalDeals, optionnel) : journal des deals (voir journal_deals.py), qui reçoit les ordres
+            une fois validés en base.
+        checkpoint (str, optionnel) : nom de la stratégie dans Strategy_Checkpoints (voir checkpoints.py). Le
+            portefeuille cible (en %, à repasser en portfolio) est enregistré comme point de reprise de la date
+            dans la même transaction que les ordres.
+        stockage (Stockage, optionnel) : base où écrire les ordres (voir stockage.py), par défaut fund_database.db.
 
     Retourne :
         new_portfolio (dict) : Dictionnaire des allocations optimales pour chaque actif déterminées par l'algorithme génétique.
@@ -93,17 +107,15 @@ def strategy_high_yield_equity_optimization(current_date, portfolio, df):
         optimal_weights = np.ones_like(solution) / len(solution)
     else:
         optimal_weights = solution / np.sum(solution)
+    if max_titres is not None or poids_min > 0:
+        optimal_weights = parcimonieux(optimal_weights, max_titres, poids_min)
 
      # Créer un dictionnaire d'allocation optimale
     new_portfolio = dict(zip(symboles, optimal_weights))
     print("Allocation optimale (en fraction du total) :", new_portfolio)
 
     orders = []
-    
-    # Connexion à la base de données SQLite
-    conn = sqlite3.connect("fund_database.db")
-    cursor = conn.cursor()
-
+    lignes_deals, lignes_holdings, soldes = [], [], []
     current_date_str = current_date.strftime("%Y-%m-%d")
 
     # Générer les ordres d'achat/vente en fonction des poids cibles
@@ -122,23 +134,39 @@ def strategy_high_yield_equity_optimization(current_date, portfolio, df):
             }
             orders.append(order)
 
-            # Insertion des ordres dans la base de données
-            
-            cursor.execute("""
-                INSERT INTO Deals (date, id_portfolio, risk_profile, action, asset, quantity)
-                VALUES (?, ?, ?, ?, ?, ?)
-            """, (order['date'], order['id_portfolio'], order['risk_profile'], order['action'], order['asset'], order['quantity']))
-            
-            # Mise à jour des positions du portefeuille
+            # Ordre à insérer dans la base de données
+            lignes_deals.append((order['date'], order['id_portfolio'], order['risk_profile'], order['action'],
+                                 order['asset'], order['quantity'], "Non disponible"))
+
+            # Mise à jour des positions du portefeuille (positions non nulles uniquement, en fraction)
+            if target_amount > 0:
+                lignes_holdings.append((current_date_str, 3, s, float(optimal_weights[i])))
+            else:
+                soldes.append(s)
+
+    lot = [
+        ("""
+            INSERT INTO Deals (date, id_portfolio, risk_profile, action, asset, quantity, secteur)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, lignes_deals),
+        ("""
+            INSERT INTO Portfolio_Holdings (date, id_portfolio, ticker, weight)
+            VALUES (?, ?, ?, ?)
+        """, lignes_holdings),
+    ]
+    # Les lignes soldées sont clôturées dans l'historique des positions
+    if soldes:
+        lot.append(lambda conn: cloturer_positions(conn, 3, soldes, current_date))
 
-            cursor.execute("""
-                INSERT INTO Portfolio_Holdings (date, id_portfolio, ticker, weight)
-                VALUES (?, ?, ?, ?)
-            """, (current_date_str, 3, s, target_amount))
+    # Point de reprise de la date, validé avec les ordres
+    if checkpoint is not None:
+        etat = {'portfolio': {s: float(w) * 100 for s, w in new_portfolio.items() if w > 0}}
+        lot.append(lambda conn: (creer_table_checkpoints(conn), sauver_checkpoint(conn, checkpoint, current_date, etat)))
 
-    # Sauvegarde des modifications dans la base et fermeture de la connexion
-    conn.commit()
-    conn.close()
+    # Sauvegarde des modifications dans la base en une seule transaction
+    (stockage or StockageSQLite("fund_database.db")).ecrire_lot(lot)
+    if journal is not None and lignes_deals:
+        journal.ajouter(lignes_deals)
 
     print("Ordres générés :")
     for order in orders:
@@ -148,12 +176,11 @@ def strategy_high_yield_equity_optimization(current_date, portfolio, df):
 
 import numpy as np
 import pandas as pd
-import sqlite3
 import random
 from datetime import datetime
 from deap import base, creator, tools, algorithms
 
-def lowturnover_strategy(current_date, portfolio, df):
+def lowturnover_strategy(current_date, portfolio, df, couts=None, journal=None, checkpoint=None, stockage=None):
     """
     Implémente une stratégie d'optimisation de portefeuille à faible rotation (low turnover) en utilisant un algorithme génétique.
 
@@ -161,6 +188,13 @@ def lowturnover_strategy(current_date, portfolio, df):
     - current_date (str ou datetime) : Date courante pour déterminer la période d'analyse.
     - portfolio (dict) : Dictionnaire contenant les actifs et leurs poids actuels.
     - df (DataFrame) : DataFrame contenant les rendements historiques des actifs avec les colonnes 'Date', 'symbole', et 'Returns'.
+    - couts (ModeleCouts, optionnel) : modèle de coûts de transaction (voir couts.py). S'il est fourni, le coût des deux
+      transactions, amorti sur couts.horizon périodes, est retranché du rendement évalué.
+    - journal (JournalDeals, optionnel) : journal des deals (voir journal_deals.py), qui reçoit les ordres une fois
+      validés en base.
+    - checkpoint (str, optionnel) : nom de la stratégie dans Strategy_Checkpoints (voir checkpoints.py). La nouvelle
+      répartition (en %, à repasser en portfolio) est enregistrée comme point de reprise de la date avec les ordres.
+    - stockage (Stockage, optionnel) : base où écrire les ordres (voir stockage.py), par défaut fund_database.db.
 
     Fonctionnement:
     - Sélectionne deux actifs du portefeuille et optimise leur allocation à l'aide d'un algorithme génétique.
@@ -191,6 +225,11 @@ def lowturnover_strategy(current_date, portfolio, df):
 
     # Calculer le rendement moyen pour chaque actif
     avg_returns = {t: pivot_data[t].mean() for t in tickers}
+
+    # Coefficients de coûts de la date, calculés une seule fois pour toute l'évolution
+    if couts is not None:
+        cout_lineaire, cout_impact = couts.coefficients(current_date, tickers)
+        poids_total = sum(portfolio.values())
     
     def evalIndividual(individual):
         i = int(individual[0]) % num_assets
@@ -214,6 +253,12 @@ def lowturnover_strategy(current_date, portfolio, df):
                 total_return += new_weight_j * avg_returns[t]
             else:
                 total_return += portfolio[t] * avg_returns[t]
+
+        if couts is not None and poids_total > 0:
+            # Coût en fraction du portefeuille, ramené à l'échelle des poids du dictionnaire
+            delta = np.array([new_weight_i - portfolio[ticker_i], new_weight_j - portfolio[ticker_j]]) / poids_total
+            cout = couts.cout(delta, cout_lineaire[[i, j]], cout_impact[[i, j]]).sum()
+            total_return -= poids_total * cout / couts.horizon
         
         return (total_return,)
     
@@ -277,8 +322,7 @@ def lowturnover_strategy(current_date, portfolio, df):
     
     # Calcul des ordres basés sur la différence entre le portefeuille initial et le nouveau, en pourcentage
     orders = []
-    conn = sqlite3.connect("fund_database.db")
-    cursor = conn.cursor()
+    lignes_deals = []
     date_str = current_date.strftime("%Y-%m-%d")
     
     threshold = 1e-4  
@@ -294,19 +338,27 @@ def lowturnover_strategy(current_date, portfolio, df):
                 "quantity": abs(diff)  # La quantité est en % à acheter ou vendre
             }
             orders.append(order)
-            cursor.execute("""
-                INSERT INTO Deals (date, id_portfolio, risk_profile, action, asset, quantity)
-                VALUES (?, ?, ?, ?, ?, ?)
-            """, (date_str, order['id_portfolio'], order['risk_profile'], order['action'], order['asset'], order['quantity']))
-    
-    for t, weight_percent in new_portfolio_percent.items():
-        cursor.execute("""
+            lignes_deals.append((date_str, order['id_portfolio'], order['risk_profile'], order['action'], order['asset'],
+                                 order['quantity'], "Non disponible"))
+
+    # Positions en fraction, comme le reste de la table Portfolio_Holdings
+    lot = [
+        ("""
+            INSERT INTO Deals (date, id_portfolio, risk_profile, action, asset, quantity, secteur)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, lignes_deals),
+        ("""
             INSERT INTO Portfolio_Holdings (date, id_portfolio, ticker, weight)
             VALUES (?, ?, ?, ?)
-        """, (date_str, 2, t, weight_percent))
-    
-    conn.commit()
-    conn.close()
+        """, [(date_str, 2, t, min(weight_percent / 100, 1.0)) for t, weight_percent in new_portfolio_percent.items()]),
+    ]
+    if checkpoint is not None:
+        etat = {'portfolio': {t: float(w) for t, w in new_portfolio_percent.items()}}
+        lot.append(lambda conn: (creer_table_checkpoints(conn), sauver_checkpoint(conn, checkpoint, current_date, etat)))
+
+    (stockage or StockageSQLite("fund_database.db")).ecrire_lot(lot)
+    if journal is not None and lignes_deals:
+        journal.ajouter(lignes_deals)
     
     print("\nOrdres générés pour les actifs modifiés :")
     for order in orders:
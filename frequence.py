@@ -0,0 +1,218 @@
+import json
+import os
+import numpy as np
+import pandas as pd
+
+"""
+Fréquence des barres et fenêtres glissantes comptées en barres.
+
+Les stratégies supposent une ligne par ticker et par jour : rolling(window=30), rolling(window=252)
+et l'annualisation par 252. Frequence convertit une durée exprimée en jours de trading en nombre de
+barres (30 jours = 30 barres journalières, 210 barres horaires ou 11 700 barres minute) et donne le
+nombre de périodes par an pour annualiser rendements et volatilités.
+
+Pour les panels minute de tout l'univers (390 fois plus de lignes qu'en journalier), PanelMemmap
+stocke les tableaux barre x ticker dans des fichiers projetés en mémoire (np.memmap), alimentés
+par paquets, et FenetreGlissante calcule moyenne et écart-type glissants bloc par bloc en ne
+gardant entre deux blocs que les dernières barres de la fenêtre.
+"""
+
+JOURS_PAR_AN = 252
+# Séance américaine de 6h30 : 7 barres horaires (la dernière incomplète), 390 barres minute
+BARRES_PAR_JOUR = {'1d': 1, '1h': 7, '30min': 13, '15min': 26, '5min': 78, '1min': 390}
+
+
+class Frequence:
+    """
+    Paramètres
+    ----------
+    code : str
+        Une des clés de BARRES_PAR_JOUR ('1d' par défaut).
+    """
+
+    def __init__(self, code='1d'):
+        if code not in BARRES_PAR_JOUR:
+            raise ValueError(f"Fréquence inconnue : {code} (disponibles : {', '.join(BARRES_PAR_JOUR)})")
+        self.code = code
+        self.barres_par_jour = BARRES_PAR_JOUR[code]
+        self.periodes_par_an = JOURS_PAR_AN * self.barres_par_jour
+
+    def __repr__(self):
+        return f"Frequence('{self.code}')"
+
+    @classmethod
+    def detecter(cls, index):
+        """Fréquence d'un index de dates : écart médian entre deux barres consécutives d'une même journée."""
+        horodatages = pd.DatetimeIndex(index).unique().sort_values()
+        meme_jour = horodatages[1:].normalize() == horodatages[:-1].normalize()
+        ecarts = (horodatages[1:] - horodatages[:-1])[meme_jour]
+        if len(ecarts) == 0:
+            return cls('1d')
+        minutes = ecarts.median().total_seconds() / 60
+        durees = {code: 390 / n for code, n in BARRES_PAR_JOUR.items() if code != '1d'}
+        return cls(min(durees, key=lambda code: abs(durees[code] - minutes)))
+
+    def barres(self, jours):
+        """Nombre de barres couvrant jours jours de trading."""
+        return max(1, int(round(jours * self.barres_par_jour)))
+
+    def annualiser_rendement(self, rendement_moyen):
+        return rendement_moyen * self.periodes_par_an
+
+    def annualiser_volatilite(self, ecart_type):
+        return ecart_type * np.sqrt(self.periodes_par_an)
+
+
+# %% Fenêtres glissantes incrémentales
+class FenetreGlissante:
+    """
+    Moyenne et écart-type (ddof=1) glissants sur longueur barres, calculés bloc par bloc.
+
+    Entre deux blocs, seules les longueur - 1 dernières barres sont conservées. Les sommes sont
+    calculées en float64 sur des valeurs centrées (premier cours de chaque colonne) pour limiter les
+    erreurs d'arrondi. Comme rolling(window=longueur) de pandas, le résultat est NaN tant que la
+    fenêtre n'est pas pleine ou si elle contient une valeur manquante.
+    """
+
+    def __init__(self, longueur):
+        self.longueur = longueur
+        self.reste = None
+        self.centre = None
+
+    def mettre_a_jour(self, bloc):
+        """bloc : tableau (barres, colonnes). Retourne (moyenne, ecart_type) de même forme."""
+        bloc = np.asarray(bloc, dtype=np.float64)
+        if self.centre is None:
+            finis = ~np.isnan(bloc)
+            premieres = finis.argmax(axis=0)
+            self.centre = np.where(finis.any(axis=0), bloc[premieres, np.arange(bloc.shape[1])], 0.0)
+        x = bloc - self.centre
+        if self.reste is not None:
+            x = np.vstack([self.reste, x])
+        n_reste = len(x) - len(bloc)
+        w = self.longueur
+
+        manquants = np.isnan(x)
+        valeurs = np.where(manquants, 0.0, x)
+        zeros = np.zeros((1, x.shape[1]))
+        s1 = np.vstack([zeros, np.cumsum(valeurs, axis=0)])
+        s2 = np.vstack([zeros, np.cumsum(valeurs * valeurs, axis=0)])
+        nm = np.vstack([zeros, np.cumsum(manquants, axis=0)])
+
+        moyenne = np.full(x.shape, np.nan)
+        ecart = np.full(x.shape, np.nan)
+        if len(x) >= w:
+            somme = s1[w:] - s1[:-w]
+            carres = s2[w:] - s2[:-w]
+            complets = (nm[w:] - nm[:-w]) == 0
+            m = somme / w
+            var = (carres - w * m * m) / (w - 1) if w > 1 else np.zeros_like(m)
+            moyenne[w - 1:] = np.where(complets, m + self.centre, np.nan)
+            ecart[w - 1:] = np.where(complets, np.sqrt(np.clip(var, 0.0, None)), np.nan)
+
+        self.reste = x[-(w - 1):] if w > 1 else x[:0]
+        return moyenne[n_reste:], ecart[n_reste:]
+
+
+# %% Stockage projeté en mémoire
+class PanelMemmap:
+    """
+    Panel barre x ticker sur disque : horodatages (int64, ns), cours et rendements (float32) dans des
+    fichiers np.memmap d'un dossier, avec un fichier meta.json (tickers, fréquence, nombre de barres).
+    Les fichiers sont agrandis par paquets lors de l'ajout, la lecture se fait par blocs de barres.
+    """
+
+    CHAMPS = {'horodatages': np.int64, 'close': np.float32, 'returns': np.float32}
+
+    def __init__(self, dossier, tickers=None, frequence='1d'):
+        self.dossier = dossier
+        chemin_meta = os.path.join(dossier, "meta.json")
+        if os.path.exists(chemin_meta):
+            with open(chemin_meta, encoding="utf-8") as f:
+                meta = json.load(f)
+            self.tickers = meta['tickers']
+            self.frequence = Frequence(meta['frequence'])
+            self.n_barres = meta['n_barres']
+        else:
+            if tickers is None:
+                raise ValueError(f"Aucun panel dans {dossier} : la liste des tickers est nécessaire pour le créer")
+            os.makedirs(dossier, exist_ok=True)
+            self.tickers = list(tickers)
+            self.frequence = Frequence(frequence)
+            self.n_barres = 0
+            self._ecrire_meta()
+        self.indices = {t: i for i, t in enumerate(self.tickers)}
+
+    def _ecrire_meta(self):
+        with open(os.path.join(self.dossier, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({'tickers': self.tickers, 'frequence': self.frequence.code, 'n_barres': self.n_barres}, f)
+
+    def _tableau(self, champ, mode='r', n_barres=None):
+        n_barres = self.n_barres if n_barres is None else n_barres
+        forme = (n_barres,) if champ == 'horodatages' else (n_barres, len(self.tickers))
+        return np.memmap(os.path.join(self.dossier, f"{champ}.dat"), dtype=self.CHAMPS[champ], mode=mode, shape=forme)
+
+    def ajouter(self, horodatages, close, returns):
+        """Ajoute un paquet de barres (horodatages croissants, tableaux (barres, tickers))."""
+        horodatages = pd.DatetimeIndex(horodatages).values.astype('datetime64[ns]').astype(np.int64)
+        n = len(horodatages)
+        if n == 0:
+            return
+        debut, fin = self.n_barres, self.n_barres + n
+        for champ, valeurs in (('horodatages', horodatages), ('close', close), ('returns', returns)):
+            chemin = os.path.join(self.dossier, f"{champ}.dat")
+            taille = fin * np.dtype(self.CHAMPS[champ]).itemsize * (1 if champ == 'horodatages' else len(self.tickers))
+            with open(chemin, "ab") as f:
+                f.truncate(taille)
+            tableau = self._tableau(champ, 'r+', fin)
+            tableau[debut:fin] = valeurs
+            tableau.flush()
+            del tableau
+        self.n_barres = fin
+        self._ecrire_meta()
+
+    def ajouter_long(self, df, colonnes=('Close', 'Returns')):
+        """Ajoute les barres d'un DataFrame au format long indexé par horodatage (colonnes ticker, Close, Returns)."""
+        close = df.pivot_table(index=df.index, columns='ticker', values=colonnes[0]).reindex(columns=self.tickers)
+        returns = df.pivot_table(index=df.index, columns='ticker', values=colonnes[1]).reindex(index=close.index, columns=self.tickers)
+        self.ajouter(close.index, close.values.astype(np.float32), returns.values.astype(np.float32))
+
+    def blocs(self, taille=100_000, champ='close'):
+        """Itère sur (horodatages, valeurs) par blocs de taille barres, sans charger tout le panel."""
+        if self.n_barres == 0:
+            return
+        horodatages = self._tableau('horodatages')
+        valeurs = self._tableau(champ)
+        for i in range(0, self.n_barres, taille):
+            yield pd.to_datetime(horodatages[i:i + taille]), valeurs[i:i + taille]
+
+
+def scores_low_turnover(panel, taille_bloc=100_000):
+    """
+    Score Low Turnover de chaque ticker à la dernière barre d'un PanelMemmap (même calcul que
+    generate_score : distance du cours à sa moyenne mobile 30 jours moins la moitié de la moyenne
+    des volatilités glissantes 252 jours), avec des fenêtres comptées en barres de la fréquence du panel.
+    Le panel est parcouru une seule fois par blocs. Retourne un DataFrame (Score, Direction) par ticker.
+    """
+    f = panel.frequence
+    sma = FenetreGlissante(f.barres(30))
+    vol = FenetreGlissante(f.barres(252))
+    n = len(panel.tickers)
+    somme_vol, nb_vol = np.zeros(n), np.zeros(n)
+    distance = np.full(n, np.nan)
+    for _, close in panel.blocs(taille_bloc):
+        moyenne, _ = sma.mettre_a_jour(close)
+        _, ecart = vol.mettre_a_jour(close)
+        somme_vol += np.nansum(ecart, axis=0)
+        nb_vol += (~np.isnan(ecart)).sum(axis=0)
+        d = (close - moyenne) / moyenne
+        # Dernière distance disponible de chaque ticker
+        lignes = np.where(~np.isnan(d), np.arange(len(d))[:, None], -1).max(axis=0)
+        disponibles = lignes >= 0
+        distance[disponibles] = d[lignes[disponibles], np.flatnonzero(disponibles)]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        vol_moyenne = np.where(nb_vol > 0, somme_vol / nb_vol, np.nan)
+    return pd.DataFrame({
+        'Score': np.abs(distance) - 0.5 * vol_moyenne,
+        'Direction': np.where(distance > 0, 1, -1),
+    }, index=pd.Index(panel.tickers, name='ticker'))
@@ -0,0 +1,142 @@
+import numpy as np
+import pandas as pd
+from scipy.linalg import cholesky
+from scipy.optimize import minimize
+
+"""
+Frontière efficiente pour plusieurs cibles de volatilité à la fois.
+
+Pour chaque date de rebalancement, la matrice de covariance est factorisée une seule fois
+(Cholesky, Sigma = L L'), puis on résout pour chaque cible de volatilité le problème
+
+    max  w' mu    sous  somme(w) = 1,  w >= 0,  ||L' w|| <= volatilité cible
+
+Les cibles sont traitées par ordre croissant et chaque résolution part de la solution de la cible
+précédente, ce qui rend l'ajout de profils de risque supplémentaires presque gratuit.
+"""
+
+CIBLES_LOW_RISK = (0.05, 0.08, 0.10, 0.15)
+
+
+def preparer_rendements(df, current_date):
+    """
+    Tableau pivot date x symbole des rendements strictement antérieurs à current_date, au même format
+    que dans lowrisk_strategy (actifs sans données retirés, NaN remplacés par 0).
+    """
+    current_date = pd.to_datetime(current_date)
+    df = df.reset_index()
+    df.rename(columns={'index': 'Date'}, inplace=True)
+    df['Date'] = pd.to_datetime(df['Date'])
+    df = df[df['Date'] < current_date]
+    pivot_data = df.pivot_table(index='Date', columns='symbole', values='Returns')
+    return pivot_data.dropna(axis=1, how='all').fillna(0)
+
+
+def facteur_covariance(cov_matrix, periodes=252):
+    """Facteur de Cholesky triangulaire inférieur de la covariance annualisée (légèrement régularisée)."""
+    cov = np.asarray(cov_matrix, dtype=float) * periodes
+    regularisation = 1e-10 * max(np.trace(cov) / len(cov), 1e-12)
+    return cholesky(cov + regularisation * np.eye(len(cov)), lower=True)
+
+
+def frontiere_efficiente(avg_returns, cov_matrix=None, cibles_vol=CIBLES_LOW_RISK, periodes=252, facteur=None, modele=None,
+                         x0=None):
+    """
+    Poids maximisant le rendement espéré pour chaque cible de volatilité annuelle.
+
+    Paramètres
+    ----------
+    avg_returns : array-like
+        Rendements moyens périodiques de chaque actif.
+    cov_matrix : array-like
+        Covariance des rendements périodiques (ignorée si facteur est fourni).
+    cibles_vol : sequence
+        Volatilités annuelles cibles.
+    facteur : numpy.ndarray, optionnel
+        Facteur L de la covariance annualisée déjà calculé (voir facteur_covariance).
+    modele : ModeleRisque, optionnel
+        Modèle de risque à facteurs (voir modele_risque.py) aligné sur avg_returns, utilisé à la place
+        de la covariance pour les grands univers (aucune matrice N x N n'est construite).
+    x0 : array-like, optionnel
+        Point de départ de la première résolution (par exemple les poids actuels du portefeuille).
+
+    Retourne
+    --------
+    numpy.ndarray
+        Matrice de poids (une ligne par cible, dans l'ordre de cibles_vol, une colonne par actif).
+        Si une cible est inférieure à la volatilité minimale atteignable, la solution renvoyée est
+        la plus proche possible de la contrainte.
+    """
+    mu = np.asarray(avg_returns, dtype=float)
+    if modele is not None:
+        variance = modele.variance
+        gradient_variance = lambda w: 2.0 * modele.periodes * modele.produit(w)
+    else:
+        L = facteur if facteur is not None else facteur_covariance(cov_matrix, periodes)
+        variance = lambda w: (L.T @ w) @ (L.T @ w)
+        gradient_variance = lambda w: 2.0 * (L @ (L.T @ w))
+    n = len(mu)
+    cibles = np.asarray(cibles_vol, dtype=float)
+
+    contrainte_somme = {'type': 'eq', 'fun': lambda w: w.sum() - 1.0, 'jac': lambda w: np.ones_like(w)}
+    poids = np.zeros((len(cibles), n))
+    x0 = np.full(n, 1.0 / n) if x0 is None else np.asarray(x0, dtype=float)
+    for k in np.argsort(cibles):
+        variance_cible = cibles[k] ** 2
+
+        def vol_restante(w):
+            return variance_cible - variance(w)
+
+        def jac_vol_restante(w):
+            return -gradient_variance(w)
+
+        result = minimize(
+            lambda w: -(w @ mu), x0, jac=lambda w: -mu, method='SLSQP',
+            bounds=[(0.0, 1.0)] * n,
+            constraints=[contrainte_somme, {'type': 'ineq', 'fun': vol_restante, 'jac': jac_vol_restante}],
+            options={'maxiter': 200, 'ftol': 1e-10},
+        )
+        w = np.clip(result.x, 0.0, None)
+        w = w / w.sum() if w.sum() > 0 else np.full(n, 1.0 / n)
+        poids[k] = w
+        # Départ à chaud pour la cible suivante
+        x0 = w
+    return poids
+
+
+def parcimonieux(poids, max_titres=None, poids_min=0.0):
+    """
+    Poids normalisés limités à max_titres lignes au plus, chacune d'au moins poids_min : on garde
+    les max_titres plus gros poids, puis on retire un à un le plus petit poids inférieur à poids_min
+    en renormalisant à chaque fois (le plus gros poids est toujours conservé).
+    """
+    w = np.clip(np.asarray(poids, dtype=float), 0.0, None)
+    if w.sum() <= 0:
+        return w
+    if max_titres is not None and np.count_nonzero(w) > max_titres:
+        w[np.argsort(w)[:-max_titres]] = 0.0
+    w = w / w.sum()
+    while poids_min > 0:
+        petits = np.flatnonzero((w > 0) & (w < poids_min))
+        if len(petits) == 0 or np.count_nonzero(w) == 1:
+            break
+        w[petits[np.argmin(w[petits])]] = 0.0
+        w = w / w.sum()
+    return w
+
+
+def lowrisk_frontier(current_date, df, cibles_vol=CIBLES_LOW_RISK, modele=None):
+    """
+    Allocations Low Risk pour plusieurs niveaux de volatilité cible à une date donnée.
+
+    Retourne un DataFrame avec une ligne par cible de volatilité et une colonne par symbole
+    (poids en fraction, somme égale à 1 par ligne). Avec un modèle de risque à facteurs, l'univers
+    est celui du modèle et la covariance échantillon n'est pas calculée.
+    """
+    pivot_data = preparer_rendements(df, current_date)
+    if modele is not None:
+        pivot_data = pivot_data.reindex(columns=modele.tickers, fill_value=0)
+        poids = frontiere_efficiente(pivot_data.mean().values, cibles_vol=cibles_vol, modele=modele)
+    else:
+        poids = frontiere_efficiente(pivot_data.mean().values, pivot_data.cov().values, cibles_vol)
+    return pd.DataFrame(poids, index=pd.Index(cibles_vol, name='target_vol'), columns=pivot_data.columns)
@@ -0,0 +1,202 @@
+import sqlite3
+import numpy as np
+import pandas as pd
+from stockage import StockageSQLite
+
+"""
+Historique des positions par intervalles de validité.
+
+Portfolio_Holdings reçoit à la fois des lignes datées ajoutées par les stratégies et des mises à
+jour en place (update_pfh) : on ne peut pas y retrouver ce que détenait un portefeuille à une date.
+Holdings_History garde une ligne par (portefeuille, ticker, poids) avec son intervalle de validité
+[valid_from, valid_to[ (valid_to NULL pour la position en cours). Des triggers la tiennent à jour à
+chaque INSERT ou UPDATE dans Portfolio_Holdings, une nouvelle ligne n'est ouverte que si le poids
+change. La clé primaire (id_portfolio, ticker, valid_from) et l'index (id_portfolio, valid_from)
+permettent les recherches à date et les parcours de période d'un portefeuille sans relire la table.
+
+HistoriquePositions charge l'historique d'un ou plusieurs portefeuilles en tableaux triés et répond
+aux requêtes à date par recherche dichotomique (O(log n) par ticker), y compris pour un lot de dates.
+"""
+
+DATE_LIGNE = "SUBSTR({0}.date, 1, 10)"
+
+OUVRIR_INTERVALLE = """
+        UPDATE Holdings_History SET valid_to = {d}
+        WHERE id_portfolio = {0}.id_portfolio AND ticker = {0}.ticker
+          AND valid_from < {d} AND (valid_to IS NULL OR valid_to > {d});
+        INSERT OR REPLACE INTO Holdings_History (id_portfolio, ticker, weight, valid_from, valid_to)
+        VALUES ({0}.id_portfolio, {0}.ticker, {0}.weight, {d},
+                (SELECT MIN(valid_from) FROM Holdings_History
+                 WHERE id_portfolio = {0}.id_portfolio AND ticker = {0}.ticker AND valid_from > {d}));
+"""
+
+POIDS_INCHANGE = """
+        NOT EXISTS (SELECT 1 FROM Holdings_History
+                    WHERE id_portfolio = {0}.id_portfolio AND ticker = {0}.ticker
+                      AND valid_from <= {d} AND (valid_to IS NULL OR valid_to > {d})
+                      AND weight IS {0}.weight)
+"""
+
+
+def creer_historique(db_path="fund_database.db"):
+    """
+    Crée (ou recrée) la table Holdings_History et ses triggers, puis l'alimente à partir des lignes
+    déjà présentes dans Portfolio_Holdings (pour chaque ticker, une ligne est valable jusqu'à la
+    suivante). À appeler après la création de Portfolio_Holdings (voir lancement_base).
+    """
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    d = DATE_LIGNE.format('NEW')
+
+    cursor.execute("DROP TRIGGER IF EXISTS holdings_history_insert")
+    cursor.execute("DROP TRIGGER IF EXISTS holdings_history_update")
+    cursor.execute("DROP TABLE IF EXISTS Holdings_History")
+    cursor.execute("""
+    CREATE TABLE Holdings_History (
+        id_portfolio INTEGER NOT NULL,
+        ticker TEXT NOT NULL,
+        weight REAL,
+        valid_from TEXT NOT NULL,
+        valid_to TEXT,
+        PRIMARY KEY (id_portfolio, ticker, valid_from)
+    ) WITHOUT ROWID;
+    """)
+    cursor.execute("CREATE INDEX idx_holdings_history_asof ON Holdings_History (id_portfolio, valid_from, valid_to)")
+
+    cursor.execute("""
+    INSERT INTO Holdings_History (id_portfolio, ticker, weight, valid_from, valid_to)
+    SELECT id_portfolio, ticker, weight, jour,
+           LEAD(jour) OVER (PARTITION BY id_portfolio, ticker ORDER BY jour)
+    FROM (
+        SELECT id_portfolio, ticker, weight, SUBSTR(date, 1, 10) AS jour
+        FROM Portfolio_Holdings
+        WHERE id_holding IN (
+            SELECT MAX(id_holding) FROM Portfolio_Holdings GROUP BY id_portfolio, ticker, SUBSTR(date, 1, 10)
+        )
+    );
+    """)
+
+    cursor.execute(f"""
+    CREATE TRIGGER holdings_history_insert AFTER INSERT ON Portfolio_Holdings
+    WHEN {POIDS_INCHANGE.format('NEW', d=d)}
+    BEGIN
+        {OUVRIR_INTERVALLE.format('NEW', d=d)}
+    END;
+    """)
+
+    cursor.execute(f"""
+    CREATE TRIGGER holdings_history_update AFTER UPDATE OF weight, date ON Portfolio_Holdings
+    WHEN {POIDS_INCHANGE.format('NEW', d=d)}
+    BEGIN
+        {OUVRIR_INTERVALLE.format('NEW', d=d)}
+    END;
+    """)
+
+    conn.commit()
+    conn.close()
+
+
+def cloturer_positions(conn, id_portfolio, tickers, date):
+    """
+    Ferme à date les intervalles en cours des tickers soldés d'un portefeuille, pour les stratégies
+    qui n'écrivent dans Portfolio_Holdings que les positions non nulles (pas de commit).
+    """
+    date = str(pd.Timestamp(date).date())
+    conn.executemany(
+        """
+        UPDATE Holdings_History SET valid_to = ?
+        WHERE id_portfolio = ? AND ticker = ? AND valid_to IS NULL AND valid_from < ?
+        """,
+        [(date, id_portfolio, t, date) for t in tickers]
+    )
+
+
+# %% Requêtes SQL
+def positions_au_sql(conn, id_portfolio, date):
+    """Positions d'un portefeuille à une date, lues par l'index de Holdings_History."""
+    date = str(pd.Timestamp(date).date())
+    return pd.read_sql("""
+    SELECT ticker, weight, valid_from, valid_to
+    FROM Holdings_History
+    WHERE id_portfolio = ? AND valid_from <= ? AND (valid_to IS NULL OR valid_to > ?)
+    ORDER BY ticker;
+    """, conn, params=[id_portfolio, date, date])
+
+
+# %% Requêtes en mémoire
+class HistoriquePositions:
+    """
+    Historique de positions en tableaux triés par (ticker, valid_from) pour chaque portefeuille.
+    Les dates sont converties en nombre de jours, valid_to NULL devient +infini.
+    """
+
+    DECALAGE = 1 << 20  # Plus grand que tout nombre de jours, pour la clé composite (ticker, date)
+    INFINI = np.iinfo(np.int64).max
+
+    def __init__(self, df):
+        self.portefeuilles = {}
+        for id_portfolio, groupe in df.groupby('id_portfolio'):
+            groupe = groupe.sort_values(['ticker', 'valid_from']).reset_index(drop=True)
+            tickers, codes = np.unique(groupe['ticker'].to_numpy(dtype=str), return_inverse=True)
+            debut = _jours(groupe['valid_from'])
+            fin = np.full(len(groupe), self.INFINI)
+            ouvertes = groupe['valid_to'].isna().to_numpy()
+            fin[~ouvertes] = _jours(groupe['valid_to'][~ouvertes])
+            self.portefeuilles[id_portfolio] = {
+                'lignes': groupe[['ticker', 'weight', 'valid_from', 'valid_to']],
+                'tickers': tickers,
+                'codes': codes,
+                'cle': codes * self.DECALAGE + debut,
+                'debut': debut,
+                'fin': fin,
+                'poids': groupe['weight'].to_numpy(dtype=float),
+            }
+
+    @classmethod
+    def depuis_base(cls, db_path="fund_database.db", portefeuilles=None, stockage=None):
+        """Charge l'historique de tous les portefeuilles ou d'une liste de portefeuilles."""
+        stockage = stockage or StockageSQLite(db_path)
+        sql = "SELECT id_portfolio, ticker, weight, valid_from, valid_to FROM Holdings_History"
+        params = ()
+        if portefeuilles is not None:
+            portefeuilles = [int(p) for p in portefeuilles]
+            sql += f" WHERE id_portfolio IN ({', '.join('?' * len(portefeuilles))})"
+            params = portefeuilles
+        return cls(stockage.requete(sql, params))
+
+    def positions_aux(self, id_portfolio, dates):
+        """
+        Positions d'un portefeuille à chacune des dates : DataFrame date x ticker des poids
+        (NaN si le ticker n'est pas détenu à cette date).
+        """
+        dates = pd.DatetimeIndex(pd.to_datetime(dates))
+        h = self.portefeuilles.get(id_portfolio)
+        if h is None:
+            return pd.DataFrame(index=dates)
+        jours = _jours(dates)
+        codes = np.arange(len(h['tickers']))
+        # Dernier intervalle commencé à la date pour chaque (date, ticker)
+        pos = np.searchsorted(h['cle'], codes[None, :] * self.DECALAGE + jours[:, None], side='right') - 1
+        pos_valide = np.clip(pos, 0, None)
+        valides = (pos >= 0) & (h['codes'][pos_valide] == codes[None, :]) & (h['fin'][pos_valide] > jours[:, None])
+        poids = np.where(valides, h['poids'][pos_valide], np.nan)
+        return pd.DataFrame(poids, index=dates, columns=h['tickers'])
+
+    def positions_au(self, id_portfolio, date):
+        """Positions d'un portefeuille à une date : Series ticker -> poids."""
+        return self.positions_aux(id_portfolio, [date]).iloc[0].dropna()
+
+    def intervalles(self, id_portfolio, debut, fin):
+        """Intervalles de validité du portefeuille qui recouvrent la période [debut, fin]."""
+        h = self.portefeuilles.get(id_portfolio)
+        if h is None:
+            return pd.DataFrame(columns=['ticker', 'weight', 'valid_from', 'valid_to'])
+        j_debut, j_fin = _jours([debut, fin])
+        masque = (h['debut'] <= j_fin) & (h['fin'] > j_debut)
+        return h['lignes'][masque].sort_values(['valid_from', 'ticker']).reset_index(drop=True)
+
+
+def _jours(dates):
+    # Nombre de jours depuis le 1er janvier 1970
+    dates = pd.to_datetime(pd.Series(dates).astype(str).str[:10])
+    return dates.values.astype('datetime64[D]').astype(np.int64)
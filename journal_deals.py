@@ -0,0 +1,278 @@
+import json
+import os
+import threading
+import time
+import uuid
+from enum import Enum
+import pandas as pd
+
+"""
+Journal des deals en fichiers colonnes, en ajout seul.
+
+La table Deals reçoit des INSERT ligne à ligne de plusieurs chemins de code, avec des libellés de
+profil différents ("Lowrisk", "High Yield Only"...). Le journal écrit chaque lot de deals dans des
+fichiers Parquet compressés (zstd), partitionnés par mois, profil et portefeuille :
+
+    journal_deals/mois=2023-01/profil=LOW_TURNOVER/portefeuille=2/part-....parquet
+
+Les fichiers ne sont jamais modifiés et ont tous le même schéma (SCHEMA, y compris quand un lot
+n'a aucun secteur renseigné). compacter regroupe les petits fichiers d'une partition en un seul (en
+tâche de fond avec demarrer_compaction), et scanner ne lit que les partitions qui correspondent aux
+filtres de dates, de profils et de portefeuilles. Les profils sont normalisés par l'énumération
+Profil. Dépendance optionnelle : pip install pyarrow.
+
+Une compaction est validée par un marqueur "<fichier compacté>.remplace" qui liste les fichiers
+remplacés, écrit avant la publication du fichier compacté et supprimé après celle des anciens
+fichiers. Tant que le marqueur existe, les fichiers qu'il liste sont ignorés à la lecture, et une
+compaction interrompue est terminée (ou annulée si le fichier compacté n'a pas été publié) au
+passage suivant de compacter : aucun deal n'est jamais lu deux fois.
+"""
+
+COLONNES = ['date', 'id_portfolio', 'risk_profile', 'action', 'asset', 'quantity', 'secteur']
+MARQUEUR = ".remplace"
+
+
+def schema():
+    """Schéma Arrow des fichiers du journal (pyarrow est importé à la demande)."""
+    import pyarrow as pa
+    return pa.schema([
+        ('date', pa.timestamp('ns')), ('id_portfolio', pa.int64()), ('risk_profile', pa.string()),
+        ('action', pa.string()), ('asset', pa.string()), ('quantity', pa.float64()), ('secteur', pa.string()),
+    ])
+
+
+class Profil(Enum):
+    LOW_RISK = "Low Risk"
+    LOW_TURNOVER = "Low Turnover"
+    HIGH_YIELD = "High Yield Equity Only"
+
+    @classmethod
+    def normaliser(cls, libelle):
+        """Profil correspondant à un libellé utilisé dans le projet (ou au nom du membre)."""
+        if isinstance(libelle, cls):
+            return libelle
+        cle = str(libelle).strip().lower().replace("_", " ").replace("-", " ")
+        if cle in ALIAS_PROFILS:
+            return ALIAS_PROFILS[cle]
+        raise ValueError(f"Profil de risque inconnu : {libelle}")
+
+
+ALIAS_PROFILS = {
+    "low risk": Profil.LOW_RISK, "lowrisk": Profil.LOW_RISK,
+    "low turnover": Profil.LOW_TURNOVER, "lowturnover": Profil.LOW_TURNOVER,
+    "high yield equity only": Profil.HIGH_YIELD, "high yield equity": Profil.HIGH_YIELD, "high yield only": Profil.HIGH_YIELD,
+    "high yield": Profil.HIGH_YIELD, "equity only": Profil.HIGH_YIELD,
+}
+
+
+class JournalDeals:
+    """
+    Paramètres
+    ----------
+    dossier : str
+        Racine du journal.
+    """
+
+    def __init__(self, dossier="journal_deals"):
+        self.dossier = dossier
+        self._verrou = threading.Lock()
+        os.makedirs(dossier, exist_ok=True)
+
+    # %% Écriture
+    def ajouter(self, deals):
+        """
+        Ajoute un lot de deals : DataFrame ou liste de tuples (date, id_portfolio, risk_profile, action,
+        asset, quantity, secteur), comme Stockage.ecrire_deals. Un fichier est écrit par partition touchée.
+        Retourne le nombre de deals écrits.
+        """
+        df = deals.copy() if isinstance(deals, pd.DataFrame) else pd.DataFrame(list(deals), columns=COLONNES)
+        if df.empty:
+            return 0
+        if 'secteur' not in df.columns:
+            df['secteur'] = None
+        df = df[COLONNES]
+        df['date'] = pd.to_datetime(df['date']).dt.normalize()
+        df['id_portfolio'] = df['id_portfolio'].astype('int64')
+        df['quantity'] = df['quantity'].astype(float)
+        profils = df['risk_profile'].map(Profil.normaliser)
+        df['risk_profile'] = profils.map(lambda p: p.value)
+        df['mois'] = df['date'].dt.strftime('%Y-%m')
+        df['profil'] = profils.map(lambda p: p.name)
+
+        with self._verrou:
+            for (mois, profil, portefeuille), groupe in df.groupby(['mois', 'profil', 'id_portfolio'], sort=False):
+                dossier = self._partition(mois, profil, portefeuille)
+                self._ecrire(groupe[COLONNES].reset_index(drop=True), dossier, "part")
+        return len(df)
+
+    def _partition(self, mois, profil, portefeuille):
+        return os.path.join(self.dossier, f"mois={mois}", f"profil={profil}", f"portefeuille={portefeuille}")
+
+    def _ecrire(self, df, dossier, prefixe):
+        nom, temporaire = self._ecrire_temporaire(df, dossier, prefixe)
+        os.replace(temporaire, os.path.join(dossier, nom))
+        return nom
+
+    def _ecrire_temporaire(self, donnees, dossier, prefixe):
+        # Écrit donnees (DataFrame ou table Arrow) au schéma du journal dans un fichier temporaire non publié
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        os.makedirs(dossier, exist_ok=True)
+        if isinstance(donnees, pd.DataFrame):
+            donnees = pa.Table.from_pandas(donnees[COLONNES], preserve_index=False)
+        table = donnees.select(COLONNES).cast(schema())
+        # Nom croissant dans le temps : l'ordre des fichiers est l'ordre d'ajout
+        nom = f"{prefixe}-{time.time_ns():020d}-{uuid.uuid4().hex[:8]}.parquet"
+        temporaire = os.path.join(dossier, "." + nom)
+        pq.write_table(table, temporaire, compression="zstd")
+        return nom, temporaire
+
+    # %% Lecture
+    def partitions(self, debut=None, fin=None, profils=None, portefeuilles=None):
+        """Dossiers de partition qui peuvent contenir des deals répondant aux filtres (élagage par nom)."""
+        mois_debut = None if debut is None else pd.Timestamp(debut).strftime('%Y-%m')
+        mois_fin = None if fin is None else pd.Timestamp(fin).strftime('%Y-%m')
+        noms_profils = None if profils is None else {Profil.normaliser(p).name for p in profils}
+        ids = None if portefeuilles is None else {str(int(p)) for p in portefeuilles}
+        resultat = []
+        for d_mois in sorted(_sous_dossiers(self.dossier, "mois=")):
+            mois = d_mois.split("=", 1)[1]
+            if (mois_debut and mois < mois_debut) or (mois_fin and mois > mois_fin):
+                continue
+            chemin_mois = os.path.join(self.dossier, d_mois)
+            for d_profil in sorted(_sous_dossiers(chemin_mois, "profil=")):
+                if noms_profils is not None and d_profil.split("=", 1)[1] not in noms_profils:
+                    continue
+                chemin_profil = os.path.join(chemin_mois, d_profil)
+                for d_pf in sorted(_sous_dossiers(chemin_profil, "portefeuille=")):
+                    if ids is not None and d_pf.split("=", 1)[1] not in ids:
+                        continue
+                    resultat.append(os.path.join(chemin_profil, d_pf))
+        return resultat
+
+    def scanner(self, debut=None, fin=None, profils=None, portefeuilles=None, colonnes=None):
+        """
+        Deals dont la date est comprise entre debut et fin (inclus), pour les profils et portefeuilles
+        demandés. Seuls les fichiers des partitions retenues sont lus.
+        """
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        colonnes = list(colonnes) if colonnes is not None else COLONNES
+        lues = list(dict.fromkeys(colonnes + ['date']))
+        with self._verrou:
+            fichiers = [os.path.join(p, f) for p in self.partitions(debut, fin, profils, portefeuilles)
+                        for f in _fichiers_valides(p)]
+            tables = [pq.read_table(f, columns=lues).cast(pa.schema([schema().field(c) for c in lues]))
+                      for f in fichiers]
+        if not tables:
+            return pd.DataFrame(columns=colonnes)
+        df = pa.concat_tables(tables).to_pandas()
+        if debut is not None:
+            df = df[df['date'] >= pd.Timestamp(debut)]
+        if fin is not None:
+            df = df[df['date'] <= pd.Timestamp(fin)]
+        return df[colonnes].reset_index(drop=True)
+
+    # %% Compaction
+    def compacter(self, min_fichiers=4):
+        """
+        Regroupe en un seul fichier les partitions qui contiennent au moins min_fichiers fichiers,
+        dans l'ordre d'ajout. Les compactions interrompues sont d'abord terminées ou annulées.
+        Retourne le nombre de partitions compactées.
+        """
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        compactees = 0
+        for partition in self.partitions():
+            with self._verrou:
+                _reprendre_compactions(partition)
+                fichiers = _fichiers_valides(partition)
+                if len(fichiers) < min_fichiers:
+                    continue
+                tables = [pq.read_table(os.path.join(partition, f)).cast(schema()) for f in fichiers]
+                nom, temporaire = self._ecrire_temporaire(pa.concat_tables(tables), partition, "compact")
+                # Validation : marqueur, publication du fichier compacté, puis suppression des anciens
+                _ecrire_json(os.path.join(partition, nom + MARQUEUR), fichiers)
+                os.replace(temporaire, os.path.join(partition, nom))
+                _reprendre_compactions(partition)
+            compactees += 1
+        return compactees
+
+    def demarrer_compaction(self, intervalle=60, min_fichiers=4):
+        """
+        Lance la compaction périodique dans un thread de fond. Retourne l'événement à positionner
+        (evenement.set()) pour l'arrêter.
+        """
+        arret = threading.Event()
+
+        def boucle():
+            while not arret.wait(intervalle):
+                self.compacter(min_fichiers)
+
+        threading.Thread(target=boucle, name="CompactionJournal", daemon=True).start()
+        return arret
+
+    # %% Import
+    def importer_depuis(self, stockage, taille_lot=500_000):
+        """Copie la table Deals d'un stockage (voir stockage.py) dans le journal, par lots."""
+        df = stockage.requete("SELECT date, id_portfolio, risk_profile, action, asset, quantity, secteur FROM Deals")
+        for i in range(0, len(df), taille_lot):
+            self.ajouter(df.iloc[i:i + taille_lot])
+        return len(df)
+
+
+def _sous_dossiers(chemin, prefixe):
+    if not os.path.isdir(chemin):
+        return []
+    return [d for d in os.listdir(chemin) if d.startswith(prefixe) and os.path.isdir(os.path.join(chemin, d))]
+
+
+def _fichiers(chemin):
+    # Les fichiers temporaires (préfixe '.') ne sont pas encore validés
+    return [f for f in os.listdir(chemin) if f.endswith(".parquet") and not f.startswith(".")]
+
+
+def _marqueurs(chemin):
+    # {fichier compacté: fichiers qu'il remplace} des compactions non terminées
+    marqueurs = {}
+    for f in os.listdir(chemin):
+        if f.endswith(MARQUEUR) and not f.startswith("."):
+            with open(os.path.join(chemin, f), encoding="utf-8") as fichier:
+                marqueurs[f[:-len(MARQUEUR)]] = json.load(fichier)
+    return marqueurs
+
+
+def _fichiers_valides(chemin):
+    """Fichiers à lire d'une partition, dans l'ordre d'ajout, sans ceux déjà remplacés par un fichier compacté."""
+    fichiers = _fichiers(chemin)
+    remplaces = set()
+    for compact, anciens in _marqueurs(chemin).items():
+        if compact in fichiers:
+            remplaces.update(anciens)
+    return sorted(f for f in fichiers if f not in remplaces)
+
+
+def _reprendre_compactions(chemin):
+    """
+    Termine les compactions dont le fichier compacté est publié (suppression des fichiers remplacés)
+    et annule les autres (suppression du fichier temporaire), puis retire les marqueurs.
+    """
+    for compact, anciens in _marqueurs(chemin).items():
+        if os.path.exists(os.path.join(chemin, compact)):
+            for f in anciens:
+                if os.path.exists(os.path.join(chemin, f)):
+                    os.remove(os.path.join(chemin, f))
+        elif os.path.exists(os.path.join(chemin, "." + compact)):
+            os.remove(os.path.join(chemin, "." + compact))
+        os.remove(os.path.join(chemin, compact + MARQUEUR))
+
+
+def _ecrire_json(chemin, contenu):
+    # Écriture atomique : le fichier n'apparaît sous son nom qu'une fois complet
+    dossier, nom = os.path.split(chemin)
+    temporaire = os.path.join(dossier, "." + nom)
+    with open(temporaire, "w", encoding="utf-8") as fichier:
+        json.dump(contenu, fichier)
+        fichier.flush()
+        os.fsync(fichier.fileno())
+    os.replace(temporaire, chemin)
@@ -0,0 +1,359 @@
+import copy
+import json
+import os
+import pickle
+import tempfile
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+import numpy as np
+import pandas as pd
+from calendrier import CalendrierTrading
+from frontiere import frontiere_efficiente
+from stockage import StockageSQLite
+
+"""
+Rebalancement en production (le lundi, uniquement les ordres du jour).
+
+Le backtest rejoue tout l'historique à chaque lancement (load_data, scores de décembre 2022, puis
+toutes les semaines). MoteurLive garde à la place un état glissant, sauvegardé sur disque :
+- les 252 derniers cours de chaque ticker (tampon circulaire), d'où les moyennes mobiles 10 et 30
+  jours et la volatilité glissante 252 jours, et la moyenne de ces volatilités (score Low Turnover) ;
+- les sommes des rendements et de leurs produits croisés (moyenne et covariance Low Risk) ;
+- le seuil du mois (moyenne des 3 meilleurs scores du mois précédent) et le turnover du mois ;
+- les positions actuelles des trois profils.
+Avec une nouvelle journée de cours, rebalancer met l'état à jour en O(N²) et renvoie les ordres
+des trois profils, directement en Python ou via un point d'accès HTTP local (servir).
+benchmark_live mesure la latence de bout en bout et la compare à CIBLE_LATENCE_MS.
+
+Différences avec le backtest : le seuil initial du Low Turnover est celui de la dernière date de
+rebalancement rejouée, et l'allocation Low Risk est la frontière efficiente à volatilité cible
+(SLSQP démarré des poids actuels, voir frontiere.py) au lieu de l'évolution différentielle, trop
+lente pour un objectif en millisecondes.
+"""
+
+FENETRE = 252
+CIBLE_LATENCE_MS = 250
+PROFILS = {1: "Low Risk", 2: "Low Turnover", 3: "High Yield Equity Only"}
+
+
+class MoteurLive:
+    """
+    Paramètres
+    ----------
+    tickers : list
+        Univers (les cours de tickers inconnus sont ignorés).
+    categories, secteurs : list
+        Catégorie (Products.category) et secteur de chaque ticker.
+    target_vol : float
+        Volatilité annuelle cible du profil Low Risk.
+    """
+
+    def __init__(self, tickers, categories, secteurs, target_vol=0.10):
+        n = len(tickers)
+        self.tickers = np.asarray(tickers, dtype=object)
+        self.indices = {t: i for i, t in enumerate(tickers)}
+        self.actions = np.asarray(categories) == 'Action'
+        self.secteurs = np.asarray(secteurs, dtype=object)
+        self.target_vol = target_vol
+        self.derniere_date = None
+
+        # Cours : tampon circulaire des FENETRE derniers cours et nombre de cours reçus par ticker
+        self.cours = np.full((FENETRE, n), np.nan)
+        self.nb_cours = np.zeros(n, dtype=np.int64)
+        self.dernier_cours = np.full(n, np.nan)
+        self.somme_vol = np.zeros(n)
+        self.nb_vol = np.zeros(n, dtype=np.int64)
+
+        # Rendements : sommes pour la moyenne et la covariance
+        self.nb_jours = 0
+        self.somme_r = np.zeros(n)
+        self.somme_rr = np.zeros((n, n))
+
+        # Low Turnover : turnover et seuil du mois, moyenne des 3 meilleurs scores de la dernière date
+        self.mois = None
+        self.turnover_mois = 0
+        self.seuil = np.nan
+        self.top3 = np.nan
+
+        self.positions = {p: np.zeros(n) for p in PROFILS}
+
+    # %% Initialisation et sauvegarde
+    @classmethod
+    def initialiser(cls, db_path="fund_database.db", jusqu_a=None, debut='2023-01-09', stockage=None,
+                    target_vol=0.10):
+        """
+        Construit l'état en rejouant une seule fois l'historique de la table Returns (jusqu'à jusqu_a
+        inclus) : les décisions Low Turnover et Equity Only sont rejouées à chaque date de rebalancement
+        à partir de debut, l'allocation Low Risk est calculée à la fin.
+        """
+        stockage = stockage or StockageSQLite(db_path)
+        df = stockage.lire_returns()
+        if jusqu_a is not None:
+            df = df[df.index <= pd.Timestamp(jusqu_a)]
+        produits = stockage.requete("SELECT ticker, category, secteur FROM Products").set_index('ticker')
+        prix = df.pivot_table(index=df.index, columns='ticker', values='price').sort_index()
+        rendements = df.pivot_table(index=df.index, columns='ticker', values='return').reindex_like(prix)
+        tickers = list(prix.columns)
+        produits = produits.reindex(tickers)
+        moteur = cls(tickers, produits['category'].fillna('').values,
+                     produits['secteur'].fillna('Non disponible').values, target_vol)
+
+        rebalancements = set(CalendrierTrading(prix.index).rebalancements(debut))
+        valeurs_prix, valeurs_r = prix.values, rendements.values
+        for k, date in enumerate(prix.index):
+            if date in rebalancements:
+                moteur._low_turnover(date)
+                moteur._equity_only(date)
+            presents = np.flatnonzero(~np.isnan(valeurs_prix[k]))
+            moteur._ajouter(date, presents, valeurs_prix[k, presents], np.nan_to_num(valeurs_r[k, presents]))
+        moteur.positions[1] = moteur._allocation_low_risk()
+        return moteur
+
+    def sauver(self, chemin="etat_live.pkl"):
+        """Sauvegarde atomique de l'état (écriture dans un fichier temporaire puis renommage)."""
+        dossier = os.path.dirname(os.path.abspath(chemin))
+        fd, temporaire = tempfile.mkstemp(dir=dossier, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporaire, chemin)
+
+    @staticmethod
+    def charger(chemin="etat_live.pkl"):
+        with open(chemin, "rb") as f:
+            return pickle.load(f)
+
+    # %% Mise à jour de l'état
+    def ajouter_jour(self, date, prix, rendements=None):
+        """
+        Ajoute une journée de cours (dictionnaire ticker -> cours). Les rendements sont calculés à
+        partir du cours précédent si rendements (dictionnaire ticker -> rendement) n'est pas fourni.
+        """
+        connus = [(self.indices[t], p) for t, p in prix.items() if t in self.indices and p is not None and np.isfinite(p)]
+        presents = np.fromiter((i for i, _ in connus), dtype=np.int64, count=len(connus))
+        p = np.fromiter((v for _, v in connus), dtype=float, count=len(connus))
+        if rendements is None:
+            precedent = self.dernier_cours[presents]
+            r = np.where(np.isfinite(precedent), p / precedent - 1, 0.0)
+        else:
+            r = np.array([rendements.get(self.tickers[i], 0.0) for i in presents], dtype=float)
+        self._ajouter(pd.Timestamp(date), presents, p, r)
+
+    def _ajouter(self, date, presents, p, r):
+        # Rendements (les tickers absents du jour ont un rendement nul, comme fillna(0) dans lowrisk_strategy)
+        self.nb_jours += 1
+        self.somme_r[presents] += r
+        self.somme_rr[np.ix_(presents, presents)] += np.outer(r, r)
+
+        # Cours : écriture dans le tampon circulaire de chaque ticker coté
+        self.cours[self.nb_cours[presents] % FENETRE, presents] = p
+        self.nb_cours[presents] += 1
+        self.dernier_cours[presents] = p
+
+        # Volatilité glissante 252 jours des tickers cotés ce jour, moyenne au fil de l'eau
+        complets = presents[self.nb_cours[presents] >= FENETRE]
+        if len(complets):
+            self.somme_vol[complets] += self.cours[:, complets].std(axis=0, ddof=1)
+            self.nb_vol[complets] += 1
+        self.derniere_date = date
+
+    def moyenne_mobile(self, longueur):
+        """Moyenne des longueur derniers cours de chaque ticker (NaN si moins de longueur cours)."""
+        decalages = np.arange(longueur)[:, None]
+        lignes = (self.nb_cours[None, :] - 1 - decalages) % FENETRE
+        sma = self.cours[lignes, np.arange(len(self.tickers))[None, :]].mean(axis=0)
+        return np.where(self.nb_cours >= longueur, sma, np.nan)
+
+    # %% Décisions
+    def scores_low_turnover(self):
+        """Score et direction de chaque ticker, comme generate_score de Strategie_2_Low_Turnover."""
+        sma_30 = self.moyenne_mobile(30)
+        distance = (self.dernier_cours - sma_30) / sma_30
+        with np.errstate(invalid='ignore', divide='ignore'):
+            vol_moyenne = np.where(self.nb_vol > 0, self.somme_vol / self.nb_vol, np.nan)
+        score = np.abs(distance) - 0.5 * vol_moyenne
+        direction = np.where(distance > 0, 1, -1)
+        return score, direction
+
+    def _ordre(self, date, id_portfolio, i, action, quantity):
+        return {'date': str(pd.Timestamp(date).date()), 'id_portfolio': id_portfolio,
+                'risk_profile': PROFILS[id_portfolio], 'action': action, 'asset': self.tickers[i],
+                'quantity': float(quantity), 'secteur': self.secteurs[i]}
+
+    def _low_turnover(self, date):
+        mois = str(pd.Timestamp(date).date())[:7]
+        if self.mois is not None and mois != self.mois:
+            self.turnover_mois = 0
+            self.seuil = self.top3
+        self.mois = mois
+
+        score, direction = self.scores_low_turnover()
+        valides = np.flatnonzero(~np.isnan(score))
+        classement = valides[np.argsort(-score[valides], kind='stable')]
+        ordres = []
+        # Deux meilleurs scores au plus, le second seulement si le premier a passé le seuil
+        for i in classement[:2]:
+            if self.turnover_mois >= 2 or not score[i] > self.seuil:
+                break
+            self.turnover_mois += 1
+            action = 'buy' if direction[i] > 0 else 'sell'
+            self.positions[2][i] += 1 if action == 'buy' else -1
+            ordres.append(self._ordre(date, 2, i, action, 1))
+        if len(classement):
+            self.top3 = float(score[classement[:3]].mean())
+        return ordres
+
+    def _equity_only(self, date):
+        cotes = np.flatnonzero(self.actions & (self.nb_cours > 0))
+        achat = self.moyenne_mobile(10) > self.moyenne_mobile(30)
+        ordres = []
+        for i in cotes:
+            action = 'buy' if achat[i] else 'sell'
+            self.positions[3][i] += 1 if achat[i] else -1
+            ordres.append(self._ordre(date, 3, i, action, 1))
+        return ordres
+
+    def _allocation_low_risk(self):
+        """Poids à volatilité cible sur les tickers déjà cotés, à partir des sommes de rendements."""
+        w = np.zeros(len(self.tickers))
+        cotes = np.flatnonzero(self.nb_cours > 0)
+        if self.nb_jours < 2 or len(cotes) == 0:
+            return w
+        mu = self.somme_r[cotes] / self.nb_jours
+        cov = (self.somme_rr[np.ix_(cotes, cotes)] - self.nb_jours * np.outer(mu, mu)) / (self.nb_jours - 1)
+        actuels = self.positions[1][cotes]
+        x0 = actuels / actuels.sum() if actuels.sum() > 0 else None
+        w[cotes] = frontiere_efficiente(mu, cov, (self.target_vol,), x0=x0)[0]
+        return w
+
+    def _low_risk(self, date, seuil=0.001):
+        cibles = self._allocation_low_risk()
+        diff = cibles - self.positions[1]
+        ordres = [self._ordre(date, 1, i, 'buy' if diff[i] > 0 else 'sell', abs(diff[i]) * 100)
+                  for i in np.flatnonzero(np.abs(diff) > seuil)]
+        self.positions[1] = cibles
+        return ordres
+
+    # %% API
+    def rebalancer(self, date, prix=None, date_prix=None, chemin_etat=None):
+        """
+        Ordres des trois profils pour la date de rebalancement date. prix (dictionnaire ticker -> cours)
+        est la dernière journée de cours connue, datée date_prix (par défaut le jour ouvré précédent).
+        L'état est sauvegardé dans chemin_etat s'il est fourni. La mise à jour est tout ou rien : si le calcul
+        d'un profil ou la sauvegarde échoue, l'état d'avant l'appel est restauré (les cours ne sont pas
+        intégrés) et la même requête peut être relancée.
+
+        Retourne un dictionnaire profil -> liste d'ordres (même format que inserer_ordres).
+        """
+        date = pd.Timestamp(date)
+        if prix is not None:
+            date_prix = pd.Timestamp(date_prix) if date_prix is not None else date - pd.offsets.BDay(1)
+            if self.derniere_date is not None and date_prix <= self.derniere_date:
+                raise ValueError(f"Cours du {date_prix.date()} déjà intégrés (dernière date : {self.derniere_date.date()})")
+        # Copie de l'état (O(N²) comme la mise à jour elle-même) pour revenir en arrière en cas d'échec
+        etat = copy.deepcopy(self.__dict__)
+        try:
+            if prix is not None:
+                self.ajouter_jour(date_prix, prix)
+            ordres = {
+                PROFILS[1]: self._low_risk(date),
+                PROFILS[2]: self._low_turnover(date),
+                PROFILS[3]: self._equity_only(date),
+            }
+            if chemin_etat is not None:
+                self.sauver(chemin_etat)
+        except BaseException:
+            self.__dict__.clear()
+            self.__dict__.update(etat)
+            raise
+        return ordres
+
+
+# %% Point d'accès HTTP local
+def servir(moteur, hote="127.0.0.1", port=8765, chemin_etat="etat_live.pkl"):
+    """
+    Expose moteur.rebalancer en POST /rebalancement, corps JSON {"date": ..., "prix": {...},
+    "date_prix": ...}. La réponse contient les ordres par profil et la latence de calcul (ms).
+    Les requêtes sont traitées une par une (l'état n'est pas partagé entre threads). Une requête invalide
+    renvoie le code 400, toute autre erreur le code 500, avec un corps JSON {"erreur": ...}.
+    """
+    class Gestionnaire(BaseHTTPRequestHandler):
+        def do_POST(self):
+            if self.path != "/rebalancement":
+                self.send_error(404)
+                return
+            try:
+                corps = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+                if not isinstance(corps, dict):
+                    raise ValueError("Le corps de la requête doit être un objet JSON")
+                debut = time.perf_counter()
+                ordres = moteur.rebalancer(corps['date'], corps.get('prix'), corps.get('date_prix'), chemin_etat)
+                reponse = {'ordres': ordres, 'latence_ms': round((time.perf_counter() - debut) * 1000, 3)}
+                code = 200
+            except (KeyError, ValueError) as ex:
+                reponse, code = {'erreur': str(ex)}, 400
+            except Exception as ex:
+                # Toute autre erreur renvoie une réponse JSON au client au lieu de couper la connexion
+                print(f"Erreur lors du rebalancement : {ex!r}")
+                reponse, code = {'erreur': f"Erreur interne : {type(ex).__name__}: {ex}"}, 500
+            contenu = json.dumps(reponse, default=str).encode("utf-8")
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(contenu)))
+            self.end_headers()
+            self.wfile.write(contenu)
+
+        def log_message(self, *args):
+            pass
+
+    serveur = HTTPServer((hote, port), Gestionnaire)
+    print(f"Rebalancement disponible sur http://{hote}:{port}/rebalancement")
+    try:
+        serveur.serve_forever()
+    finally:
+        serveur.server_close()
+
+
+# %% Mesure de la latence
+def benchmark_live(db_path="fund_database.db", repetitions=20, cible_ms=CIBLE_LATENCE_MS):
+    """
+    Initialise l'état jusqu'à l'avant-dernier jour de la base, puis mesure repetitions fois (sur
+    une copie de l'état) le rebalancement du jour ouvré suivant à partir des cours du dernier jour,
+    sauvegarde de l'état comprise. Compare la latence à cible_ms et au temps du rejeu complet.
+    """
+    stockage = StockageSQLite(db_path)
+    df = stockage.lire_returns()
+    dates = df.index.unique().sort_values()
+    date_prix = dates[-1]
+
+    debut = time.perf_counter()
+    moteur = MoteurLive.initialiser(jusqu_a=dates[-2], stockage=stockage)
+    rejeu_ms = (time.perf_counter() - debut) * 1000
+
+    jour = df[df.index == date_prix]
+    prix = dict(zip(jour['ticker'], jour['price']))
+    date = date_prix + pd.offsets.BDay(1)
+    etat = pickle.dumps(moteur)
+    chemin_etat = os.path.join(tempfile.gettempdir(), "etat_live_benchmark.pkl")
+    latences = []
+    for _ in range(repetitions):
+        copie = pickle.loads(etat)
+        debut = time.perf_counter()
+        copie.rebalancer(date, prix, date_prix, chemin_etat)
+        latences.append((time.perf_counter() - debut) * 1000)
+    os.remove(chemin_etat)
+
+    latences = np.array(latences)
+    resultats = {
+        'rejeu_complet_ms': round(rejeu_ms, 1),
+        'mediane_ms': round(float(np.median(latences)), 2),
+        'p95_ms': round(float(np.percentile(latences, 95)), 2),
+        'max_ms': round(float(latences.max()), 2),
+        'cible_ms': cible_ms,
+        'cible_respectee': bool(np.percentile(latences, 95) <= cible_ms),
+    }
+    print(pd.Series(resultats).to_string())
+    return resultats
+
+
+if __name__ == "__main__":
+    benchmark_live()
@@ -0,0 +1,145 @@
+import numpy as np
+import pandas as pd
+from stockage import StockageSQLite
+
+"""
+Livre de positions en mémoire.
+
+update_pfh (base_update.py) lit puis met à jour Portfolio_Holdings, avec un commit, pour chaque
+transaction. Le livre garde à la place les poids de tous les portefeuilles dans une matrice
+portefeuille x ticker (identifiants entiers) : un lot d'ordres est appliqué en quelques opérations
+sur les tableaux, avec la même convention que update_pfh (quantity / 10000, poids bornés à [0, 1],
+une vente sur un actif non détenu l'inscrit avec un poids nul). Les positions ne sont écrites dans
+Portfolio_Holdings qu'aux dates de rebalancement (snapshot), pour les seuls portefeuilles modifiés.
+"""
+
+
+class LivrePositions:
+    """
+    Paramètres
+    ----------
+    tickers : list
+        Univers initial (d'autres tickers sont ajoutés au besoin).
+    portefeuilles : list
+        Identifiants des portefeuilles initiaux.
+    unite : float
+        Nombre d'unités de quantity correspondant à un poids de 1 (10000 comme dans update_pfh).
+    """
+
+    def __init__(self, tickers=(), portefeuilles=(), unite=10000.0):
+        self.unite = unite
+        self.tickers = []
+        self.indices = {}
+        self.portefeuilles = []
+        self.lignes = {}
+        self.poids = np.zeros((0, 0))
+        self.detenus = np.zeros((0, 0), dtype=bool)
+        self.modifies = set()
+        self.ajouter(portefeuilles, tickers)
+
+    @classmethod
+    def depuis_base(cls, db_path="fund_database.db", stockage=None, unite=10000.0):
+        """Charge les dernières positions connues de Portfolio_Holdings."""
+        stockage = stockage or StockageSQLite(db_path)
+        df = stockage.requete("SELECT date, id_portfolio, ticker, weight FROM Portfolio_Holdings")
+        df = df.sort_values('date').drop_duplicates(['id_portfolio', 'ticker'], keep='last')
+        livre = cls(df['ticker'].unique(), df['id_portfolio'].unique(), unite)
+        i = livre.lignes_de(df['id_portfolio'])
+        j = livre.colonnes_de(df['ticker'])
+        livre.poids[i, j] = df['weight'].fillna(0).to_numpy(dtype=float)
+        livre.detenus[i, j] = True
+        return livre
+
+    # %% Identifiants
+    def ajouter(self, portefeuilles=(), tickers=()):
+        """Ajoute des portefeuilles (lignes) et des tickers (colonnes) inconnus."""
+        nouveaux_p = [p for p in dict.fromkeys(portefeuilles) if p not in self.lignes]
+        nouveaux_t = [t for t in dict.fromkeys(tickers) if t not in self.indices]
+        if not nouveaux_p and not nouveaux_t:
+            return
+        for p in nouveaux_p:
+            self.lignes[p] = len(self.portefeuilles)
+            self.portefeuilles.append(p)
+        for t in nouveaux_t:
+            self.indices[t] = len(self.tickers)
+            self.tickers.append(t)
+        marge = ((0, len(nouveaux_p)), (0, len(nouveaux_t)))
+        self.poids = np.pad(self.poids, marge)
+        self.detenus = np.pad(self.detenus, marge)
+
+    def lignes_de(self, portefeuilles):
+        return np.fromiter((self.lignes[p] for p in portefeuilles), dtype=np.int64)
+
+    def colonnes_de(self, tickers):
+        return np.fromiter((self.indices[t] for t in tickers), dtype=np.int64)
+
+    # %% Ordres
+    def appliquer(self, ordres):
+        """
+        Applique un lot d'ordres (DataFrame ou liste de dictionnaires avec id_portfolio, asset, action,
+        quantity). Les ordres d'un même lot sont simultanés : les variations d'une même position sont
+        additionnées puis le poids est borné à [0, 1]. Retourne le nombre de positions modifiées.
+        """
+        ordres = pd.DataFrame(ordres)
+        if ordres.empty:
+            return 0
+        self.ajouter(ordres['id_portfolio'], ordres['asset'])
+        i = self.lignes_de(ordres['id_portfolio'])
+        j = self.colonnes_de(ordres['asset'])
+        signe = np.where(ordres['action'].to_numpy() == 'buy', 1.0, -1.0)
+        delta = signe * ordres['quantity'].to_numpy(dtype=float) / self.unite
+
+        # Variation nette par position (plusieurs ordres peuvent viser la même position)
+        plat, inverse = np.unique(i * len(self.tickers) + j, return_inverse=True)
+        net = np.bincount(inverse, weights=delta)
+        i, j = np.divmod(plat, len(self.tickers))
+        self.poids[i, j] = np.clip(self.poids[i, j] + net, 0.0, 1.0)
+        self.detenus[i, j] = True
+        self.modifies.update(np.unique(i).tolist())
+        return len(plat)
+
+    def positions(self, id_portfolio):
+        """Positions détenues d'un portefeuille : dictionnaire ticker -> poids."""
+        ligne = self.lignes.get(id_portfolio)
+        if ligne is None:
+            return {}
+        j = np.flatnonzero(self.detenus[ligne])
+        return {self.tickers[k]: float(self.poids[ligne, k]) for k in j}
+
+    def vers_dataframe(self, portefeuilles=None):
+        """Positions détenues au format de Portfolio_Holdings (id_portfolio, ticker, weight)."""
+        lignes = np.arange(len(self.portefeuilles)) if portefeuilles is None else self.lignes_de(portefeuilles)
+        i, j = np.nonzero(self.detenus[lignes])
+        return pd.DataFrame({
+            'id_portfolio': np.asarray(self.portefeuilles, dtype=object)[lignes[i]],
+            'ticker': np.asarray(self.tickers, dtype=object)[j],
+            'weight': self.poids[lignes[i], j],
+        })
+
+    # %% Écriture
+    def snapshot(self, date, stockage=None, db_path="fund_database.db"):
+        """
+        Écrit dans Portfolio_Holdings les positions des portefeuilles modifiés depuis le dernier
+        snapshot (les lignes existantes de ces portefeuilles sont remplacées, dans la même transaction
+        que l'écriture des nouvelles lignes). Retourne le nombre de lignes écrites.
+        """
+        if not self.modifies:
+            return 0
+        stockage = stockage or StockageSQLite(db_path)
+        portefeuilles = [self.portefeuilles[k] for k in sorted(self.modifies)]
+        df = self.vers_dataframe(portefeuilles)
+        date_str = pd.Timestamp(date).strftime("%Y-%m-%d")
+        marques = ", ".join("?" * len(portefeuilles))
+        with stockage.transaction() as conn:
+            conn.execute(f"DELETE FROM Portfolio_Holdings WHERE id_portfolio IN ({marques})",
+                         [int(p) for p in portefeuilles])
+            if len(df):
+                conn.executemany("""
+                    INSERT INTO Portfolio_Holdings (date, id_portfolio, ticker, weight)
+                    VALUES (?, ?, ?, ?)
+                """, [
+                    (date_str, int(p), t, float(w))
+                    for p, t, w in zip(df['id_portfolio'], df['ticker'], df['weight'])
+                ])
+        self.modifies.clear()
+        return len(df)
@@ -0,0 +1,236 @@
+# %% Packages
+from abc import ABC, abstractmethod
+import numpy as np
+import pandas as pd
+
+"""
+Ce module définit les fournisseurs de données de marché utilisés par get_financial_data.
+Un fournisseur ne fait que télécharger (ou générer) les cours bruts Close / Volume et le secteur
+de chaque ticker, le nettoyage (rendements, z-score, colonnes finales) est commun à tous les
+fournisseurs et se trouve dans la classe de base. Cela permet de remplacer Yahoo Finance par
+un générateur synthétique pour les tests de charge ou l'intégration continue sans réseau.
+"""
+
+# %% Catégories des actifs
+ETF = ['SPY', 'QQQ', 'DIA', 'IWM', 'EFA', 'EEM', 'TLT', 'GLD', 'XLV', 'XLE']
+VALEURS_REFUGE = ['CL=F', 'GC=F']
+BONS_TRESOR = ['^FVX']
+
+COLONNES = ['Close', 'Volume', 'ticker', 'Category', 'Returns', 'Secteur']
+
+
+def categorie_actif(t):
+    """Retourne la catégorie d'un ticker de l'univers réel (Action, ETF, Valeurs refuge ou Bon du trésor américain)."""
+    return (
+        'Bon du trésor américain' if t in BONS_TRESOR else
+        'Valeurs refuge' if t in VALEURS_REFUGE else
+        'ETF' if t in ETF else
+        'Action'
+    )
+
+
+def nettoyer_ticker(df, t, categorie, secteur):
+    """
+    Nettoie les cours bruts d'un ticker et renvoie le DataFrame au format de get_financial_data.
+
+    - Propagation vers l'avant des cotations manquantes.
+    - Calcul des rendements quotidiens à partir du prix de clôture.
+    - Remplacement des valeurs aberrantes (|z-score| > 3) par la médiane des rendements.
+    """
+    df = df.ffill()
+    df['ticker'] = t
+    df['Category'] = categorie
+    df['Returns'] = df['Close'].pct_change()
+    df['Secteur'] = secteur
+
+    # Traitement des valeurs aberrantes
+    z_score = np.abs((df['Returns'] - df['Returns'].mean()) / df['Returns'].std())
+    df.loc[z_score > 3, 'Returns'] = np.nan
+    df['Returns'] = df['Returns'].fillna(df['Returns'].median())
+    return df[COLONNES]
+
+
+# %% Interface commune
+class FournisseurDonnees(ABC):
+    """
+    Classe de base des fournisseurs de données de marché.
+
+    Les sous-classes implémentent telecharger (cours bruts Close / Volume indexés par date pour
+    une liste de tickers) et secteur. Les méthodes iter_chunks et get_financial_data produisent
+    ensuite exactement les colonnes attendues par le reste du projet :
+    'Close', 'Volume', 'ticker', 'Category', 'Returns', 'Secteur'.
+    """
+
+    tickers = None
+
+    @abstractmethod
+    def telecharger(self, tickers, start_date, end_date):
+        """Retourne un objet indexable par ticker donnant un DataFrame avec les colonnes Close et Volume."""
+
+    def secteur(self, t):
+        return "Non disponible"
+
+    def categorie(self, t):
+        return categorie_actif(t)
+
+    def iter_chunks(self, tickers=None, start_date='2022-01-01', end_date='2024-12-31', chunk_size=500, echecs=None):
+        """
+        Génère les données nettoyées par paquets de chunk_size tickers, sous forme de DataFrames
+        au format long (un paquet à la fois en mémoire). Les tickers dont le traitement échoue sont
+        ignorés et, si echecs (une liste) est fourni, y sont ajoutés.
+        """
+        tickers = list(tickers if tickers is not None else self.tickers)
+        for i in range(0, len(tickers), chunk_size):
+            chunk = tickers[i:i + chunk_size]
+            bruts = self.telecharger(chunk, start_date, end_date)
+            dataframes = []
+            for t in chunk:
+                try:
+                    df = bruts[t][['Close', 'Volume']].copy()
+                    dataframes.append(nettoyer_ticker(df, t, self.categorie(t), self.secteur(t)))
+                except Exception as e:
+                    print(f"Erreur lors du traitement de {t}: {e}")
+                    if echecs is not None:
+                        echecs.append(t)
+            if dataframes:
+                yield pd.concat(dataframes)
+
+    def get_financial_data(self, tickers=None, start_date='2022-01-01', end_date='2024-12-31', chunk_size=500):
+        """Retourne l'ensemble des données nettoyées dans un seul DataFrame."""
+        dataframes = list(self.iter_chunks(tickers, start_date, end_date, chunk_size))
+        if not dataframes:
+            raise ValueError("Aucune donnée n'a pu être traitée")
+        return pd.concat(dataframes)
+
+
+# %% Yahoo Finance
+class FournisseurYahoo(FournisseurDonnees):
+    """Fournisseur historique : cours via yf.download et secteur via yf.Ticker(t).info."""
+
+    def __init__(self, tickers=None):
+        self.tickers = tickers
+
+    def telecharger(self, tickers, start_date, end_date):
+        import yfinance as yf
+        return yf.download(tickers, start=start_date, end=end_date, group_by='ticker')
+
+    def secteur(self, t):
+        import yfinance as yf
+        try:
+            info = yf.Ticker(t).info
+            return info.get("sector", "Non disponible")
+        except Exception:
+            # Actifs internationaux, indices, etc.
+            return "Non disponible"
+
+
+# %% Générateur synthétique
+SECTEURS_SYNTHETIQUES = [
+    'Technology', 'Healthcare', 'Financial Services', 'Consumer Cyclical', 'Consumer Defensive',
+    'Energy', 'Industrials', 'Communication Services', 'Basic Materials', 'Utilities', 'Real Estate'
+]
+
+CATEGORIES_SYNTHETIQUES = ['Action', 'ETF', 'Valeurs refuge', 'Bon du trésor américain']
+PROBAS_CATEGORIES = [0.85, 0.10, 0.03, 0.02]
+
+
+class FournisseurSynthetique(FournisseurDonnees):
+    """
+    Générateur de données synthétiques reproductible (graine fixe).
+
+    Les prix suivent un mouvement brownien géométrique multi-facteurs : un facteur marché commun,
+    un facteur par secteur et un bruit spécifique à chaque actif. Le générateur simule également
+    des jours sans cotation (qui seront propagés vers l'avant au nettoyage) et des valeurs
+    aberrantes ponctuelles (qui seront traitées par le z-score).
+
+    Chaque ticker est tiré avec son propre générateur aléatoire dérivé de la graine et de son
+    numéro, les données d'un ticker sont donc identiques quelle que soit la taille des paquets.
+
+    Paramètres
+    ----------
+    n_tickers : int
+        Taille de l'univers, entre 10 et 10 000 tickers.
+    seed : int
+        Graine du générateur.
+    taux_manquants : float
+        Probabilité qu'une cotation soit absente.
+    taux_aberrants : float
+        Probabilité qu'une cotation soit aberrante.
+    """
+
+    def __init__(self, n_tickers=118, seed=42, taux_manquants=0.01, taux_aberrants=0.002):
+        if not 10 <= n_tickers <= 10000:
+            raise ValueError("n_tickers doit être compris entre 10 et 10 000")
+        self.seed = seed
+        self.taux_manquants = taux_manquants
+        self.taux_aberrants = taux_aberrants
+        self.tickers = [f"SYN{i:05d}" for i in range(n_tickers)]
+        self._index = {t: i for i, t in enumerate(self.tickers)}
+
+        rng = np.random.default_rng(seed)
+        self._categories = rng.choice(CATEGORIES_SYNTHETIQUES, size=n_tickers, p=PROBAS_CATEGORIES)
+        self._secteurs = np.where(
+            self._categories == 'Action',
+            rng.choice(SECTEURS_SYNTHETIQUES, size=n_tickers),
+            'Non disponible'
+        )
+        self._facteurs = {}
+
+    def categorie(self, t):
+        return str(self._categories[self._index[t]])
+
+    def secteur(self, t):
+        return str(self._secteurs[self._index[t]])
+
+    def rendements_facteurs(self, start_date, end_date):
+        """
+        Rendements journaliers du facteur marché et des facteurs sectoriels sur les jours ouvrés
+        de la période (mis en cache pour que tous les paquets partagent les mêmes facteurs).
+        """
+        cle = (str(start_date), str(end_date))
+        if cle not in self._facteurs:
+            dates = pd.bdate_range(start_date, end_date, inclusive='left', name='Date')
+            rng = np.random.default_rng([self.seed, 0])
+            marche = rng.normal(0.0003, 0.011, size=len(dates))
+            secteurs = rng.normal(0.0, 0.006, size=(len(dates), len(SECTEURS_SYNTHETIQUES) + 1))
+            self._facteurs[cle] = (dates, marche, secteurs)
+        return self._facteurs[cle]
+
+    def telecharger(self, tickers, start_date, end_date):
+        dates, marche, secteurs = self.rendements_facteurs(start_date, end_date)
+        n = len(dates)
+        bruts = {}
+        for t in tickers:
+            i = self._index[t]
+            rng = np.random.default_rng([self.seed, i + 1])
+            categorie = self._categories[i]
+            secteur = self._secteurs[i]
+            j = SECTEURS_SYNTHETIQUES.index(secteur) if secteur in SECTEURS_SYNTHETIQUES else len(SECTEURS_SYNTHETIQUES)
+
+            # Sensibilités aux facteurs : les actions sont plus exposées que les ETF, les valeurs
+            # refuge et les taux sont peu corrélés au marché
+            if categorie == 'Action':
+                beta, beta_secteur, vol = rng.uniform(0.6, 1.5), rng.uniform(0.5, 1.5), rng.uniform(0.008, 0.025)
+            elif categorie == 'ETF':
+                beta, beta_secteur, vol = rng.uniform(0.8, 1.1), rng.uniform(0.0, 0.5), rng.uniform(0.002, 0.006)
+            else:
+                beta, beta_secteur, vol = rng.uniform(-0.3, 0.3), 0.0, rng.uniform(0.008, 0.02)
+
+            # Mouvement brownien géométrique : rendements logarithmiques puis exponentielle
+            log_rendements = (
+                beta * marche + beta_secteur * secteurs[:, j]
+                + rng.normal(0.0, vol, size=n) - 0.5 * vol ** 2
+            )
+            close = rng.uniform(10, 500) * np.exp(np.cumsum(log_rendements))
+            volume = np.round(rng.lognormal(np.log(rng.uniform(1e5, 5e7)), 0.4, size=n))
+
+            # Cotations aberrantes ponctuelles puis jours sans cotation
+            aberrants = rng.random(n) < self.taux_aberrants
+            close[aberrants] *= rng.choice([0.7, 1.4], size=aberrants.sum())
+            manquants = rng.random(n) < self.taux_manquants
+            manquants[0] = False
+            close[manquants] = np.nan
+            volume[manquants] = np.nan
+
+            bruts[t] = pd.DataFrame({'Close': close, 'Volume': volume}, index=dates)
+        return bruts
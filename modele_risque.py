@@ -0,0 +1,151 @@
+import numpy as np
+import pandas as pd
+from stockage import StockageSQLite
+
+"""
+Modèle de risque à facteurs sectoriels.
+
+La covariance échantillon N x N des stratégies demande O(N²) en mémoire, O(N³) dans les
+optimiseurs, et devient singulière dès que le nombre d'actifs dépasse le nombre de jours.
+Le modèle utilise à la place une covariance structurée
+
+    Sigma = B Omega B' + diag(specifique)
+
+où les facteurs sont construits à partir des données déjà présentes dans l'univers :
+- des indices de référence : marché (^GSPC, ou SPY à défaut), obligations (TLT), or (GLD) ;
+- un facteur par secteur (colonne Secteur) : rendement moyen des actions du secteur.
+Chaque actif est exposé aux indices et au facteur de son secteur (régression par moindres carrés,
+un seul appel par secteur pour tous ses actifs). Aucune matrice N x N n'est construite : les
+produits Sigma w et les variances de portefeuille coûtent O(N K).
+"""
+
+INDICES_REFERENCE = {'Marché': ['^GSPC', 'SPY'], 'Obligations': ['TLT'], 'Or': ['GLD']}
+
+
+class ModeleRisque:
+    """
+    Attributs
+    ---------
+    tickers : list
+        Actifs couverts (lignes de B).
+    facteurs : list
+        Noms des K facteurs (colonnes de B).
+    B : numpy.ndarray (N, K)
+        Expositions aux facteurs.
+    omega : numpy.ndarray (K, K)
+        Covariance des facteurs (par période).
+    specifique : numpy.ndarray (N,)
+        Variance spécifique de chaque actif (par période).
+    """
+
+    def __init__(self, tickers, facteurs, B, omega, specifique, periodes=252):
+        self.tickers = list(tickers)
+        self.facteurs = list(facteurs)
+        self.B = B
+        self.omega = omega
+        self.specifique = specifique
+        self.periodes = periodes
+        self.indices = {t: i for i, t in enumerate(self.tickers)}
+
+    # %% Estimation
+    @classmethod
+    def depuis_rendements(cls, pivot_data, secteurs, periodes=252):
+        """
+        Estime le modèle à partir d'un tableau date x ticker de rendements et d'un dictionnaire
+        ticker -> secteur ('Non disponible' pour les actifs sans secteur).
+        """
+        pivot_data = pivot_data.fillna(0)
+        tickers = list(pivot_data.columns)
+        R = pivot_data.values
+
+        # Facteurs indices : premier proxy disponible dans l'univers
+        colonnes, noms = [], []
+        for nom, proxies in INDICES_REFERENCE.items():
+            for proxy in proxies:
+                if proxy in pivot_data.columns:
+                    colonnes.append(pivot_data[proxy].values)
+                    noms.append(nom)
+                    break
+        n_indices = len(colonnes)
+
+        # Facteurs sectoriels : rendement moyen équipondéré des actifs du secteur
+        secteurs_actifs = np.array([secteurs.get(t, 'Non disponible') for t in tickers])
+        liste_secteurs = sorted(s for s in set(secteurs_actifs) if s != 'Non disponible')
+        for s in liste_secteurs:
+            colonnes.append(R[:, secteurs_actifs == s].mean(axis=1))
+            noms.append(s)
+        F = np.column_stack(colonnes) if colonnes else np.zeros((len(R), 0))
+
+        # Régression de chaque groupe d'actifs sur les indices et le facteur de son secteur
+        B = np.zeros((len(tickers), F.shape[1]))
+        residus = np.empty_like(R)
+        for s in set(secteurs_actifs):
+            membres = secteurs_actifs == s
+            expositions = list(range(n_indices))
+            if s in liste_secteurs:
+                expositions.append(n_indices + liste_secteurs.index(s))
+            X = np.column_stack([np.ones(len(R)), F[:, expositions]])
+            coefs, *_ = np.linalg.lstsq(X, R[:, membres], rcond=None)
+            B[np.ix_(membres, expositions)] = coefs[1:].T
+            residus[:, membres] = R[:, membres] - X @ coefs
+
+        omega = np.atleast_2d(np.cov(F, rowvar=False)) if F.shape[1] else np.zeros((0, 0))
+        specifique = np.maximum(residus.var(axis=0, ddof=1), 1e-12)
+        return cls(tickers, noms, B, omega, specifique, periodes)
+
+    @classmethod
+    def depuis_base(cls, date, fenetre=252, db_path="fund_database.db", stockage=None):
+        """Estime le modèle sur les fenetre jours de la table Returns strictement antérieurs à date."""
+        stockage = stockage or StockageSQLite(db_path)
+        df = stockage.lire_returns()
+        df = df[df.index < pd.Timestamp(date)]
+        pivot_data = df.pivot_table(index=df.index, columns='ticker', values='return').tail(fenetre)
+        secteurs = df.groupby('ticker')['secteur'].last().to_dict()
+        return cls.depuis_rendements(pivot_data.dropna(axis=1, how='all'), secteurs)
+
+    # %% Calculs sans matrice N x N
+    def vecteur(self, poids):
+        """Vecteur de poids aligné sur les tickers du modèle, à partir d'un dictionnaire ou d'un tableau."""
+        if isinstance(poids, dict):
+            w = np.zeros(len(self.tickers))
+            for t, p in poids.items():
+                if t in self.indices:
+                    w[self.indices[t]] = p
+            return w
+        return np.asarray(poids, dtype=float)
+
+    def produit(self, w):
+        """Sigma w, en O(N K)."""
+        w = self.vecteur(w)
+        return self.B @ (self.omega @ (self.B.T @ w)) + self.specifique * w
+
+    def variance(self, w, annualiser=True):
+        w = self.vecteur(w)
+        f = self.B.T @ w
+        v = f @ self.omega @ f + np.sum(self.specifique * w * w)
+        return v * self.periodes if annualiser else v
+
+    def volatilite(self, w):
+        """Volatilité annualisée du portefeuille."""
+        return float(np.sqrt(self.variance(w)))
+
+    def facteur_structure(self, annualiser=True):
+        """
+        Facteur du risque commun (N x K) et variances spécifiques (N,), tels que
+        Sigma = F F' + diag(specifique). Utilisé par le moteur de conformité.
+        """
+        echelle = self.periodes if annualiser else 1
+        valeurs, vecteurs = np.linalg.eigh(self.omega * echelle) if len(self.omega) else (np.zeros(0), np.zeros((0, 0)))
+        racine = vecteurs * np.sqrt(np.clip(valeurs, 0, None))
+        return self.B @ racine, self.specifique * echelle
+
+    def contributions(self, w):
+        """
+        Décomposition du risque annualisé : contribution de chaque facteur et du risque spécifique
+        à la variance du portefeuille (la somme est égale à la variance totale).
+        """
+        w = self.vecteur(w)
+        f = self.B.T @ w
+        par_facteur = f * (self.omega @ f) * self.periodes
+        specifique = np.sum(self.specifique * w * w) * self.periodes
+        return pd.Series(np.append(par_facteur, specifique), index=self.facteurs + ['Spécifique'])
@@ -0,0 +1,149 @@
+# %% Packages
+import numpy as np
+import pandas as pd
+from stockage import StockageSQLite
+
+"""
+Représentation compacte des données de marché en mémoire.
+
+Le DataFrame au format long renvoyé par get_financial_data (ou lu dans la table Returns) répète
+les chaînes 'ticker', 'Category' et 'Secteur' sur chaque ligne. Le Panel stocke à la place :
+
+- trois tableaux denses date x ticker (Close, Volume, Returns) en float32 par défaut ;
+- un petit tableau de métadonnées indexé par un identifiant entier de ticker (ticker_id),
+  avec des colonnes catégorielles pour la catégorie et le secteur ;
+- l'axe des dates sous forme de datetime64.
+
+Empreinte mémoire pour T dates et N tickers :
+- format long : environ 3 x 8 octets de valeurs, 8 octets de date et 3 objets chaînes par ligne,
+  soit près de 200 octets par ligne en comptant les chaînes (memory_usage(deep=True)) ;
+- Panel float32 : 3 x 4 = 12 octets par cellule, plus T x 8 octets de dates et quelques octets par
+  ticker de métadonnées. Le gain est d'au moins 5x, et d'environ 15x en comptant les chaînes.
+La méthode memoire donne l'empreinte exacte d'une instance.
+"""
+
+
+class Panel:
+    """
+    Panel de données date x ticker.
+
+    Attributs
+    ---------
+    dates : numpy.ndarray (datetime64[ns])
+        Dates triées par ordre croissant (lignes des tableaux).
+    tickers : numpy.ndarray
+        Tickers, la position d'un ticker dans ce tableau est son ticker_id (colonnes des tableaux).
+    close, volume, returns : numpy.ndarray
+        Tableaux (T, N), NaN lorsqu'il n'y a pas de cotation.
+    meta : pandas.DataFrame
+        Colonnes 'ticker', 'Category', 'Secteur' indexées par ticker_id.
+    """
+
+    def __init__(self, dates, tickers, close, volume, returns, meta):
+        self.dates = dates
+        self.tickers = tickers
+        self.close = close
+        self.volume = volume
+        self.returns = returns
+        self.meta = meta
+        self._ids = {t: i for i, t in enumerate(tickers)}
+
+    @classmethod
+    def depuis_long(cls, df, dtype=np.float32):
+        """
+        Construit un Panel à partir d'un DataFrame au format long indexé par date, avec les colonnes
+        de get_financial_data ('Close', 'Volume', 'ticker', 'Category', 'Returns', 'Secteur').
+        Les colonnes de la table Returns ('price', 'return', 'secteur') sont également acceptées.
+        """
+        df = df.rename(columns={'price': 'Close', 'return': 'Returns', 'secteur': 'Secteur', 'category': 'Category'})
+        dates, i_dates = np.unique(pd.to_datetime(df.index).values, return_inverse=True)
+        i_tickers, tickers = pd.factorize(df['ticker'], sort=False)
+        tickers = np.asarray(tickers, dtype=object)
+
+        def tableau(colonne):
+            arr = np.full((len(dates), len(tickers)), np.nan, dtype=dtype)
+            if colonne in df.columns:
+                arr[i_dates, i_tickers] = df[colonne].to_numpy(dtype=dtype, na_value=np.nan)
+            return arr
+
+        premieres = df.groupby('ticker', sort=False).first().reindex(tickers)
+        meta = pd.DataFrame({
+            'ticker': tickers,
+            'Category': pd.Categorical(premieres['Category'].values if 'Category' in premieres else [None] * len(tickers)),
+            'Secteur': pd.Categorical(premieres['Secteur'].values if 'Secteur' in premieres else [None] * len(tickers)),
+        })
+        meta.index.name = 'ticker_id'
+        return cls(dates, tickers, tableau('Close'), tableau('Volume'), tableau('Returns'), meta)
+
+    @classmethod
+    def depuis_base(cls, db_path="fund_database.db", dtype=np.float32, stockage=None):
+        """Construit un Panel à partir des tables Returns et Products (base SQLite ou stockage fourni)."""
+        stockage = stockage or StockageSQLite(db_path)
+        df = stockage.lire_returns()
+        categories = stockage.requete("SELECT ticker, category FROM Products")
+        df['category'] = df['ticker'].map(dict(zip(categories['ticker'], categories['category'])))
+        return cls.depuis_long(df, dtype=dtype)
+
+    # %% Accès aux données
+    def ticker_id(self, ticker):
+        return self._ids[ticker]
+
+    def ids(self, tickers):
+        return np.array([self._ids[t] for t in tickers], dtype=np.int64)
+
+    def position_date(self, date):
+        """Nombre de dates strictement antérieures à date (équivalent de data.index < date)."""
+        return int(np.searchsorted(self.dates, np.datetime64(pd.Timestamp(date)), side='left'))
+
+    def vue(self, debut=None, fin=None):
+        """
+        Retourne un Panel restreint aux dates debut <= date < fin, sans copie : les tableaux sont des
+        vues sur ceux du Panel d'origine (ils ne doivent donc pas être modifiés par les stratégies).
+        """
+        i0 = 0 if debut is None else self.position_date(debut)
+        i1 = len(self.dates) if fin is None else self.position_date(fin)
+        return Panel(self.dates[i0:i1], self.tickers, self.close[i0:i1], self.volume[i0:i1],
+                     self.returns[i0:i1], self.meta)
+
+    def selection(self, masque):
+        """Retourne un Panel limité aux tickers du masque booléen (copie des colonnes sélectionnées)."""
+        masque = np.asarray(masque, dtype=bool)
+        meta = self.meta[masque].reset_index(drop=True)
+        meta.index.name = 'ticker_id'
+        return Panel(self.dates, self.tickers[masque], self.close[:, masque], self.volume[:, masque],
+                     self.returns[:, masque], meta)
+
+    def categorie(self, categorie):
+        """Retourne le Panel des tickers d'une catégorie (par exemple 'Action')."""
+        return self.selection((self.meta['Category'] == categorie).values)
+
+    def secteur(self, ticker):
+        return self.meta['Secteur'].iloc[self._ids[ticker]]
+
+    def vers_long(self):
+        """Reconstruit le DataFrame au format long de get_financial_data (pour les fonctions existantes)."""
+        T, N = self.close.shape
+        df = pd.DataFrame({
+            'Close': self.close.ravel(),
+            'Volume': self.volume.ravel(),
+            'ticker': np.tile(self.tickers, T),
+            'Category': np.tile(self.meta['Category'].astype(object).values, T),
+            'Returns': self.returns.ravel(),
+            'Secteur': np.tile(self.meta['Secteur'].astype(object).values, T),
+        }, index=pd.DatetimeIndex(np.repeat(self.dates, N), name='Date'))
+        return df[df['Close'].notna()]
+
+    def memoire(self):
+        """Empreinte mémoire en octets de chaque composant du Panel."""
+        return {
+            'dates': self.dates.nbytes,
+            'close': self.close.nbytes,
+            'volume': self.volume.nbytes,
+            'returns': self.returns.nbytes,
+            'meta': int(self.meta.memory_usage(deep=True).sum()),
+            'total': self.dates.nbytes + self.close.nbytes + self.volume.nbytes + self.returns.nbytes
+                     + int(self.meta.memory_usage(deep=True).sum()),
+        }
+
+    def __repr__(self):
+        return f"Panel({len(self.dates)} dates x {len(self.tickers)} tickers, {self.memoire()['total'] / 1e6:.1f} Mo)"
@@ -4,37 +4,42 @@ import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 import seaborn as sns
+import os
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from stockage import StockageSQLite, ouvrir_stockage
+from frequence import Frequence
+from couts import rendements_nets
 
 #%% Performance Low Turnover
 
-def performance():
-    # Connexion à la base de données SQLite
-    conn = sqlite3.connect("fund_database.db")
-    cursor = conn.cursor()
-
-    # Requête pour récupérer le nombre total de transactions et le volume total par profil de risque
-    query_transactions = """
-    SELECT risk_profile, COUNT(*) AS nb_transactions, SUM(quantity) AS volume_total
-    FROM Deals
-    GROUP BY risk_profile;
+def performance(stockage=None, frequence='1d', couts=None, historique=True):
     """
-    df_transactions = pd.read_sql(query_transactions, conn)
-
-    # Requête pour récupérer les pondérations des actifs dans le portefeuille et leurs rendements
-    query_returns = """
-    SELECT ph.id_portfolio, ph.ticker, ph.weight, r.date, r.return
-    FROM Portfolio_Holdings ph
-    JOIN Returns r ON ph.ticker = r.ticker;
+    Affiche et retourne les indicateurs de performance du fonds. Par défaut les données viennent de
+    la base SQLite ; un autre stockage (par exemple StockageDuckDB, voir stockage.py) peut être fourni.
+    Les statistiques des deals ont la même définition quel que soit le stockage (agrégats de rollups.py
+    sur SQLite). frequence est celle des barres
+    de la table Returns, elle fixe le nombre de périodes par an pour l'annualisation.
+    couts (colonnes id_portfolio, date, cout, voir ModeleCouts.couts_par_portefeuille dans couts.py)
+    donne des indicateurs nets de coûts de transaction. Avec historique=True (par défaut), chaque rendement
+    est pondéré par la position valable à sa date (Holdings_History, voir historique_positions.py).
     """
-    df_returns = pd.read_sql(query_returns, conn)
-    
-    # Calcul du rendement pondéré par portefeuille
-    df_returns["weighted_return"] = df_returns["weight"] * df_returns["return"]
-    portfolio_performance = df_returns.groupby(["id_portfolio", "date"])['weighted_return'].sum().reset_index()
+    f = Frequence(frequence)
+    stockage = stockage or StockageSQLite("fund_database.db")
+
+    # Nombre total de transactions et volume total par profil de risque
+    df_transactions = stockage.transactions_par_profil()
+    # Répartition des transactions par secteur et profil de risque
+    df_products = stockage.repartition_secteurs()
+
+    # Rendement pondéré par portefeuille et par date, agrégé par le moteur de stockage
+    portfolio_performance = stockage.rendements_ponderes(historique=historique)
+    if couts is not None:
+        portfolio_performance = rendements_nets(portfolio_performance, couts)
     
     # Calcul des statistiques annuelles
-    rendement_annuel = portfolio_performance.groupby("id_portfolio")["weighted_return"].mean() * 252  # Rendement annualisé
-    vol_annuelle = portfolio_performance.groupby("id_portfolio")["weighted_return"].std() * np.sqrt(252)  # Volatilité annualisée
+    rendement_annuel = f.annualiser_rendement(portfolio_performance.groupby("id_portfolio")["weighted_return"].mean())  # Rendement annualisé
+    vol_annuelle = f.annualiser_volatilite(portfolio_performance.groupby("id_portfolio")["weighted_return"].std())  # Volatilité annualisée
     rf = 0.02  # Taux sans risque supposé
     ratio_sharpe = (rendement_annuel - rf) / vol_annuelle  # Calcul du ratio de Sharpe
     
@@ -45,23 +50,6 @@ def performance():
         "Ratio de Sharpe": ratio_sharpe
     }).round(2)
     
-    # Requête pour récupérer la répartition des transactions par secteur et profil de risque
-    query_products = """
-    SELECT 
-        d.risk_profile, 
-        p.secteur AS secteur,
-        COUNT(*) AS nb_transactions,
-        ROUND(COUNT(*) * 100.0 / SUM(COUNT(*)) OVER (PARTITION BY d.risk_profile), 2) AS proportion
-    FROM Deals d
-    JOIN Products p ON d.asset = p.ticker
-    GROUP BY d.risk_profile, p.secteur
-    ORDER BY d.risk_profile, proportion DESC;
-    """
-    df_products = pd.read_sql(query_products, conn)
-    
-    # Fermeture de la connexion à la base de données
-    conn.close()
-    
     # Affichage des résultats
     print("Nombre de transactions par profil de risque :")
     print(df_transactions)
@@ -78,4 +66,106 @@ def performance():
     plt.ylabel("Nombre de transactions")
     plt.show()
     
-    return df_transactions, df_metrics, df_products
\ No newline at end of file
+    return df_transactions, df_metrics, df_products
+
+#%% Rapport de performance non interactif
+
+def _ecrire_tableau(df, dossier, nom, index=True):
+    """Écrit un tableau en CSV et, si pyarrow est disponible, en Parquet. Retourne les fichiers écrits."""
+    fichiers = [os.path.join(dossier, f"{nom}.csv")]
+    df.to_csv(fichiers[0], index=index)
+    try:
+        df.to_parquet(os.path.join(dossier, f"{nom}.parquet"), index=index)
+        fichiers.append(os.path.join(dossier, f"{nom}.parquet"))
+    except ImportError:
+        pass
+    return fichiers
+
+
+def rapport_performance(dossier="rapport_performance", db_path="fund_database.db", chunksize=100_000, rf=0.02,
+                        frequence='1d', couts=None, historique=True, stockage=None):
+    """
+    Version de performance() destinée aux traitements planifiés sur serveur.
+
+    Les rendements des portefeuilles sont lus par paquets de chunksize lignes et agrégés au fil de
+    l'eau, et les statistiques des deals viennent des tables d'agrégats, la mémoire utilisée ne
+    dépend donc pas du nombre de deals. Les graphiques sont produits avec le moteur
+    de rendu Agg (sans fenêtre) et tous les résultats sont écrits dans le dossier de sortie :
+    tableaux en CSV (et Parquet si pyarrow est installé), figures en PNG et un rapport HTML.
+    Avec couts (voir performance()), les indicateurs sont nets de coûts de transaction. historique a le même
+    sens que dans performance() : positions valables à chaque date (Holdings_History) par défaut.
+    Les données sont lues dans stockage s'il est fourni, sinon dans db_path (SQLite, ou DuckDB pour un
+    fichier .duckdb, voir ouvrir_stockage dans stockage.py).
+
+    Retourne
+    --------
+    tuple
+        df_transactions, df_metrics, df_products (comme performance()).
+    """
+    os.makedirs(dossier, exist_ok=True)
+    a_fermer = stockage is None
+    stockage = stockage or ouvrir_stockage(db_path)
+
+    # Nombre de transactions et volume total par profil de risque (agrégats de rollups.py sur SQLite)
+    df_transactions = stockage.transactions_par_profil()
+
+    # Rendement pondéré par portefeuille et par date : les sommes partielles de chaque paquet s'additionnent
+    portfolio_performance = stockage.rendements_ponderes_par_lots(historique, taille=chunksize).reset_index()
+    if couts is not None:
+        portfolio_performance = rendements_nets(portfolio_performance, couts)
+
+    f = Frequence(frequence)
+    rendement_annuel = f.annualiser_rendement(portfolio_performance.groupby("id_portfolio")["weighted_return"].mean())
+    vol_annuelle = f.annualiser_volatilite(portfolio_performance.groupby("id_portfolio")["weighted_return"].std())
+    ratio_sharpe = (rendement_annuel - rf) / vol_annuelle
+    df_metrics = pd.DataFrame({
+        "Rendement Annuel (%)": rendement_annuel * 100,
+        "Volatilité Annuelle (%)": vol_annuelle * 100,
+        "Ratio de Sharpe": ratio_sharpe
+    }).round(2)
+
+    # Répartition des transactions par secteur et profil de risque
+    df_products = stockage.repartition_secteurs()
+    if a_fermer:
+        stockage.fermer()
+
+    # Écriture des tableaux
+    _ecrire_tableau(df_transactions, dossier, "transactions", index=False)
+    _ecrire_tableau(df_metrics, dossier, "metriques")
+    _ecrire_tableau(df_products, dossier, "repartition_secteurs", index=False)
+    _ecrire_tableau(portfolio_performance, dossier, "rendements_portefeuilles", index=False)
+
+    # Graphiques avec le moteur de rendu Agg (aucune fenêtre, compatible serveur sans affichage)
+    fig = Figure(figsize=(10, 5))
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    sns.barplot(data=df_transactions, x="risk_profile", y="nb_transactions", ax=ax)
+    ax.set_title("Nombre de transactions par profil de risque")
+    ax.set_xlabel("Profil de risque")
+    ax.set_ylabel("Nombre de transactions")
+    fig.savefig(os.path.join(dossier, "transactions.png"), bbox_inches="tight")
+
+    fig = Figure(figsize=(10, 5))
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    cumul = portfolio_performance.pivot(index="date", columns="id_portfolio", values="weighted_return").fillna(0)
+    if not cumul.empty:
+        (1 + cumul).cumprod().plot(ax=ax)
+    ax.set_title("Performance cumulée par portefeuille")
+    ax.set_xlabel("Date")
+    ax.set_ylabel("Valeur (base 1)")
+    fig.savefig(os.path.join(dossier, "performance_cumulee.png"), bbox_inches="tight")
+
+    # Rapport HTML regroupant les tableaux et les figures
+    with open(os.path.join(dossier, "rapport.html"), "w", encoding="utf-8") as f:
+        f.write("<html><head><meta charset='utf-8'><title>Rapport de performance</title></head><body>\n")
+        f.write("<h1>Rapport de performance</h1>\n")
+        f.write("<h2>Nombre de transactions par profil de risque</h2>\n" + df_transactions.to_html(index=False))
+        f.write("<img src='transactions.png'>\n")
+        f.write("<h2>Indicateurs de performance</h2>\n" + df_metrics.to_html())
+        f.write("<img src='performance_cumulee.png'>\n")
+        f.write("<h2>Répartition des transactions par produits et profil de risque</h2>\n" + df_products.to_html(index=False))
+        f.write("</body></html>\n")
+
+    print(f"Rapport écrit dans {dossier}")
+    return df_transactions, df_metrics, df_products
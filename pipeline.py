@@ -0,0 +1,381 @@
+import ast
+import hashlib
+import inspect
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import pandas as pd
+
+"""
+Orchestration du projet sous forme de graphe de dépendances (remplace l'enchaînement des cellules
+de Main.ipynb, où chaque étape était recalculée à chaque exécution).
+
+Chaque étape déclare :
+- ses dépendances (étapes dont elle utilise les résultats) ;
+- ses entrées : fichiers de données, et ses paramètres ;
+- ses sorties : fichiers ou dossiers produits.
+Les fichiers source d'une étape ne sont pas listés à la main : ce sont les modules du projet
+importés par sa fonction, directement ou par transitivité (analyse des import du code, y compris
+ceux placés dans le corps des fonctions), plus le code de la fonction elle-même.
+L'empreinte d'une étape est le hash du contenu de ses sources et entrées, de ses paramètres et des
+empreintes de ses dépendances. Une étape est sautée si son empreinte est celle de la dernière exécution réussie
+(enregistrée dans pipeline_etat.json), que ses sorties existent et qu'aucune dépendance n'a été
+reconstruite. Les étapes indépendantes (les trois backtests) tournent en parallèle, et un résumé
+indique ce qui a été reconstruit et pourquoi.
+
+Les trois backtests écrivent dans la même base SQLite, chacun dans son portefeuille : ils partagent un
+délai d'attente de verrou (TIMEOUT_BASE) assez long pour attendre la fin des écritures des autres, et
+déclarent leurs deals (et leur point de reprise) comme sorties pour être relancés s'ils ont disparu.
+"""
+
+DB_PATH = "fund_database.db"
+# Délai d'attente (secondes) d'une base verrouillée par un autre backtest
+TIMEOUT_BASE = 600
+
+
+class Etape:
+    """
+    Paramètres
+    ----------
+    nom : str
+    fonction : callable
+        Appelée avec les paramètres de l'étape en arguments nommés.
+    dependances : list
+        Noms des étapes à exécuter avant.
+    entrees : list
+        Fichiers supplémentaires dont le contenu entre dans l'empreinte (fichiers de données...). Les
+        modules du projet importés par fonction sont ajoutés automatiquement (voir sources_importees).
+    sorties : list
+        Fichiers ou dossiers produits, ou objets ayant une méthode existe() pour les sorties écrites en base
+        (voir DealsPortefeuille). L'étape est relancée si l'une d'elles manque.
+    parametres : dict
+    """
+
+    def __init__(self, nom, fonction, dependances=(), entrees=(), sorties=(), parametres=None):
+        self.nom = nom
+        self.fonction = fonction
+        self.dependances = list(dependances)
+        self.entrees = list(entrees)
+        self.sorties = list(sorties)
+        self.parametres = dict(parametres or {})
+
+    def sources(self):
+        """Fichiers source du projet dont dépend la fonction de l'étape."""
+        return sources_importees(self.fonction)
+
+
+class Pipeline:
+    """
+    Exécute un ensemble d'étapes dans l'ordre de leurs dépendances, en sautant celles qui sont à jour.
+    """
+
+    def __init__(self, etapes, fichier_etat="pipeline_etat.json", max_workers=3):
+        self.etapes = {e.nom: e for e in etapes}
+        self.fichier_etat = fichier_etat
+        self.max_workers = max_workers
+        for e in etapes:
+            for d in e.dependances:
+                if d not in self.etapes:
+                    raise ValueError(f"L'étape {e.nom} dépend d'une étape inconnue : {d}")
+        self.ordre = self._ordre_topologique()
+
+    def _ordre_topologique(self):
+        ordre, visitees, en_cours = [], set(), set()
+
+        def visiter(nom):
+            if nom in visitees:
+                return
+            if nom in en_cours:
+                raise ValueError(f"Cycle dans le pipeline autour de l'étape {nom}")
+            en_cours.add(nom)
+            for d in self.etapes[nom].dependances:
+                visiter(d)
+            en_cours.discard(nom)
+            visitees.add(nom)
+            ordre.append(nom)
+
+        for nom in self.etapes:
+            visiter(nom)
+        return ordre
+
+    # %% Empreintes
+    def _lire_etat(self):
+        if not os.path.exists(self.fichier_etat):
+            return {}
+        with open(self.fichier_etat, encoding="utf-8") as f:
+            return json.load(f)
+
+    def _ecrire_etat(self, etat):
+        with open(self.fichier_etat, "w", encoding="utf-8") as f:
+            json.dump(etat, f, indent=2, ensure_ascii=False)
+
+    def empreintes(self):
+        """Empreinte de chaque étape et détail par entrée (pour expliquer les reconstructions)."""
+        cles, details = {}, {}
+        for nom in self.ordre:
+            e = self.etapes[nom]
+            detail = {'parametres': _hash_texte(_empreinte_parametres(e.parametres)),
+                      'code': _hash_texte(_code_fonction(e.fonction))}
+            for chemin in sorted(set(e.sources()) | set(e.entrees)):
+                detail[chemin] = _hash_fichier(chemin)
+            for d in e.dependances:
+                detail[f"étape {d}"] = cles[d]
+            details[nom] = detail
+            cles[nom] = _hash_texte(json.dumps(detail, sort_keys=True))
+        return cles, details
+
+    def _motif(self, nom, cle, detail, precedent, reconstruites):
+        """Raison de reconstruire l'étape, ou None si elle est à jour."""
+        e = self.etapes[nom]
+        if precedent is None:
+            return "première exécution"
+        changees = [d for d in e.dependances if d in reconstruites]
+        if changees:
+            return "dépendance reconstruite : " + ", ".join(changees)
+        if precedent['cle'] != cle:
+            ancien = precedent.get('detail', {})
+            modifiees = [k for k, v in detail.items() if ancien.get(k) != v]
+            return "entrées modifiées : " + ", ".join(modifiees)
+        manquantes = [str(s) for s in e.sorties if not _sortie_existe(s)]
+        if manquantes:
+            return "sorties manquantes : " + ", ".join(manquantes)
+        return None
+
+    # %% Exécution
+    def executer(self, forcer=()):
+        """
+        Exécute le pipeline. forcer : noms d'étapes à reconstruire même si elles sont à jour.
+
+        Retourne
+        --------
+        pandas.DataFrame
+            Résumé par étape : statut, motif et durée (secondes).
+        """
+        etat = self._lire_etat()
+        cles, details = self.empreintes()
+        restantes = list(self.ordre)
+        reconstruites, echecs, resume = set(), {}, {}
+        en_cours = {}
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            while restantes or en_cours:
+                # Lance toutes les étapes dont les dépendances sont terminées
+                for nom in list(restantes):
+                    e = self.etapes[nom]
+                    if any(d in restantes or d in en_cours.values() for d in e.dependances):
+                        continue
+                    restantes.remove(nom)
+                    bloquantes = [d for d in e.dependances if d in echecs]
+                    if bloquantes:
+                        echecs[nom] = None
+                        resume[nom] = ('non lancée', "échec de " + ", ".join(bloquantes), 0.0)
+                        continue
+                    motif = "reconstruction forcée" if nom in forcer else \
+                        self._motif(nom, cles[nom], details[nom], etat.get(nom), reconstruites)
+                    if motif is None:
+                        resume[nom] = ('à jour', "", 0.0)
+                        continue
+                    print(f"[pipeline] {nom} : {motif}")
+                    en_cours[pool.submit(self._lancer, e)] = nom
+                    resume[nom] = ('en cours', motif, 0.0)
+
+                if not en_cours:
+                    continue
+                terminees, _ = wait(list(en_cours), return_when=FIRST_COMPLETED)
+                for future in terminees:
+                    nom = en_cours.pop(future)
+                    motif = resume[nom][1]
+                    try:
+                        duree = future.result()
+                    except Exception as ex:
+                        echecs[nom] = ex
+                        resume[nom] = ('échec', f"{motif} ({ex})", 0.0)
+                        continue
+                    reconstruites.add(nom)
+                    resume[nom] = ('reconstruite', motif, round(duree, 1))
+                    etat[nom] = {'cle': cles[nom], 'detail': details[nom],
+                                 'date': time.strftime("%Y-%m-%d %H:%M:%S")}
+                    self._ecrire_etat(etat)
+
+        df_resume = pd.DataFrame.from_dict(resume, orient='index', columns=['statut', 'motif', 'duree_s'])
+        df_resume = df_resume.reindex(self.ordre)
+        print(df_resume.to_string())
+        erreurs = [ex for ex in echecs.values() if ex is not None]
+        if erreurs:
+            raise erreurs[0]
+        return df_resume
+
+    def _lancer(self, etape):
+        debut = time.perf_counter()
+        etape.fonction(**etape.parametres)
+        return time.perf_counter() - debut
+
+
+class DealsPortefeuille:
+    """Sortie d'un backtest : deals du portefeuille id_portfolio et, si strategie est fourni, son point de reprise."""
+
+    def __init__(self, id_portfolio, strategie=None, db_path=DB_PATH):
+        self.id_portfolio = id_portfolio
+        self.strategie = strategie
+        self.db_path = db_path
+
+    def existe(self):
+        from stockage import StockageSQLite
+        if not os.path.exists(self.db_path):
+            return False
+        stockage = StockageSQLite(self.db_path, timeout=TIMEOUT_BASE)
+        if not stockage.table_existe('Deals') or stockage.requete(
+                "SELECT 1 FROM Deals WHERE id_portfolio = ? LIMIT 1", (self.id_portfolio,)).empty:
+            return False
+        return self.strategie is None or (stockage.table_existe('Strategy_Checkpoints') and not stockage.requete(
+            "SELECT 1 FROM Strategy_Checkpoints WHERE strategie = ? LIMIT 1", (self.strategie,)).empty)
+
+    def __str__(self):
+        texte = f"deals du portefeuille {self.id_portfolio}"
+        return texte + (f" et point de reprise {self.strategie}" if self.strategie else "")
+
+
+def _sortie_existe(sortie):
+    return sortie.existe() if hasattr(sortie, 'existe') else os.path.exists(sortie)
+
+
+def _hash_texte(texte):
+    return hashlib.sha256(texte.encode("utf-8")).hexdigest()
+
+
+def _hash_fichier(chemin):
+    if not os.path.exists(chemin):
+        return None
+    h = hashlib.sha256()
+    with open(chemin, "rb") as f:
+        for bloc in iter(lambda: f.read(1 << 20), b""):
+            h.update(bloc)
+    return h.hexdigest()
+
+
+def _code_fonction(fonction):
+    try:
+        return inspect.getsource(fonction)
+    except (OSError, TypeError):
+        return repr(fonction)
+
+
+def _modules_importes(code):
+    # Noms de premier niveau de tous les modules importés dans le code (en tête de fichier ou dans les fonctions)
+    noms = set()
+    for noeud in ast.walk(ast.parse(code)):
+        if isinstance(noeud, ast.Import):
+            noms.update(alias.name.split('.')[0] for alias in noeud.names)
+        elif isinstance(noeud, ast.ImportFrom) and noeud.module and noeud.level == 0:
+            noms.add(noeud.module.split('.')[0])
+    return noms
+
+
+def sources_importees(fonction, dossier=None):
+    """
+    Fichiers .py du projet importés par une fonction, directement ou par l'intermédiaire des modules
+    qu'elle importe. Les bibliothèques externes (absentes du dossier du projet) sont ignorées.
+    """
+    dossier = dossier or os.path.dirname(os.path.abspath(__file__))
+    a_visiter = [_code_fonction(fonction)]
+    sources = set()
+    while a_visiter:
+        for nom in _modules_importes(a_visiter.pop()):
+            chemin = f"{nom}.py"
+            if chemin in sources or not os.path.exists(os.path.join(dossier, chemin)):
+                continue
+            sources.add(chemin)
+            with open(os.path.join(dossier, chemin), encoding="utf-8") as f:
+                a_visiter.append(f.read())
+    return sorted(sources)
+
+
+def _empreinte_parametres(parametres):
+    # Les objets (fournisseurs de données, prédicteurs) sont décrits par leur classe et leurs attributs publics
+    def decrire(x):
+        if hasattr(x, '__dict__'):
+            attributs = {k: v for k, v in vars(x).items() if not k.startswith('_')}
+            return {type(x).__name__: attributs}
+        return repr(x)
+    return json.dumps(parametres, sort_keys=True, default=decrire)
+
+
+# %% Étapes du projet
+def construire_base(fournisseur=None):
+    """Recrée la base à partir de zéro (les tables de lancement_base ne sont pas idempotentes)."""
+    from database_loader import lancement_base
+    if os.path.exists(DB_PATH):
+        os.remove(DB_PATH)
+    lancement_base(fournisseur)
+
+
+def reinitialiser_strategie(id_portfolio, strategie=None, db_path=DB_PATH):
+    """
+    Efface les deals, les positions et l'historique des positions du portefeuille d'une stratégie (et ses
+    points de reprise s'il y en a) avant de relancer son backtest. Chaque stratégie a son propre portefeuille.
+    """
+    from checkpoints import supprimer_checkpoints
+    from stockage import StockageSQLite
+    StockageSQLite(db_path, timeout=TIMEOUT_BASE).ecrire_lot([
+        (f"DELETE FROM {table} WHERE id_portfolio = ?", [(id_portfolio,)])
+        for table in ("Deals", "Portfolio_Holdings", "Holdings_History")
+    ])
+    if strategie is not None:
+        supprimer_checkpoints(db_path, strategie, timeout=TIMEOUT_BASE)
+
+
+def _stockage_backtest():
+    # Stockage partagé par les backtests lancés en parallèle (délai d'attente commun)
+    from stockage import StockageSQLite
+    return StockageSQLite(DB_PATH, timeout=TIMEOUT_BASE)
+
+
+def backtest_low_turnover(frequence='1d', asynchrone=False):
+    from strategies_final import Strategie_2_Low_Turnover
+    reinitialiser_strategie(2, Strategie_2_Low_Turnover.nom)
+    Strategie_2_Low_Turnover(DB_PATH, stockage=_stockage_backtest(), frequence=frequence).run(
+        reprendre=False, asynchrone=asynchrone)
+
+
+def backtest_equity_only(debut='2023-01-02', fin='2024-12-31', frequence='1d'):
+    from strategie_equity_only import run_equity_only
+    reinitialiser_strategie(3, "Equity Only")
+    run_equity_only(DB_PATH, debut, fin, frequence=frequence, stockage=_stockage_backtest())
+
+
+def backtest_high_yield_rf(debut='2023-01-02', fin='2024-12-31', top_k=10, seuil=0.5):
+    from strategie_high_yield_rf import strategie_high_yield_rf, ID_PORTFOLIO
+    reinitialiser_strategie(ID_PORTFOLIO)
+    strategie_high_yield_rf(DB_PATH, debut, fin, top_k=top_k, seuil=seuil, stockage=_stockage_backtest())
+
+
+def rapport(dossier="rapport_performance"):
+    from performances import rapport_performance
+    rapport_performance(dossier, DB_PATH)
+
+
+def pipeline_projet(fournisseur=None, debut='2023-01-02', fin='2024-12-31', top_k=10, seuil=0.5,
+                    dossier_rapport="rapport_performance", frequence='1d'):
+    """
+    Graphe du projet : base de données -> trois backtests (en parallèle) -> rapport de performance.
+    Chaque backtest écrit dans son propre portefeuille (2 : Low Turnover, 3 : Equity Only, 4 : Random Forest).
+    Modifier les paramètres d'une seule stratégie ne relance que cette stratégie et le rapport.
+    """
+    etapes = [
+        Etape("base", construire_base, sorties=[DB_PATH], parametres={'fournisseur': fournisseur}),
+        Etape("low_turnover", backtest_low_turnover, dependances=["base"],
+              sorties=[DealsPortefeuille(2, "Low Turnover")], parametres={'frequence': frequence}),
+        Etape("equity_only", backtest_equity_only, dependances=["base"],
+              sorties=[DealsPortefeuille(3, "Equity Only")],
+              parametres={'debut': debut, 'fin': fin, 'frequence': frequence}),
+        Etape("high_yield_rf", backtest_high_yield_rf, dependances=["base"],
+              sorties=[DealsPortefeuille(4)], parametres={'debut': debut, 'fin': fin, 'top_k': top_k, 'seuil': seuil}),
+        Etape("rapport", rapport, dependances=["low_turnover", "equity_only", "high_yield_rf"],
+              sorties=[dossier_rapport], parametres={'dossier': dossier_rapport}),
+    ]
+    return Pipeline(etapes)
+
+
+if __name__ == "__main__":
+    pipeline_projet().executer()
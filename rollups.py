@@ -0,0 +1,144 @@
+import sqlite3
+import pandas as pd
+
+"""
+Tables d'agrégats des deals, tenues à jour par des triggers SQLite.
+
+Deals_Rollup contient, pour chaque couple (profil de risque, secteur, mois), le nombre de
+transactions et le volume total. Chaque INSERT, DELETE ou UPDATE dans Deals met à jour les lignes
+correspondantes (un UPDATE retire l'ancien deal et ajoute le nouveau), les rapports lisent donc
+quelques centaines de lignes quel que soit le nombre de deals accumulés. Le secteur est celui de
+la table Products (comme dans la jointure de performance()), à défaut celui enregistré dans le deal,
+résolu à l'écriture du deal : après une modification du secteur d'un produit dans Products, relancer
+creer_rollups pour recalculer les agrégats.
+"""
+
+SECTEUR_DEAL = "COALESCE((SELECT secteur FROM Products WHERE ticker = {0}.asset), {0}.secteur, 'Non disponible')"
+
+
+def creer_rollups(db_path="fund_database.db"):
+    """
+    Crée (ou recrée) la table Deals_Rollup et ses triggers, puis l'alimente à partir des deals déjà
+    présents. À appeler après la création de la table Deals (voir lancement_base).
+    """
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+
+    cursor.execute("DROP TRIGGER IF EXISTS deals_rollup_insert")
+    cursor.execute("DROP TRIGGER IF EXISTS deals_rollup_delete")
+    cursor.execute("DROP TRIGGER IF EXISTS deals_rollup_update")
+    cursor.execute("DROP TABLE IF EXISTS Deals_Rollup")
+    cursor.execute("""
+    CREATE TABLE Deals_Rollup (
+        risk_profile TEXT NOT NULL,
+        secteur TEXT NOT NULL,
+        mois TEXT NOT NULL,
+        nb_transactions INTEGER NOT NULL,
+        volume_total REAL NOT NULL,
+        PRIMARY KEY (risk_profile, secteur, mois)
+    ) WITHOUT ROWID;
+    """)
+
+    cursor.execute(f"""
+    INSERT INTO Deals_Rollup (risk_profile, secteur, mois, nb_transactions, volume_total)
+    SELECT d.risk_profile, {SECTEUR_DEAL.format('d')}, SUBSTR(d.date, 1, 7), COUNT(*), SUM(d.quantity)
+    FROM Deals d
+    GROUP BY 1, 2, 3;
+    """)
+
+    cursor.execute(f"""
+    CREATE TRIGGER deals_rollup_insert AFTER INSERT ON Deals
+    BEGIN
+        INSERT INTO Deals_Rollup (risk_profile, secteur, mois, nb_transactions, volume_total)
+        VALUES (NEW.risk_profile, {SECTEUR_DEAL.format('NEW')}, SUBSTR(NEW.date, 1, 7), 1, NEW.quantity)
+        ON CONFLICT (risk_profile, secteur, mois) DO UPDATE SET
+            nb_transactions = nb_transactions + 1,
+            volume_total = volume_total + excluded.volume_total;
+    END;
+    """)
+
+    cursor.execute(f"""
+    CREATE TRIGGER deals_rollup_delete AFTER DELETE ON Deals
+    BEGIN
+        UPDATE Deals_Rollup
+        SET nb_transactions = nb_transactions - 1,
+            volume_total = volume_total - OLD.quantity
+        WHERE risk_profile = OLD.risk_profile
+          AND secteur = {SECTEUR_DEAL.format('OLD')}
+          AND mois = SUBSTR(OLD.date, 1, 7);
+        DELETE FROM Deals_Rollup WHERE nb_transactions <= 0;
+    END;
+    """)
+
+    cursor.execute(f"""
+    CREATE TRIGGER deals_rollup_update AFTER UPDATE OF date, risk_profile, asset, quantity, secteur ON Deals
+    BEGIN
+        UPDATE Deals_Rollup
+        SET nb_transactions = nb_transactions - 1,
+            volume_total = volume_total - OLD.quantity
+        WHERE risk_profile = OLD.risk_profile
+          AND secteur = {SECTEUR_DEAL.format('OLD')}
+          AND mois = SUBSTR(OLD.date, 1, 7);
+        DELETE FROM Deals_Rollup WHERE nb_transactions <= 0;
+        INSERT INTO Deals_Rollup (risk_profile, secteur, mois, nb_transactions, volume_total)
+        VALUES (NEW.risk_profile, {SECTEUR_DEAL.format('NEW')}, SUBSTR(NEW.date, 1, 7), 1, NEW.quantity)
+        ON CONFLICT (risk_profile, secteur, mois) DO UPDATE SET
+            nb_transactions = nb_transactions + 1,
+            volume_total = volume_total + excluded.volume_total;
+    END;
+    """)
+
+    conn.commit()
+    conn.close()
+
+
+# %% Requêtes sur les agrégats
+def _filtre_mois(debut, fin):
+    conditions, params = [], []
+    if debut is not None:
+        conditions.append("mois >= ?")
+        params.append(str(debut)[:7])
+    if fin is not None:
+        conditions.append("mois <= ?")
+        params.append(str(fin)[:7])
+    return ("WHERE " + " AND ".join(conditions)) if conditions else "", params
+
+
+def transactions_par_profil(conn, debut=None, fin=None):
+    """Nombre de transactions et volume total par profil de risque (mois au format 'AAAA-MM' optionnels)."""
+    where, params = _filtre_mois(debut, fin)
+    return pd.read_sql(f"""
+    SELECT risk_profile, SUM(nb_transactions) AS nb_transactions, SUM(volume_total) AS volume_total
+    FROM Deals_Rollup
+    {where}
+    GROUP BY risk_profile
+    ORDER BY risk_profile;
+    """, conn, params=params)
+
+
+def repartition_secteurs(conn, debut=None, fin=None):
+    """Répartition des transactions par secteur et profil de risque, comme dans performance()."""
+    where, params = _filtre_mois(debut, fin)
+    return pd.read_sql(f"""
+    SELECT
+        risk_profile,
+        secteur,
+        SUM(nb_transactions) AS nb_transactions,
+        ROUND(SUM(nb_transactions) * 100.0 / SUM(SUM(nb_transactions)) OVER (PARTITION BY risk_profile), 2) AS proportion
+    FROM Deals_Rollup
+    {where}
+    GROUP BY risk_profile, secteur
+    ORDER BY risk_profile, proportion DESC, secteur;
+    """, conn, params=params)
+
+
+def transactions_par_mois(conn, risk_profile=None):
+    """Nombre de transactions et volume par mois, pour un profil ou pour l'ensemble du fonds."""
+    where, params = ("WHERE risk_profile = ?", [risk_profile]) if risk_profile is not None else ("", [])
+    return pd.read_sql(f"""
+    SELECT mois, SUM(nb_transactions) AS nb_transactions, SUM(volume_total) AS volume_total
+    FROM Deals_Rollup
+    {where}
+    GROUP BY mois
+    ORDER BY mois;
+    """, conn, params=params)
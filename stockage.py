@@ -0,0 +1,453 @@
+import sqlite3
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+import pandas as pd
+
+"""
+Couche de stockage commune aux chargements, aux stratégies et aux rapports.
+
+Deux moteurs partagent la même interface :
+- StockageSQLite : la base fund_database.db historique (stockage par lignes) ;
+- StockageDuckDB : un fichier DuckDB local (stockage en colonnes) pour les tables lues
+  massivement (Returns, Products, Deals, Portfolio_Holdings, Holdings_History), alimenté à partir de la base
+  SQLite par copier_depuis. Les agrégations des rapports sont exécutées par le moteur au lieu
+  d'être faites en pandas après un SELECT *.
+
+Les requêtes SQL utilisées sont compatibles avec les deux moteurs (paramètres '?', colonne
+"return" entre guillemets). Les écritures de plusieurs instructions (création des tables, deals et
+positions d'une date avec son point de reprise...) passent par transaction() ou ecrire_lot, qui
+les valide ensemble. Les statistiques des deals ont la même définition sur les deux moteurs : sur
+SQLite elles sont lues dans les agrégats tenus à jour par triggers (voir rollups.py), sur DuckDB
+elles sont calculées sur la table Deals. benchmark_stockages compare les deux moteurs sur les
+lectures typiques du projet et vérifie qu'ils renvoient les mêmes résultats.
+"""
+
+TABLES_ANALYTIQUES = ['Products', 'Returns', 'Deals', 'Portfolio_Holdings', 'Holdings_History']
+
+
+class Stockage(ABC):
+    """Interface commune, les sous-classes implémentent requete, requete_par_lots, executer, executer_plusieurs et transaction."""
+
+    @abstractmethod
+    def requete(self, sql, params=()):
+        """Exécute une requête de lecture et renvoie un DataFrame."""
+
+    @abstractmethod
+    def requete_par_lots(self, sql, params=(), taille=100_000):
+        """Exécute une requête de lecture et renvoie ses résultats par DataFrames d'environ taille lignes."""
+
+    @abstractmethod
+    def executer(self, sql, params=()):
+        """Exécute une instruction d'écriture et la valide."""
+
+    @abstractmethod
+    def executer_plusieurs(self, sql, lignes):
+        """Exécute une instruction d'écriture pour chaque ligne, dans une seule transaction."""
+
+    @abstractmethod
+    def transaction(self):
+        """
+        Gestionnaire de contexte qui fournit une connexion (méthodes execute et executemany, paramètres '?')
+        et valide toutes ses écritures à la sortie du bloc, ou les annule en cas d'exception.
+        """
+
+    @abstractmethod
+    def table_existe(self, nom):
+        """La table nom existe-t-elle dans la base ?"""
+
+    def fermer(self):
+        pass
+
+    def ecrire_lot(self, lot):
+        """
+        Exécute un lot d'opérations dans une même transaction, au format de EcrivainBase (voir ecrivain.py) :
+        couples (sql, lignes) exécutés avec executemany (ou execute si lignes vaut None), ou fonctions
+        appelées avec la connexion (par exemple sauver_checkpoint ou cloturer_positions).
+        """
+        with self.transaction() as conn:
+            for operation in lot:
+                if callable(operation):
+                    operation(conn)
+                else:
+                    sql, lignes = operation
+                    if lignes is None:
+                        conn.execute(sql)
+                        continue
+                    lignes = [list(ligne) for ligne in lignes]
+                    if lignes:
+                        conn.executemany(sql, lignes)
+
+    # %% Lectures
+    def lire_table(self, nom):
+        return self.requete(f"SELECT * FROM {nom}")
+
+    def lire_returns(self, categorie=None):
+        """
+        Table Returns indexée par date (colonnes ticker, return, price, secteur), éventuellement
+        limitée à une catégorie de Products (la colonne category est alors ajoutée).
+        """
+        if categorie is None:
+            df = self.requete('SELECT ticker, date, "return", price, secteur FROM Returns')
+        else:
+            df = self.requete("""
+                SELECT r.ticker, r.date, r."return", r.price, r.secteur, p.category
+                FROM Returns r
+                INNER JOIN Products p ON r.ticker = p.ticker
+                WHERE p.category = ?
+            """, (categorie,))
+        df['date'] = pd.to_datetime(df['date'])
+        return df.set_index('date')
+
+    def dates_trading(self):
+        return pd.to_datetime(self.requete("SELECT DISTINCT date FROM Returns")["date"])
+
+    def rendements_ponderes(self, historique=False):
+        """
+        Rendement pondéré de chaque portefeuille à chaque date (jointure Portfolio_Holdings x Returns).
+        Avec historique=True, chaque rendement est pondéré par la position valable à sa date
+        (table Holdings_History, voir historique_positions.py) et non par la position actuelle. Une base
+        construite sans Holdings_History est lue avec les positions actuelles.
+        """
+        if self._historique(historique):
+            df = self.requete("""
+                SELECT h.id_portfolio, r.date, SUM(h.weight * r."return") AS weighted_return
+                FROM Holdings_History h
+                JOIN Returns r ON h.ticker = r.ticker
+                    AND SUBSTR(CAST(r.date AS VARCHAR), 1, 10) >= h.valid_from
+                    AND (h.valid_to IS NULL OR SUBSTR(CAST(r.date AS VARCHAR), 1, 10) < h.valid_to)
+                GROUP BY h.id_portfolio, r.date
+            """)
+        else:
+            df = self.requete("""
+                SELECT ph.id_portfolio, r.date, SUM(ph.weight * r."return") AS weighted_return
+                FROM Portfolio_Holdings ph
+                JOIN Returns r ON ph.ticker = r.ticker
+                GROUP BY ph.id_portfolio, r.date
+            """)
+        df['date'] = pd.to_datetime(df['date']).dt.strftime('%Y-%m-%d')
+        return df.sort_values(['id_portfolio', 'date']).reset_index(drop=True)
+
+    def rendements_ponderes_par_lots(self, historique=False, taille=100_000):
+        """
+        Rendements pondérés de rendements_ponderes calculés par paquets de lignes (position x rendement),
+        pour une mémoire bornée : renvoie la série (id_portfolio, date) -> weighted_return, somme des
+        agrégats partiels de chaque paquet.
+        """
+        if self._historique(historique):
+            sql = """
+                SELECT h.id_portfolio, SUBSTR(CAST(r.date AS VARCHAR), 1, 10) AS date, h.weight * r."return" AS weighted_return
+                FROM Holdings_History h
+                JOIN Returns r ON h.ticker = r.ticker
+                    AND SUBSTR(CAST(r.date AS VARCHAR), 1, 10) >= h.valid_from
+                    AND (h.valid_to IS NULL OR SUBSTR(CAST(r.date AS VARCHAR), 1, 10) < h.valid_to)
+            """
+        else:
+            sql = """
+                SELECT ph.id_portfolio, SUBSTR(CAST(r.date AS VARCHAR), 1, 10) AS date, ph.weight * r."return" AS weighted_return
+                FROM Portfolio_Holdings ph
+                JOIN Returns r ON ph.ticker = r.ticker
+            """
+        partielles = [lot.groupby(['id_portfolio', 'date'])['weighted_return'].sum()
+                      for lot in self.requete_par_lots(sql, taille=taille)]
+        if not partielles:
+            return pd.Series(dtype=float, name='weighted_return',
+                             index=pd.MultiIndex.from_arrays([[], []], names=['id_portfolio', 'date']))
+        return pd.concat(partielles).groupby(level=[0, 1]).sum()
+
+    def _historique(self, historique):
+        # Les bases créées avant historique_positions.py n'ont pas de table Holdings_History
+        if historique and not self.table_existe('Holdings_History'):
+            print("Table Holdings_History absente : rendements pondérés par les positions actuelles")
+            return False
+        return historique
+
+    def transactions_par_profil(self):
+        """Nombre de transactions et volume total par profil de risque."""
+        return self.requete("""
+            SELECT risk_profile, COUNT(*) AS nb_transactions, SUM(quantity) AS volume_total
+            FROM Deals
+            GROUP BY risk_profile
+            ORDER BY risk_profile
+        """)
+
+    def repartition_secteurs(self):
+        """
+        Répartition des transactions par secteur et profil de risque. Le secteur est celui de la table
+        Products, à défaut celui du deal (même définition que les agrégats de rollups.py).
+        """
+        return self.requete("""
+            SELECT
+                d.risk_profile,
+                COALESCE(p.secteur, d.secteur, 'Non disponible') AS secteur,
+                COUNT(*) AS nb_transactions,
+                ROUND(COUNT(*) * 100.0 / SUM(COUNT(*)) OVER (PARTITION BY d.risk_profile), 2) AS proportion
+            FROM Deals d
+            LEFT JOIN Products p ON d.asset = p.ticker
+            GROUP BY 1, 2
+            ORDER BY 1, 4 DESC, 2
+        """)
+
+    # %% Écritures
+    def ecrire_deals(self, deals):
+        """deals : liste de tuples (date, id_portfolio, risk_profile, action, asset, quantity, secteur)."""
+        self.executer_plusieurs("""
+            INSERT INTO Deals (date, id_portfolio, risk_profile, action, asset, quantity, secteur)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, deals)
+
+    def ecrire_holdings(self, holdings):
+        """holdings : liste de tuples (date, id_portfolio, ticker, weight)."""
+        self.executer_plusieurs("""
+            INSERT INTO Portfolio_Holdings (date, id_portfolio, ticker, weight)
+            VALUES (?, ?, ?, ?)
+        """, holdings)
+
+
+class StockageSQLite(Stockage):
+    """
+    Stockage dans la base SQLite du projet (une connexion ouverte par opération, comme ailleurs dans le projet).
+    timeout est le délai d'attente (secondes) d'une base verrouillée par un autre écrivain, pour toutes les connexions.
+    """
+
+    def __init__(self, db_path="fund_database.db", timeout=30):
+        self.db_path = db_path
+        self.timeout = timeout
+
+    def requete(self, sql, params=()):
+        conn = sqlite3.connect(self.db_path, timeout=self.timeout)
+        df = pd.read_sql_query(sql, conn, params=params)
+        conn.close()
+        return df
+
+    def requete_par_lots(self, sql, params=(), taille=100_000):
+        conn = sqlite3.connect(self.db_path, timeout=self.timeout)
+        try:
+            yield from pd.read_sql_query(sql, conn, params=params, chunksize=taille)
+        finally:
+            conn.close()
+
+    @contextmanager
+    def transaction(self):
+        conn = sqlite3.connect(self.db_path, timeout=self.timeout)
+        try:
+            yield conn
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def table_existe(self, nom):
+        return not self.requete("SELECT name FROM sqlite_master WHERE type = 'table' AND name = ?", (nom,)).empty
+
+    def transactions_par_profil(self):
+        """Lu dans les agrégats de rollups.py s'ils existent (quelques centaines de lignes quel que soit le nombre de deals)."""
+        if not self.table_existe('Deals_Rollup'):
+            return super().transactions_par_profil()
+        from rollups import transactions_par_profil
+        conn = sqlite3.connect(self.db_path, timeout=self.timeout)
+        df = transactions_par_profil(conn)
+        conn.close()
+        return df
+
+    def repartition_secteurs(self):
+        """Lue dans les agrégats de rollups.py s'ils existent."""
+        if not self.table_existe('Deals_Rollup'):
+            return super().repartition_secteurs()
+        from rollups import repartition_secteurs
+        conn = sqlite3.connect(self.db_path, timeout=self.timeout)
+        df = repartition_secteurs(conn)
+        conn.close()
+        return df
+
+    def executer(self, sql, params=()):
+        conn = sqlite3.connect(self.db_path, timeout=self.timeout)
+        conn.execute(sql, params)
+        conn.commit()
+        conn.close()
+
+    def executer_plusieurs(self, sql, lignes):
+        conn = sqlite3.connect(self.db_path, timeout=self.timeout)
+        conn.executemany(sql, lignes)
+        conn.commit()
+        conn.close()
+
+
+class StockageDuckDB(Stockage):
+    """
+    Stockage en colonnes dans un fichier DuckDB (dépendance optionnelle : pip install duckdb).
+    creer_schema crée les tables analytiques, copier_depuis les alimente à partir d'un autre stockage.
+    """
+
+    def __init__(self, chemin="fund_database.duckdb"):
+        import duckdb
+        self.chemin = chemin
+        self.conn = duckdb.connect(chemin)
+
+    def requete(self, sql, params=()):
+        return self.conn.execute(sql, list(params)).df()
+
+    def requete_par_lots(self, sql, params=(), taille=100_000):
+        # DuckDB rend les résultats par vecteurs de 2048 lignes
+        resultat = self.conn.execute(sql, list(params))
+        while True:
+            lot = resultat.fetch_df_chunk(max(1, taille // 2048))
+            if lot.empty:
+                return
+            yield lot
+
+    def executer(self, sql, params=()):
+        self.conn.execute(sql, list(params))
+
+    @contextmanager
+    def transaction(self):
+        self.conn.begin()
+        try:
+            yield self.conn
+            self.conn.commit()
+        except BaseException:
+            self.conn.rollback()
+            raise
+
+    def executer_plusieurs(self, sql, lignes):
+        lignes = [list(ligne) for ligne in lignes]
+        if lignes:
+            self.conn.begin()
+            self.conn.executemany(sql, lignes)
+            self.conn.commit()
+
+    def table_existe(self, nom):
+        return not self.requete(
+            "SELECT table_name FROM information_schema.tables WHERE lower(table_name) = lower(?)", (nom,)
+        ).empty
+
+    def fermer(self):
+        self.conn.close()
+
+    def creer_schema(self):
+        """Crée les tables analytiques (mêmes colonnes que dans SQLite, identifiants par séquences)."""
+        self.conn.execute("CREATE SEQUENCE IF NOT EXISTS seq_products")
+        self.conn.execute("CREATE SEQUENCE IF NOT EXISTS seq_returns")
+        self.conn.execute("CREATE SEQUENCE IF NOT EXISTS seq_deals")
+        self.conn.execute("CREATE SEQUENCE IF NOT EXISTS seq_holdings")
+        self.conn.execute("""
+        CREATE TABLE IF NOT EXISTS Products (
+            id_product INTEGER DEFAULT nextval('seq_products'),
+            ticker VARCHAR NOT NULL UNIQUE,
+            category VARCHAR NOT NULL,
+            secteur VARCHAR NOT NULL
+        )""")
+        self.conn.execute("""
+        CREATE TABLE IF NOT EXISTS Returns (
+            id_returns BIGINT DEFAULT nextval('seq_returns'),
+            ticker VARCHAR NOT NULL,
+            date DATE NOT NULL,
+            "return" DOUBLE,
+            price DOUBLE,
+            secteur VARCHAR NOT NULL
+        )""")
+        self.conn.execute("""
+        CREATE TABLE IF NOT EXISTS Deals (
+            deal_id BIGINT DEFAULT nextval('seq_deals'),
+            date DATE NOT NULL,
+            id_portfolio INTEGER NOT NULL,
+            risk_profile VARCHAR NOT NULL,
+            action VARCHAR NOT NULL,
+            asset VARCHAR NOT NULL,
+            quantity DOUBLE NOT NULL CHECK (quantity >= 0),
+            secteur VARCHAR
+        )""")
+        self.conn.execute("""
+        CREATE TABLE IF NOT EXISTS Portfolio_Holdings (
+            id_holding BIGINT DEFAULT nextval('seq_holdings'),
+            date DATE NOT NULL,
+            id_portfolio INTEGER NOT NULL,
+            ticker VARCHAR NOT NULL,
+            weight DOUBLE
+        )""")
+        self.conn.execute("""
+        CREATE TABLE IF NOT EXISTS Holdings_History (
+            id_portfolio INTEGER NOT NULL,
+            ticker VARCHAR NOT NULL,
+            weight DOUBLE,
+            valid_from VARCHAR NOT NULL,
+            valid_to VARCHAR
+        )""")
+
+    def copier_depuis(self, source, tables=TABLES_ANALYTIQUES):
+        """Remplace le contenu des tables analytiques par celui d'un autre stockage (en bloc, sans boucle ligne à ligne)."""
+        self.creer_schema()
+        colonnes = {
+            'Products': ['ticker', 'category', 'secteur'],
+            'Returns': ['ticker', 'date', 'return', 'price', 'secteur'],
+            'Deals': ['date', 'id_portfolio', 'risk_profile', 'action', 'asset', 'quantity', 'secteur'],
+            'Portfolio_Holdings': ['date', 'id_portfolio', 'ticker', 'weight'],
+            'Holdings_History': ['id_portfolio', 'ticker', 'weight', 'valid_from', 'valid_to'],
+        }
+        for table in tables:
+            df = source.lire_table(table)[colonnes[table]]
+            if 'date' in df.columns:
+                df['date'] = pd.to_datetime(df['date']).dt.date
+            liste = ", ".join(f'"{c}"' for c in colonnes[table])
+            self.conn.execute(f"DELETE FROM {table}")
+            self.conn.register('source_df', df)
+            self.conn.execute(f"INSERT INTO {table} ({liste}) SELECT {liste} FROM source_df")
+            self.conn.unregister('source_df')
+
+
+def ouvrir_stockage(chemin="fund_database.db"):
+    """Ouvre le stockage correspondant à l'extension du fichier (.duckdb pour DuckDB, SQLite sinon)."""
+    if str(chemin).endswith(".duckdb"):
+        return StockageDuckDB(chemin)
+    return StockageSQLite(chemin)
+
+
+# %% Comparaison des deux moteurs
+def benchmark_stockages(db_path="fund_database.db", duckdb_path="fund_database.duckdb", repetitions=3):
+    """
+    Copie les tables analytiques de la base SQLite dans DuckDB puis mesure, pour chaque moteur, le
+    meilleur temps sur repetitions exécutions des lectures typiques du projet. Vérifie au passage
+    que les deux moteurs renvoient les mêmes résultats. Retourne un DataFrame des temps (secondes).
+    """
+    sqlite_ = StockageSQLite(db_path)
+    duck = StockageDuckDB(duckdb_path)
+    duck.copier_depuis(sqlite_)
+
+    lectures = {
+        'Returns complète': lambda s: s.lire_returns(),
+        'Returns actions': lambda s: s.lire_returns(categorie='Action'),
+        'Dates de trading': lambda s: s.dates_trading(),
+        'Rendements pondérés': lambda s: s.rendements_ponderes(),
+        'Transactions par profil': lambda s: s.transactions_par_profil(),
+        'Répartition sectorielle': lambda s: s.repartition_secteurs(),
+    }
+    temps = {}
+    for nom, lecture in lectures.items():
+        resultats = {}
+        for moteur, stockage in [('SQLite', sqlite_), ('DuckDB', duck)]:
+            meilleur = float('inf')
+            for _ in range(repetitions):
+                debut = time.perf_counter()
+                resultats[moteur] = lecture(stockage)
+                meilleur = min(meilleur, time.perf_counter() - debut)
+            temps.setdefault(moteur, {})[nom] = meilleur
+        _verifier_identiques(nom, resultats['SQLite'], resultats['DuckDB'])
+
+    duck.fermer()
+    df_temps = pd.DataFrame(temps)
+    df_temps['Accélération'] = (df_temps['SQLite'] / df_temps['DuckDB']).round(1)
+    print(df_temps)
+    return df_temps
+
+
+def _verifier_identiques(nom, a, b):
+    if isinstance(a, pd.Series):
+        a, b = a.to_frame(), b.to_frame()
+    a = a.reset_index(drop=a.index.name is None)
+    b = b.reset_index(drop=b.index.name is None)
+    a = a.sort_values(list(a.columns)).reset_index(drop=True)
+    b = b.sort_values(list(b.columns)).reset_index(drop=True)
+    pd.testing.assert_frame_equal(a, b, check_dtype=False, check_exact=False, check_datetimelike_compat=True)
+    print(f"{nom} : résultats identiques")
@@ -1,5 +1,9 @@
 import pandas as pd
 import sqlite3
+from calendrier import CalendrierTrading
+from stockage import StockageSQLite
+from checkpoints import creer_table_checkpoints, sauver_checkpoint, dernier_checkpoint
+from frequence import Frequence
 
 """ Nous avons un problème sur ce fichier, pourtant nous utilisons le même insert deals que dans 
 la stratégie low turnover qui fonctionne... 
@@ -20,29 +24,18 @@ def chk_conn(conn):
 """ Pour récupérer la data nous faisons un Inner Join afin d'utiliser la condition Catégorie = Action
 pour extraire les données dont nous avons besoin """
 
-def load_data_equity_only(db_path):
-    conn = sqlite3.connect(db_path)
-    query = """
-    SELECT r.*, p.category 
-    FROM Returns r
-    INNER JOIN Products p ON r.ticker = p.ticker
-    WHERE p.category = 'Action'
-    """
-    df = pd.read_sql_query(query, conn, parse_dates=['date'], index_col='date')
-    print(chk_conn(conn))
-    conn.close()
-    print(chk_conn(conn))
+def load_data_equity_only(db_path, stockage=None):
+    stockage = stockage or StockageSQLite(db_path)
+    df = stockage.lire_returns(categorie='Action')
     df.rename(columns={'price': 'Close'}, inplace=True)
     df.sort_index(inplace=True)
     tickers = df['ticker'].unique()
     
     return df, tickers
 
-data_equity_only, tickers = load_data_equity_only(db_path="fund_database.db")
-
 """Voici la fonction qui pose problème dans cette stratégie mais pas dans low turnover"""
 
-def insert_deals(conn, date, action, asset, quantity, secteur):
+def insert_deals(conn, date, action, asset, quantity, secteur, journal=None):
     cursor = conn.cursor()
     date_str = date.strftime('%Y-%m-%d')
 
@@ -59,6 +52,8 @@ def insert_deals(conn, date, action, asset, quantity, secteur):
     print(f"Transaction insérée : {action} le {date_str} pour {asset} dans le secteur {secteur}")
     conn.commit()
     conn.close()
+    if journal is not None:
+        journal.ajouter([(date_str, id_portfolio, risk_profile, action, asset, quantity, secteur)])
 
 
 def strategy_equity_only(data_equity_only, tickers, db_path, date):
@@ -90,5 +85,87 @@ def strategy_equity_only(data_equity_only, tickers, db_path, date):
         print(chk_conn(conn))
 
 
-date_test = pd.to_datetime('2023-01-09')
-test = strategy_equity_only(data_equity_only, tickers, "fund_database.db", date_test)
+""" Version vectorisée : plutôt que de recalculer les moyennes mobiles de chaque ticker à chaque lundi,
+on calcule une seule fois la matrice date x ticker du croisement SMA 10j / SMA 30j sur tout l'historique,
+puis on lit pour chaque lundi la dernière ligne strictement antérieure (comme data.index < date) """
+
+def matrice_croisement_sma(data_equity_only, tickers, court=10, long=30):
+    """ Retourne un DataFrame date x ticker valant 1 si SMA court > SMA long (achat), 0 sinon (vente)
+    et NaN tant que le ticker n'a pas encore de cotation. Les moyennes mobiles sont calculées sur les
+    lignes de chaque ticker, puis la dernière valeur connue est propagée aux dates où il ne cote pas """
+    close = data_equity_only.groupby('ticker', sort=False)['Close']
+    sma_court = close.rolling(window=court).mean()
+    sma_long = close.rolling(window=long).mean()
+    croisement = (sma_court > sma_long).astype(float).unstack(level=0)
+    return croisement.sort_index().ffill().reindex(columns=tickers)
+
+
+def insert_deals_bulk(db_path, deals, checkpoint=None, journal=None, stockage=None):
+    """ Insère toutes les transactions en une seule écriture (une transaction du stockage, StockageSQLite(db_path)
+    par défaut). checkpoint = (strategie, date, etat) enregistre le point de reprise dans la même transaction.
+    journal (voir journal_deals.py) reçoit aussi le lot une fois la transaction validée """
+    lot = [(
+            """ 
+            INSERT INTO Deals (date, id_portfolio, risk_profile, action, asset, quantity, secteur)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            """,
+            deals
+        )]
+    if checkpoint is not None:
+        lot.append(lambda conn: (creer_table_checkpoints(conn), sauver_checkpoint(conn, *checkpoint)))
+    (stockage or StockageSQLite(db_path)).ecrire_lot(lot)
+    if journal is not None:
+        journal.ajouter(deals)
+
+
+def backtest_equity_only(data_equity_only, tickers, db_path, dates, reprendre=True, court=10, long=30, journal=None,
+                         stockage=None):
+    """ Calcule les décisions d'achat / vente de tous les lundis à partir de la matrice de croisement
+    et les écrit en une seule fois dans la table Deals. La stratégie n'a pas d'autre état que la
+    dernière date traitée : avec reprendre=True, les dates déjà validées sont ignorées.
+    court et long sont les longueurs des moyennes mobiles en nombre de barres.
+    journal (voir journal_deals.py) reçoit les transactions une fois validées en base.
+    stockage (voir stockage.py) est la base où elles sont écrites, StockageSQLite(db_path) par défaut.
+    Retourne la liste des transactions """
+    dates = pd.DatetimeIndex(dates)
+    derniere, _ = dernier_checkpoint(db_path, "Equity Only") if reprendre else (None, None)
+    if derniere is not None:
+        dates = dates[dates > pd.Timestamp(derniere)]
+    if len(dates) == 0:
+        return []
+    derniere = dates[-1]
+    matrice = matrice_croisement_sma(data_equity_only, tickers, court, long)
+    """ Position de la dernière ligne strictement antérieure à chaque date de rebalancement """
+    positions = matrice.index.searchsorted(pd.DatetimeIndex(dates), side='left') - 1
+    dates = pd.DatetimeIndex(dates)[positions >= 0]
+    decisions = matrice.values[positions[positions >= 0]]
+    secteurs = data_equity_only.groupby('ticker')['secteur'].last().reindex(tickers).astype(str).values
+
+    i_dates, i_tickers = (~pd.isna(decisions)).nonzero()
+    dates_str = dates.strftime('%Y-%m-%d')
+    deals = [
+        (dates_str[i], 3, "High Yield Only", 'buy' if decisions[i, j] > 0 else 'sell', tickers[j], 1, secteurs[j])
+        for i, j in zip(i_dates, i_tickers)
+    ]
+    insert_deals_bulk(db_path, deals, checkpoint=("Equity Only", derniere, {'date': str(derniere.date())}), journal=journal,
+                      stockage=stockage)
+    print(f"{len(deals)} transactions insérées pour {len(dates)} dates")
+    return deals
+
+
+def run_equity_only(db_path="fund_database.db", debut='2023-01-02', fin='2024-12-31', frequence='1d', journal=None,
+                    stockage=None):
+    """ Lance la stratégie chaque lundi de la période (reporté au jour de trading suivant s'il est férié),
+    les jours de trading sont ceux du calendrier partagé construit sur la table Returns. Les moyennes
+    mobiles 10 et 30 jours sont converties en nombre de barres de la fréquence des données """
+    f = Frequence(frequence)
+    data_equity_only, tickers = load_data_equity_only(db_path, stockage)
+    calendrier = CalendrierTrading.depuis_base(db_path, stockage)
+    return backtest_equity_only(data_equity_only, tickers, db_path, calendrier.rebalancements(debut, fin),
+                                court=f.barres(10), long=f.barres(30), journal=journal, stockage=stockage)
+
+
+if __name__ == "__main__":
+    data_equity_only, tickers = load_data_equity_only(db_path="fund_database.db")
+    date_test = pd.to_datetime('2023-01-09')
+    test = strategy_equity_only(data_equity_only, tickers, "fund_database.db", date_test)
@@ -0,0 +1,175 @@
+import os
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestClassifier
+from calendrier import CalendrierTrading
+from strategie_equity_only import load_data_equity_only, insert_deals_bulk
+
+"""
+Stratégie High Yield Equity Only par Random Forest, en walk-forward.
+
+Le modèle prédit si une action monte le jour suivant à partir de rendements retardés, de la distance
+aux moyennes mobiles, de la volatilité et du volume. Les variables sont calculées une seule fois
+pour tout l'historique et gardées dans un fichier cache (feature store). Le modèle est ré-entraîné
+toutes les quelques semaines uniquement sur les données connues à la date de décision, en ajoutant
+des arbres au modèle existant (warm_start) plutôt qu'en repartant de zéro, et en utilisant tous
+les coeurs (n_jobs=-1). Chaque lundi, toutes les actions sont notées en un seul predict_proba.
+"""
+
+# Portefeuille de la stratégie (créé par pf() dans database_loader.py), distinct du portefeuille 3 de la stratégie SMA
+ID_PORTFOLIO = 4
+
+VARIABLES = ['ret_1', 'ret_2', 'ret_5', 'ret_20', 'dist_sma_10', 'dist_sma_30', 'vol_20', 'volume_rel']
+
+
+# %% Feature store
+def construire_features(data_equity_only, cache="features_high_yield.pkl"):
+    """
+    Calcule les variables explicatives et la cible (hausse le jour de cotation suivant) pour chaque
+    couple (date, ticker), en un seul passage vectorisé par ticker.
+
+    Si le fichier cache existe et correspond aux mêmes données (nombre de lignes, de tickers et
+    dernière date), il est relu au lieu d'être recalculé. cache=None désactive le cache.
+    """
+    signature = (len(data_equity_only), data_equity_only['ticker'].nunique(), str(data_equity_only.index.max()))
+    if cache is not None and os.path.exists(cache):
+        features = pd.read_pickle(cache)
+        if features.attrs.get('signature') == signature:
+            return features
+
+    df = data_equity_only[['ticker', 'Close', 'return']].copy()
+    if 'Volume' in data_equity_only.columns:
+        df['Volume'] = data_equity_only['Volume']
+    df.index.name = 'date'
+    par_ticker = df.groupby('ticker', sort=False)
+    close = par_ticker['Close']
+    rendements = par_ticker['return']
+
+    df['ret_1'] = df['return']
+    df['ret_2'] = rendements.shift(1)
+    df['ret_5'] = close.pct_change(5)
+    df['ret_20'] = close.pct_change(20)
+    df['dist_sma_10'] = df['Close'] / close.transform(lambda s: s.rolling(10).mean()) - 1
+    df['dist_sma_30'] = df['Close'] / close.transform(lambda s: s.rolling(30).mean()) - 1
+    df['vol_20'] = rendements.transform(lambda s: s.rolling(20).std())
+    if 'Volume' in df.columns:
+        df['volume_rel'] = df['Volume'] / par_ticker['Volume'].transform(lambda s: s.rolling(20).mean()) - 1
+    else:
+        # La table Returns ne stocke pas le volume, la variable est alors neutre
+        df['volume_rel'] = 0.0
+
+    # Cible : hausse du rendement du jour de cotation suivant, et date à laquelle elle est connue
+    df['date_cible'] = df.index.to_series().groupby(df['ticker'].values).shift(-1).values
+    df['cible'] = (rendements.shift(-1) > 0).astype(np.int8)
+
+    features = df.reset_index()[['date', 'ticker', 'date_cible', 'cible'] + VARIABLES]
+    features[VARIABLES] = features[VARIABLES].astype(np.float32)
+    features = features.dropna(subset=VARIABLES).sort_values('date', kind='stable').reset_index(drop=True)
+    features.attrs['signature'] = signature
+    if cache is not None:
+        features.to_pickle(cache)
+    return features
+
+
+# %% Moteur walk-forward
+class PredicteurHighYield:
+    """
+    Paramètres
+    ----------
+    frequence_reentrainement : int
+        Nombre de dates de rebalancement entre deux ré-entraînements.
+    arbres_par_reentrainement : int
+        Nombre d'arbres ajoutés au modèle à chaque ré-entraînement (warm_start).
+    max_arbres : int
+        Au-delà, le modèle est reconstruit de zéro pour ne pas garder indéfiniment les arbres anciens.
+    """
+
+    def __init__(self, frequence_reentrainement=4, arbres_par_reentrainement=50, max_arbres=400,
+                 profondeur=6, n_jobs=-1, random_state=42):
+        self.frequence_reentrainement = frequence_reentrainement
+        self.arbres_par_reentrainement = arbres_par_reentrainement
+        self.max_arbres = max_arbres
+        self.profondeur = profondeur
+        self.n_jobs = n_jobs
+        self.random_state = random_state
+        self.modele = None
+
+    def _nouveau_modele(self):
+        return RandomForestClassifier(n_estimators=0, max_depth=self.profondeur, min_samples_leaf=50,
+                                      warm_start=True, n_jobs=self.n_jobs, random_state=self.random_state)
+
+    def entrainer(self, features, date):
+        """Ajoute des arbres entraînés sur toutes les observations dont la cible est connue avant date."""
+        connues = features['date_cible'].values < np.datetime64(pd.Timestamp(date))
+        if not connues.any():
+            return
+        if self.modele is None or self.modele.n_estimators + self.arbres_par_reentrainement > self.max_arbres:
+            self.modele = self._nouveau_modele()
+        self.modele.n_estimators += self.arbres_par_reentrainement
+        self.modele.fit(features.loc[connues, VARIABLES].values, features.loc[connues, 'cible'].values)
+
+    def predire(self, features, dates):
+        """
+        Probabilité de hausse de chaque action à chaque date de rebalancement, calculée sur la
+        dernière observation strictement antérieure à la date. Retourne un DataFrame date x ticker.
+        """
+        probas = {}
+        dates_features = features['date'].values
+        for k, date in enumerate(pd.DatetimeIndex(dates)):
+            if k % self.frequence_reentrainement == 0:
+                self.entrainer(features, date)
+            if self.modele is None:
+                continue
+            # Dernière ligne de chaque ticker avant la date (les features sont triées par date)
+            fin = np.searchsorted(dates_features, np.datetime64(date), side='left')
+            dernieres = features.iloc[:fin].groupby('ticker', sort=False).tail(1)
+            dernieres = dernieres[dernieres['date'] >= date - pd.Timedelta(days=10)]
+            if dernieres.empty:
+                continue
+            proba = self.modele.predict_proba(dernieres[VARIABLES].values)
+            colonne = list(self.modele.classes_).index(1) if 1 in self.modele.classes_ else None
+            probas[date] = pd.Series(proba[:, colonne] if colonne is not None else 0.0,
+                                     index=dernieres['ticker'].values)
+        return pd.DataFrame(probas).T
+
+
+# %% Stratégie
+def strategie_high_yield_rf(db_path="fund_database.db", debut='2023-01-02', fin='2024-12-31', top_k=10,
+                            seuil=0.5, cache="features_high_yield.pkl", predicteur=None, id_portfolio=ID_PORTFOLIO,
+                            journal=None, stockage=None):
+    """
+    Chaque lundi, investit à parts égales dans les top_k actions dont la probabilité de hausse dépasse
+    seuil, et écrit en une seule fois les transactions de tout le backtest dans la table Deals
+    (portefeuille id_portfolio, 4 par défaut, quantité en % du portefeuille), et dans journal
+    (voir journal_deals.py) s'il est fourni. Les données sont lues et les transactions écrites dans stockage
+    (voir stockage.py), StockageSQLite(db_path) par défaut.
+
+    Retourne
+    --------
+    poids : pandas.DataFrame
+        Poids cibles date x ticker.
+    deals : list
+        Transactions insérées.
+    """
+    data_equity_only, tickers = load_data_equity_only(db_path, stockage)
+    dates = CalendrierTrading.depuis_base(db_path, stockage).rebalancements(debut, fin)
+    features = construire_features(data_equity_only, cache=cache)
+    predicteur = predicteur or PredicteurHighYield()
+    probas = predicteur.predire(features, dates).reindex(columns=tickers)
+
+    # Sélection des top_k meilleures probabilités au-dessus du seuil, à parts égales
+    rangs = probas.where(probas > seuil).rank(axis=1, ascending=False, method='first')
+    selection = rangs <= top_k
+    poids = selection.div(selection.sum(axis=1).replace(0, np.nan), axis=0).fillna(0.0)
+
+    secteurs = data_equity_only.groupby('ticker')['secteur'].last()
+    variations = poids.diff().fillna(poids)
+    deals = []
+    for date, ligne in variations.iterrows():
+        date_str = date.strftime('%Y-%m-%d')
+        for tic, diff in ligne[ligne.abs() > 1e-9].items():
+            deals.append((date_str, id_portfolio, "High Yield Equity Only", 'buy' if diff > 0 else 'sell',
+                          tic, abs(diff) * 100, str(secteurs.get(tic, "Non disponible"))))
+    insert_deals_bulk(db_path, deals, journal=journal, stockage=stockage)
+    print(f"{len(deals)} transactions insérées pour {len(poids)} dates")
+    return poids, deals
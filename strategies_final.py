@@ -1,7 +1,12 @@
-import sqlite3
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
+from calendrier import CalendrierTrading
+from stockage import StockageSQLite
+from checkpoints import creer_table_checkpoints, sauver_checkpoint, dernier_checkpoint
+from ecrivain import EcrivainBase
+from frequence import Frequence
+from classement import Classement
 
 """
 Notre stratégie Low TurnOver consiste à déterminer si l'on investit, achat ou vente, 
@@ -18,28 +23,47 @@ minimiser ce risque au vu de la faible capacité de changement de positions.
 
 
 
+REQUETE_DEAL = """
+    INSERT INTO Deals (date, id_portfolio, risk_profile, action, asset, quantity, secteur)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+"""
+
+
 class Strategie_2_Low_Turnover:
+
+    nom = "Low Turnover"
     
-    def __init__(self, db_path = "fund_database.db"):
+    def __init__(self, db_path = "fund_database.db", stockage = None, conformite = None, frequence = '1d', journal = None):
+        """ frequence : fréquence des barres de la table Returns ('1d', '1h', '1min'... voir frequence.py),
+        les fenêtres de 30 et 252 jours du score sont converties en nombre de barres.
+        journal : JournalDeals (voir journal_deals.py) qui reçoit les deals une fois validés en base """
         self.db_path = db_path
+        self.frequence = Frequence(frequence)
+        self.stockage = stockage or StockageSQLite(db_path)
+        self.conformite = conformite
+        self.journal = journal
+        self.en_cours = False
+        self.ecrivain = None
+        self.lot = []
+        self.deals_date = []
         self.data = None
         self.tickers = None
         self.trading_days = None
+        self.calendrier = None
         self.deals = []
         self.turnover_month = 0
-        self.ranked_scores = None
-        self.best_scores_prev_month = None
+        self.classement = None
         self.date_t = None
         self.date_fin = None
         self.last_date_used = None
+        self.reprise = False
 
     def load_data(self):
         """
-        load_data permet de récupérer la donnée de la base SQL qui se trouve dans la table Returns
+        load_data permet de récupérer la donnée de la table Returns via la couche de stockage
+        (SQLite par défaut, voir stockage.py)
         """
-        conn = sqlite3.connect(self.db_path)
-        df = pd.read_sql_query("SELECT * FROM Returns", conn, parse_dates=['date'], index_col='date')
-        conn.close()
+        df = self.stockage.lire_returns()
         """
         Nous renommons la colonne price de SQL car depuis la donnée originale nous avions Close, cela
         permet d'éviter des confusions
@@ -49,11 +73,17 @@ class Strategie_2_Low_Turnover:
         self.data = df
         self.tickers = self.data['ticker'].unique()
         """
-        Nous allons récupérer les jours de trading afin de tester si la date se trouve dans nos données
-        ou s'il s'agit d'un jour férié par exemple et donc qu'il n'y ait pas de trading ce jour là
+        Les scores de chaque date sont notés dans un classement réutilisé d'une date à l'autre (voir classement.py),
+        qui garde aussi le seuil du mois (moyenne des trois meilleurs scores)
         """
-        self.trading_days = self.data[self.data['ticker'] == self.tickers[0]].index
-        self.date_t = self.trading_days[self.trading_days == '2023-01-09'][0]
+        self.classement = Classement(self.tickers, k=3)
+        """
+        Nous allons récupérer les jours de trading (union des dates de tous les tickers) dans le calendrier
+        partagé, qui permet de reporter au jour suivant les lundis fériés
+        """
+        self.calendrier = CalendrierTrading.depuis_donnees(self.data)
+        self.trading_days = self.calendrier.dates
+        self.date_t = self.calendrier.prochain('2023-01-09')
         self.date_fin = self.trading_days[-1]
         """
         Nous allons également définir last_date_used qui sert à garder la dernière utilisée, que l'on 
@@ -68,36 +98,29 @@ class Strategie_2_Low_Turnover:
         nous avons besoin d'initialiser les scores afin de pouvoir comparer avec la première date
         """
 
-        t_dec22 = self.trading_days[self.trading_days == '2022-12-19'][0]
-        scores22 = pd.DataFrame(index=[t_dec22], columns=self.tickers)
+        t_dec22 = self.calendrier.prochain('2022-12-19')
         data_dec22 = self.data[self.data.index < t_dec22]
-        for tic in self.tickers:
+        self.classement.effacer()
+        for i, tic in enumerate(self.tickers):
             tic_data = data_dec22[data_dec22['ticker'] == tic]
-            scores22.loc[t_dec22, tic] = self.generate_score(tic_data)
-        scores_only22 = scores22.applymap(lambda x: x[0] if isinstance(x, tuple) else x)
+            self.classement.noter(i, *self.generate_score(tic_data))
 
         """
         On classe les scores et on garde les 3 meilleurs en calculant leur moyenne 
         """
-        ranked_scores_dec22 = (
-            scores_only22.loc[t_dec22]
-            .reset_index()
-            .rename(columns={'index': 'ticker', t_dec22: 'Score'})
-        )
-        ranked_scores_dec22['Score'] = pd.to_numeric(ranked_scores_dec22['Score'], errors='coerce')
-        ranked_scores_dec22 = ranked_scores_dec22.sort_values(by='Score', ascending=False).dropna(subset=['Score'])
-        self.best_scores_prev_month = ranked_scores_dec22['Score'].head(3).mean()
+        self.classement.classer()
+        self.classement.nouveau_mois()
 
     def generate_score(self, data):
         """
         Voici la fonction qui calcule les scores, on commence par copier la data afin d'éviter un FutureWarning
         """
         df = data.copy()
-        """ On calcule la moyenne mobile 30 jours"""
-        df['SMA_30'] = df['Close'].rolling(window=30).mean()
+        """ On calcule la moyenne mobile 30 jours (en nombre de barres de la fréquence des données)"""
+        df['SMA_30'] = df['Close'].rolling(window=self.frequence.barres(30)).mean()
         """ On calcule la distance comme indiqué au début de la classe"""
         distance_close_sma = (df['Close'] - df['SMA_30']) / df['SMA_30']
-        df['vol'] = df['Close'].rolling(window=252).std()
+        df['vol'] = df['Close'].rolling(window=self.frequence.barres(252)).std()
         average_daily_volatility = df['vol'].mean()
         dist_temp = distance_close_sma.dropna()
         if dist_temp.empty:
@@ -121,96 +144,184 @@ class Strategie_2_Low_Turnover:
 
     def insert_deal(self, date, id_portfolio, risk_profile, action, asset, quantity, secteur):
         """
-        Insert deals comme son nom l'indique permet d'insérer les deals dans la table SQL 
+        Insert deals comme son nom l'indique permet d'insérer les deals dans la table SQL.
+        Pendant run_strategy, le deal est ajouté au lot de la date, écrit par le stockage et validé avec
+        le point de reprise de la date (voir checkpoint), sinon il est écrit immédiatement par le stockage.
+        En mode asynchrone, le lot de la date est écrit par le thread d'écriture.
+        Si un moteur de conformité est fourni (voir conformite.py), l'ordre est d'abord contrôlé.
+        Les deals sont ajoutés au journal après leur validation en base
         """
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        if self.conformite is not None:
+            ordre = {'date': date, 'id_portfolio': id_portfolio, 'action': action, 'asset': asset, 'quantity': quantity}
+            acceptes, rejetes = self.conformite.verifier([ordre])
+            if rejetes:
+                print(f"Ordre rejeté : {action} {asset} ({rejetes[0][1]})")
+                return False
+            quantity = acceptes[0]['quantity']
+        deal = (date, id_portfolio, risk_profile, action, asset, quantity, secteur)
+        self.deals_date.append(deal)
+        if self.en_cours:
+            self.lot.append((REQUETE_DEAL, [deal]))
+            return True
+        self.stockage.ecrire_deals([deal])
+        self.journaliser()
+        return True
+
+    def journaliser(self):
+        """ Ajoute au journal les deals validés en base depuis le dernier appel """
+        deals, self.deals_date = self.deals_date, []
+        if self.journal is not None and deals:
+            self.journal.ajouter(deals)
 
-        existing_quantity = cursor.fetchone()[0]  
-        new_quantity = quantity if existing_quantity is None else existing_quantity + quantity
+    def etat(self):
+        """ État de la stratégie nécessaire pour reprendre le backtest, sérialisable en JSON. La liste des
+        deals n'en fait pas partie (sa taille croît à chaque date) : elle est relue dans la table Deals à la reprise """
+        return {
+            'date_t': str(self.date_t.date()),
+            'last_date_used': str(pd.Timestamp(self.last_date_used).date()),
+            'turnover_month': self.turnover_month,
+            'best_scores_prev_month': None if pd.isna(self.classement.seuil) else float(self.classement.seuil),
+            'meilleurs_scores': [float(s) for s in self.classement.meilleurs_scores],
+        }
 
-        cursor.execute(
-            """ 
-            INSERT INTO Deals (date, id_portfolio, risk_profile, action, asset, quantity, secteur)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-            """,
-            (date, id_portfolio, risk_profile, action, asset, new_quantity, secteur)
+    def restaurer_etat(self, etat):
+        self.date_t = pd.Timestamp(etat['date_t'])
+        self.last_date_used = pd.Timestamp(etat['last_date_used'])
+        self.turnover_month = etat['turnover_month']
+        self.classement.seuil = np.nan if etat['best_scores_prev_month'] is None else etat['best_scores_prev_month']
+        if 'meilleurs_scores' in etat:
+            meilleurs = etat['meilleurs_scores']
+        else:
+            """ Points de reprise antérieurs au classement : classement complet de la dernière date """
+            classes = pd.DataFrame(etat['ranked_scores'] or [], columns=['ticker', 'Score', 'Direction'])
+            meilleurs = classes['Score'].astype(float).nlargest(3).tolist()
+        self.classement.meilleurs_scores = np.asarray(meilleurs, dtype=float)
+        if 'deals' in etat:
+            self.deals = list(etat['deals'])
+        else:
+            self.deals = self.deals_valides(self.date_t)
+
+    def deals_valides(self, date):
+        """ Deals de la stratégie validés en base jusqu'à date incluse, au format de self.deals """
+        df = self.stockage.requete(
+            "SELECT action, asset, date FROM Deals WHERE id_portfolio = 2 AND risk_profile = ? AND date <= ? ORDER BY deal_id",
+            (self.nom, str(pd.Timestamp(date).date()))
         )
+        return [f"{a} {t} on {str(d)[:10]}" for a, t, d in df.itertuples(index=False)]
 
-        conn.commit()
-        conn.close()
+    def checkpoint(self):
+        """ Enregistre l'état après la date courante et valide dans la même transaction les deals de la date
+        (lot écrit par stockage.ecrire_lot).
+        En mode asynchrone, le lot de la date et le point de reprise sont confiés au thread d'écriture
+        et le calcul de la date suivante commence sans attendre l'écriture """
+        date_t, etat = self.date_t, self.etat()
+        lot, self.lot = self.lot + [lambda conn: sauver_checkpoint(conn, self.nom, date_t, etat)], []
+        if self.ecrivain is not None:
+            deals, self.deals_date = self.deals_date, []
+            apres = (lambda: self.journal.ajouter(deals)) if self.journal is not None and deals else None
+            self.ecrivain.soumettre(lot, apres)
+            return
+        self.stockage.ecrire_lot(lot)
+        self.journaliser()
 
-    def strategy_low_turnover(self, ranked_scores, date_str):
+    def strategy_low_turnover(self, meilleurs, date_str):
+        """ meilleurs : indices des titres dans le classement, du meilleur score au moins bon """
         trades = []
         if self.turnover_month >= 2:
             """ Si le turnover max du mois est dépassé, on s'arrête"""
             return trades
         """ On garde seulement les deux meilleurs performances en fonction du classement du score
         puisque nous ne pouvons faire maximum 2 deals, ca ne sert à rien d'en prendre davantage"""
-        best_performer = ranked_scores.iloc[0]
-        best_2_performer = ranked_scores.iloc[1] if len(ranked_scores) > 1 else None
+        scores, directions, tickers = self.classement.scores, self.classement.directions, self.classement.tickers
+        seuil = self.classement.seuil
+        best_performer = meilleurs[0]
+        best_2_performer = meilleurs[1] if len(meilleurs) > 1 else None
         """ Si le score obtenu est meilleur que la moyenne des trois meilleurs du mois précédent alors
         on fait un deal et on l'insère dans la base SQL """
-        if best_performer['Score'] > self.best_scores_prev_month and self.turnover_month < 2:
-            direction = best_performer['Direction']
-            self.turnover_month += 1
+        if scores[best_performer] > seuil and self.turnover_month < 2:
+            direction = directions[best_performer]
             action = 'buy' if direction > 0 else 'sell'
-            trade = f"{action} {best_performer['ticker']} on {date_str}"
-            trades.append(trade)
-            secteur = self.data[self.data['ticker'] == best_performer['ticker']]['secteur'].iloc[-1]
-            self.insert_deal(date_str, 2, "Low Turnover", action, best_performer['ticker'], 1, secteur)
-            print(trade)
+            trade = f"{action} {tickers[best_performer]} on {date_str}"
+            secteur = self.data[self.data['ticker'] == tickers[best_performer]]['secteur'].iloc[-1]
+            """ Le turnover du mois n'est compté que si l'ordre passe le contrôle de conformité """
+            if self.insert_deal(date_str, 2, "Low Turnover", action, tickers[best_performer], 1, secteur):
+                self.turnover_month += 1
+                trades.append(trade)
+                print(trade)
             """ Si le meilleur score ne passe pas la contrainte, le second non plus donc on le mets dans la 
             condition du premier, on vérifie également qu'avec le premier deal, on ne dépasse pas le maximum de deals  """
-            if best_2_performer is not None and best_2_performer['Score'] > self.best_scores_prev_month and self.turnover_month < 2:
-                direction2 = best_2_performer['Direction']
-                self.turnover_month += 1
+            if best_2_performer is not None and scores[best_2_performer] > seuil and self.turnover_month < 2:
+                direction2 = directions[best_2_performer]
                 action2 = 'buy' if direction2 > 0 else 'sell'
-                trade2 = f"{action2} {best_2_performer['ticker']} on {date_str}"
-                trades.append(trade2)
-                secteur2 = self.data[self.data['ticker'] == best_2_performer['ticker']]['secteur'].iloc[-1]
-                self.insert_deal(date_str, 2, "Low Turnover", action2, best_2_performer['ticker'], 1, secteur2)
-                print(trade2)
+                trade2 = f"{action2} {tickers[best_2_performer]} on {date_str}"
+                secteur2 = self.data[self.data['ticker'] == tickers[best_2_performer]]['secteur'].iloc[-1]
+                if self.insert_deal(date_str, 2, "Low Turnover", action2, tickers[best_2_performer], 1, secteur2):
+                    self.turnover_month += 1
+                    trades.append(trade2)
+                    print(trade2)
         return trades
 
-    def run_strategy(self):
-        scores = pd.DataFrame(index=self.trading_days, columns=self.tickers)
-        while self.date_t <= self.date_fin:
-            """ Si le mois est différent de la date précédemment utilisée pour un deal, alors on remet 
-            le compteur du turnover à 0 et on calcule la moyenne des trois meilleurs scores. Nous prenons 
-            les 3 meilleurs car en prenant les 5 meilleurs, la condition était trop facilement vérifiée """
-            if pd.to_datetime(self.last_date_used).month != pd.to_datetime(self.date_t).month:
-                self.turnover_month = 0
-                if self.ranked_scores is not None and not self.ranked_scores.empty:
-                    self.best_scores_prev_month = self.ranked_scores['Score'].head(3).mean()
-            if self.date_t in self.trading_days:
+    def run_strategy(self, asynchrone=False):
+        """ Les dates de rebalancement (chaque lundi, reporté au jour de trading suivant s'il est férié)
+        et les changements de mois sont précalculés par le calendrier. En cas de reprise, date_t est la
+        dernière date déjà traitée et on ne garde que les dates suivantes """
+        dates = self.calendrier.rebalancements('2023-01-09', self.date_fin)
+        nouveaux_mois = self.calendrier.nouveaux_mois(dates)
+        a_traiter = dates > self.date_t if self.reprise else dates >= self.date_t
+        self.stockage.ecrire_lot([creer_table_checkpoints])
+        if asynchrone:
+            self.ecrivain = EcrivainBase(self.db_path, stockage=self.stockage)
+        self.en_cours = True
+        try:
+            for date_t, nouveau_mois in zip(dates[a_traiter], nouveaux_mois[a_traiter]):
+                self.date_t = date_t
+                """ Si le mois est différent de la date précédemment utilisée pour un deal, alors on remet 
+                le compteur du turnover à 0 et on calcule la moyenne des trois meilleurs scores. Nous prenons 
+                les 3 meilleurs car en prenant les 5 meilleurs, la condition était trop facilement vérifiée """
+                if nouveau_mois:
+                    self.turnover_month = 0
+                    self.classement.nouveau_mois()
                 data_subset = self.data[self.data.index < self.date_t]
-                """ Pour chaque ticker, on calcule le score """
-                for tic in self.tickers:
+                """ Pour chaque ticker, on calcule le score, noté directement dans le classement """
+                self.classement.effacer()
+                for i, tic in enumerate(self.tickers):
                     tic_data = data_subset[data_subset['ticker'] == tic]
-                    scores.loc[self.date_t, tic] = self.generate_score(tic_data)
-                current_scores = scores.loc[self.date_t].dropna()
-                if not current_scores.empty:
-                    df_scores = current_scores.apply(
-                        lambda x: pd.Series(x, index=['Score', 'Direction'])
-                        if isinstance(x, tuple) else pd.Series({'Score': np.nan, 'Direction': np.nan})
-                    )
-                    df_scores.dropna(inplace=True)
-                    df_scores['Score'] = pd.to_numeric(df_scores['Score'], errors='coerce')
-                    self.ranked_scores = df_scores.reset_index().rename(columns={'index': 'ticker'})
-                    self.ranked_scores = self.ranked_scores.sort_values(by='Score', ascending=False)
-                    trades = self.strategy_low_turnover(self.ranked_scores, str(self.date_t.date()))
+                    self.classement.noter(i, *self.generate_score(tic_data))
+                """ Seuls les trois meilleurs scores sont sélectionnés (sans tri complet de l'univers) """
+                meilleurs = self.classement.classer()
+                if len(meilleurs):
+                    trades = self.strategy_low_turnover(meilleurs[:2], str(self.date_t.date()))
                     self.deals.extend(trades)
-                """ Puisque nous avons fait un deal, on garde en mémoire la date """
+                """ On garde en mémoire la dernière date utilisée, puis on enregistre le point de reprise """
                 self.last_date_used = self.date_t
-            """ On passe à la semaine suivante en rajoutant 7 jours"""
-            self.date_t += pd.Timedelta(days=7)
+                self.checkpoint()
+        finally:
+            """ Les deals d'une date non terminée ne sont pas validés : ils seront recalculés à la reprise.
+            En mode asynchrone, les dates terminées déjà déposées sont écrites avant de rendre la main """
+            self.en_cours = False
+            self.deals_date = []
+            self.lot = []
+            if self.ecrivain is not None:
+                self.ecrivain.fermer()
+                self.ecrivain = None
         print("\nListe des deals :", self.deals)
         print(f"Nombre total des deals : {len(self.deals)}")
 
-    def run(self):
-        self.load_data()
-        self.prepare_previous_month_scores()
-        self.run_strategy()
-
+    def reprendre(self):
+        """ Restaure le dernier point de reprise enregistré, retourne False s'il n'y en a pas """
+        date, etat = dernier_checkpoint(self.db_path, self.nom)
+        if etat is None:
+            return False
+        self.restaurer_etat(etat)
+        print(f"Reprise de la stratégie {self.nom} après le {date}")
+        return True
 
+    def run(self, reprendre=True, asynchrone=False):
+        """ Lance le backtest, en repartant du dernier point de reprise si reprendre=True.
+        Avec asynchrone=True, les écritures en base sont faites par un thread dédié (voir ecrivain.py)
+        pendant le calcul des dates suivantes """
+        self.load_data()
+        self.reprise = reprendre and self.reprendre()
+        if not self.reprise:
+            self.prepare_previous_month_scores()
+        self.run_strategy(asynchrone)
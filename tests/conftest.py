@@ -0,0 +1,46 @@
+import os
+import shutil
+import sqlite3
+import sys
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from market_data import FournisseurSynthetique
+
+
+@pytest.fixture(scope="session")
+def _base_modele(tmp_path_factory):
+    """Base complète construite une seule fois à partir de données synthétiques (20 tickers)."""
+    from database_loader import lancement_base
+    dossier = tmp_path_factory.mktemp("base")
+    courant = os.getcwd()
+    os.chdir(dossier)
+    try:
+        lancement_base(FournisseurSynthetique(n_tickers=20))
+    finally:
+        os.chdir(courant)
+    return dossier / "fund_database.db"
+
+
+@pytest.fixture
+def base(_base_modele, tmp_path, monkeypatch):
+    """Copie de la base synthétique dans un dossier de travail (les modules utilisent fund_database.db par défaut)."""
+    shutil.copy(_base_modele, tmp_path / "fund_database.db")
+    monkeypatch.chdir(tmp_path)
+    return str(tmp_path / "fund_database.db")
+
+
+@pytest.fixture
+def base_avec_positions(base):
+    """Base synthétique avec quelques positions datées dans deux portefeuilles."""
+    conn = sqlite3.connect(base)
+    tickers = [t for (t,) in conn.execute("SELECT ticker FROM Products ORDER BY ticker LIMIT 4")]
+    conn.executemany(
+        "INSERT INTO Portfolio_Holdings (date, id_portfolio, ticker, weight) VALUES (?, ?, ?, ?)",
+        [("2023-01-09", 1, tickers[0], 0.6), ("2023-01-09", 1, tickers[1], 0.4),
+         ("2023-06-05", 1, tickers[0], 0.2), ("2023-03-06", 2, tickers[2], 1.0)]
+    )
+    conn.commit()
+    conn.close()
+    return base
@@ -0,0 +1,45 @@
+import numpy as np
+import pandas as pd
+from couts import ModeleCouts, unites_ordres, UNITES_PROFILS, rendements_nets
+
+
+def _modele():
+    dates = pd.date_range("2023-01-02", periods=5, freq="B")
+    adv = pd.DataFrame(1e8, index=dates, columns=["AAA", "BBB", "CCC"])
+    return ModeleCouts(adv, adv * 0 + 0.02)
+
+
+def test_unite_par_profil():
+    """Quantités en % pour Lowrisk, en nombre de lignes (une ligne sur les titres traités le jour) pour Low Turnover."""
+    deals = pd.DataFrame({
+        'date': ["2023-01-04"] * 4, 'id_portfolio': [1, 2, 2, 2],
+        'risk_profile': ["Lowrisk", "Low Turnover", "Low Turnover", "Low Turnover"],
+        'asset': ["AAA", "AAA", "BBB", "AAA"], 'quantity': [10.0, 1, 1, 1],
+    })
+    assert list(unites_ordres(deals, UNITES_PROFILS)) == [100, 2, 2, 2]
+    couts = _modele().couts_ordres(deals, UNITES_PROFILS)
+    # Une ligne sur deux titres traités = 50 % du portefeuille, plus cher qu'un ordre de 10 %
+    assert couts['cout'].iloc[1] > couts['cout'].iloc[0] > 0
+
+
+def test_rendements_nets():
+    brut = pd.DataFrame({'id_portfolio': [1, 1], 'date': ["2023-01-03", "2023-01-04"], 'weighted_return': [0.01, 0.02]})
+    couts = pd.DataFrame({'id_portfolio': [1, 2], 'date': ["2023-01-04", "2023-01-04"], 'cout': [0.001, 0.002]})
+    net = rendements_nets(brut, couts)
+    assert np.allclose(net['weighted_return'], [0.01, 0.019, -0.002])
+    assert list(net['id_portfolio']) == [1, 1, 2]
+
+
+def test_unite_independante_du_lot():
+    """Le coût d'un ordre Low Turnover est le même dans un lot d'une date et dans un lot de plusieurs dates."""
+    jour = pd.DataFrame({
+        'date': ["2023-01-04"] * 2, 'id_portfolio': [2, 2], 'risk_profile': ["Low Turnover"] * 2,
+        'asset': ["AAA", "BBB"], 'quantity': [1, 1],
+    })
+    autres = pd.DataFrame({
+        'date': ["2023-01-05"], 'id_portfolio': [2], 'risk_profile': ["Low Turnover"], 'asset': ["CCC"], 'quantity': [1],
+    })
+    lot = pd.concat([jour, autres], ignore_index=True)
+    assert list(unites_ordres(lot, UNITES_PROFILS)) == [2, 2, 1]
+    modele = _modele()
+    assert np.allclose(modele.couts_ordres(jour, UNITES_PROFILS)['cout'], modele.couts_ordres(lot, UNITES_PROFILS)['cout'][:2])
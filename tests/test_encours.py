@@ -0,0 +1,34 @@
+import numpy as np
+import pandas as pd
+import pytest
+from encours import EncoursFonds
+
+
+def _encours(flux):
+    rendements = pd.DataFrame({
+        'id_portfolio': [1, 1, 1, 2, 2, 2],
+        'date': ["2023-01-02", "2023-01-03", "2023-01-04"] * 2,
+        'weighted_return': [0.0, 0.10, -0.05, 0.0, 0.02, 0.01],
+    })
+    portefeuilles = pd.DataFrame({'id_portfolio': [1, 2], 'manager_id': [1, 1], 'risk_profile': ["Low Risk", "Low Turnover"]})
+    return EncoursFonds(rendements, pd.DataFrame(flux, columns=['client_id', 'id_portfolio', 'date', 'montant']), portefeuilles)
+
+
+def test_rachat_sans_parts():
+    """Un rachat dans un portefeuille jamais souscrit n'ouvre pas de position vendeuse."""
+    with pytest.raises(ValueError, match="Rachat supérieur"):
+        _encours([(1, 1, "2023-01-02", 100.0), (1, 2, "2023-01-03", -50.0)])
+
+
+def test_rachat_superieur_a_la_valeur():
+    with pytest.raises(ValueError, match="client 1, portefeuille 1"):
+        _encours([(1, 1, "2023-01-02", 100.0), (1, 1, "2023-01-03", -120.0)])
+
+
+def test_rachat_total_et_flux_du_jour():
+    """Rachat de toute la valeur (110 après +10 %) et souscription / rachat le même jour."""
+    encours = _encours([(1, 1, "2023-01-02", 100.0), (1, 1, "2023-01-03", -110.0),
+                        (2, 2, "2023-01-03", -30.0), (2, 2, "2023-01-03", 50.0)])
+    dernier = encours.dernier('client').set_index('client_id')
+    assert abs(dernier.loc[1, 'nav']) < 1e-9
+    assert np.isclose(dernier.loc[2, 'nav'], 20.0 * 1.01)
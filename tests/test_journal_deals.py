@@ -0,0 +1,53 @@
+import os
+from journal_deals import JournalDeals, MARQUEUR, _ecrire_json, _fichiers
+
+
+def _lot(jour, secteur=None):
+    return [(f"2023-01-{jour:02d}", 2, "Lowturnover", "BUY", "AAA", 1, secteur)]
+
+
+def test_secteurs_absents_puis_renseignes(tmp_path):
+    """Un lot sans aucun secteur ne doit pas empêcher la lecture ni la compaction des autres."""
+    journal = JournalDeals(str(tmp_path / "journal"))
+    journal.ajouter(_lot(2))
+    journal.ajouter(_lot(3, "Tech"))
+    journal.ajouter(_lot(4))
+    assert list(journal.scanner()['secteur']) == [None, "Tech", None]
+    assert journal.compacter(min_fichiers=2) == 1
+    df = journal.scanner(profils=["Low Turnover"])
+    assert list(df['secteur']) == [None, "Tech", None]
+    assert set(df['risk_profile']) == {"Low Turnover"}
+
+
+def test_compaction_interrompue(tmp_path):
+    """Marqueur écrit et fichier compacté publié, anciens fichiers non supprimés : aucun doublon à la lecture."""
+    journal = JournalDeals(str(tmp_path / "journal"))
+    for jour in (2, 3, 4):
+        journal.ajouter(_lot(jour))
+    partition, = journal.partitions()
+    anciens = sorted(_fichiers(partition))
+    table = journal.scanner()
+    nom, temporaire = journal._ecrire_temporaire(table, partition, "compact")
+    _ecrire_json(os.path.join(partition, nom + MARQUEUR), anciens)
+    os.replace(temporaire, os.path.join(partition, nom))
+
+    assert len(journal.scanner()) == 3
+    journal.compacter(min_fichiers=2)
+    assert sorted(_fichiers(partition)) == [nom]
+    assert not any(f.endswith(MARQUEUR) for f in os.listdir(partition))
+    assert len(journal.scanner()) == 3
+
+
+def test_compaction_annulee(tmp_path):
+    """Crash avant la publication du fichier compacté : les fichiers d'origine restent la référence."""
+    journal = JournalDeals(str(tmp_path / "journal"))
+    for jour in (2, 3):
+        journal.ajouter(_lot(jour))
+    partition, = journal.partitions()
+    nom, _ = journal._ecrire_temporaire(journal.scanner(), partition, "compact")
+    _ecrire_json(os.path.join(partition, nom + MARQUEUR), sorted(_fichiers(partition)))
+
+    assert len(journal.scanner()) == 2
+    journal.compacter(min_fichiers=10)
+    assert os.listdir(partition) and not any(f.startswith(".") or f.endswith(MARQUEUR) for f in os.listdir(partition))
+    assert len(journal.scanner()) == 2
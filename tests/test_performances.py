@@ -0,0 +1,47 @@
+import os
+from performances import rapport_performance
+
+
+def test_rapport_sans_positions(base, tmp_path):
+    dossier = str(tmp_path / "rapport")
+    df_transactions, df_metrics, df_products = rapport_performance(dossier, base, chunksize=50)
+    assert df_metrics.empty
+    assert os.path.exists(os.path.join(dossier, "rapport.html"))
+
+
+def test_rapport_avec_positions(base_avec_positions, tmp_path):
+    dossier = str(tmp_path / "rapport")
+    _, df_metrics, _ = rapport_performance(dossier, base_avec_positions, chunksize=50)
+    assert sorted(df_metrics.index) == [1, 2]
+    for nom in ("metriques.csv", "rendements_portefeuilles.csv", "performance_cumulee.png", "rapport.html"):
+        assert os.path.exists(os.path.join(dossier, nom))
+
+
+def test_rendements_a_date(base_avec_positions):
+    """Avant le 2023-06-05, le portefeuille 1 est pondéré 60 / 40 ; ensuite seule la ligne à 20 % reste modifiée."""
+    import sqlite3
+    import pandas as pd
+    from stockage import StockageSQLite
+    conn = sqlite3.connect(base_avec_positions)
+    r = pd.read_sql("SELECT ticker, SUBSTR(date, 1, 10) AS date, return FROM Returns", conn).set_index(['date', 'ticker'])['return']
+    conn.close()
+    t0, t1 = sorted(r.index.get_level_values('ticker').unique())[:2]
+    df = StockageSQLite(base_avec_positions).rendements_ponderes(historique=True)
+    pf1 = df[df['id_portfolio'] == 1].set_index('date')['weighted_return']
+    assert abs(pf1['2023-02-01'] - (0.6 * r['2023-02-01', t0] + 0.4 * r['2023-02-01', t1])) < 1e-12
+    assert abs(pf1['2023-07-03'] - (0.2 * r['2023-07-03', t0] + 0.4 * r['2023-07-03', t1])) < 1e-12
+    assert '2023-01-05' not in pf1.index
+
+
+def test_base_sans_historique(base_avec_positions, tmp_path):
+    """Une base construite avant Holdings_History est lue avec les positions actuelles."""
+    import sqlite3
+    from stockage import StockageSQLite
+    conn = sqlite3.connect(base_avec_positions)
+    conn.execute("DROP TABLE Holdings_History")
+    conn.commit()
+    conn.close()
+    stockage = StockageSQLite(base_avec_positions)
+    assert stockage.rendements_ponderes(historique=True).equals(stockage.rendements_ponderes(historique=False))
+    _, df_metrics, _ = rapport_performance(str(tmp_path / "rapport"), base_avec_positions, chunksize=50)
+    assert sorted(df_metrics.index) == [1, 2]
@@ -0,0 +1,68 @@
+import sqlite3
+import pandas as pd
+import pytest
+from stockage import StockageSQLite, StockageDuckDB
+
+duckdb = pytest.importorskip("duckdb")
+
+
+def _comparer(a, b, cles):
+    a = a.sort_values(cles).reset_index(drop=True)
+    b = b.sort_values(cles).reset_index(drop=True)
+    pd.testing.assert_frame_equal(a, b, check_dtype=False, check_exact=False, rtol=1e-9)
+
+
+@pytest.fixture
+def deux_moteurs(base_avec_positions, tmp_path):
+    """Même base dans SQLite (statistiques lues dans Deals_Rollup) et dans DuckDB (copie des tables analytiques)."""
+    conn = sqlite3.connect(base_avec_positions)
+    tickers = [t for (t,) in conn.execute("SELECT ticker FROM Products ORDER BY ticker LIMIT 3")]
+    conn.executemany(
+        "INSERT INTO Deals (date, id_portfolio, risk_profile, action, asset, quantity, secteur) VALUES (?, ?, ?, ?, ?, ?, ?)",
+        [("2023-01-09", 1, "Lowrisk", "buy", tickers[0], 60.0, "Non disponible"),
+         ("2023-01-09", 1, "Lowrisk", "buy", tickers[1], 40.0, "Non disponible"),
+         ("2023-06-05", 1, "Lowrisk", "sell", tickers[0], 40.0, "Non disponible"),
+         ("2023-03-06", 2, "Low Turnover", "buy", tickers[2], 1, "Non disponible"),
+         # Titre absent de Products : le secteur est celui du deal
+         ("2023-03-06", 2, "Low Turnover", "sell", "INCONNU", 1, "Hors univers")]
+    )
+    conn.commit()
+    conn.close()
+    sqlite_ = StockageSQLite(base_avec_positions)
+    duck = StockageDuckDB(str(tmp_path / "fund_database.duckdb"))
+    duck.copier_depuis(sqlite_)
+    yield sqlite_, duck
+    duck.fermer()
+
+
+def test_statistiques_deals_identiques(deux_moteurs):
+    sqlite_, duck = deux_moteurs
+    assert sqlite_.table_existe("Deals_Rollup")
+    _comparer(sqlite_.transactions_par_profil(), duck.transactions_par_profil(), ['risk_profile'])
+    secteurs = sqlite_.repartition_secteurs()
+    _comparer(secteurs, duck.repartition_secteurs(), ['risk_profile', 'secteur'])
+    assert "Hors univers" in set(secteurs['secteur'])
+
+
+@pytest.mark.parametrize("historique", [False, True])
+def test_rendements_ponderes_identiques(deux_moteurs, historique):
+    sqlite_, duck = deux_moteurs
+    cles = ['id_portfolio', 'date']
+    attendu = sqlite_.rendements_ponderes(historique=historique)
+    assert len(attendu)
+    _comparer(attendu, duck.rendements_ponderes(historique=historique), cles)
+    for stockage in (sqlite_, duck):
+        par_lots = stockage.rendements_ponderes_par_lots(historique=historique, taille=1000).reset_index()
+        _comparer(attendu, par_lots, cles)
+
+
+def test_rollups_apres_update(deux_moteurs):
+    """Un UPDATE de Deals (quantité, profil, date) est reporté dans Deals_Rollup."""
+    from stockage import Stockage
+    sqlite_, _ = deux_moteurs
+    sqlite_.executer("UPDATE Deals SET quantity = quantity * 2, date = '2023-02-01' WHERE risk_profile = 'Lowrisk'")
+    sqlite_.executer("UPDATE Deals SET risk_profile = 'Lowrisk' WHERE asset = 'INCONNU'")
+    _comparer(sqlite_.transactions_par_profil(), Stockage.transactions_par_profil(sqlite_), ['risk_profile'])
+    _comparer(sqlite_.repartition_secteurs(), Stockage.repartition_secteurs(sqlite_), ['risk_profile', 'secteur'])
+    mois = sqlite_.requete("SELECT mois, SUM(volume_total) AS volume FROM Deals_Rollup WHERE risk_profile = 'Lowrisk' GROUP BY mois")
+    assert mois.set_index('mois')['volume'].to_dict() == {'2023-02': 280.0, '2023-03': 1.0}